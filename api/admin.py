@@ -10,6 +10,11 @@ from .model.ImageModel import ImageModel
 from .model.ImageMedia import ImageMedia
 from .model.File import File
 from .model.ContentHistory import ContentHistory
+from .model.FaqReclusterJob import FaqReclusterJob
+from .model.SuggestionJob import SuggestionJob
+from .model.WorkerHeartbeat import WorkerHeartbeat
+from .model.LlmCachedResponse import LlmCachedResponse
+from .services import FaqReclustering, SuggestionQueue
 
 class CustomUserAdmin(UserAdmin):
     list_display = ('username', 'email', 'first_name', 'last_name', 'is_staff',
@@ -21,10 +26,49 @@ class CustomUserAdmin(UserAdmin):
         ('Important dates', {'fields': ('last_login', 'date_joined')}),
     )
 
+class LessonAdmin(admin.ModelAdmin):
+    actions = ['recluster_faqs']
+
+    @admin.action(description="Re-cluster FAQs of the selected lessons")
+    def recluster_faqs(self, request, queryset):
+        # Queued for the FAQ worker, re-clustering a large lesson takes longer than a request
+        for lesson in queryset:
+            FaqReclustering.enqueue(lesson.id)
+        self.message_user(request, f"Queued FAQ re-clustering for {queryset.count()} lesson(s).")
+
+class FaqReclusterJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'lesson', 'threshold', 'status', 'created_at', 'started_at', 'finished_at')
+    list_filter = ('status',)
+    readonly_fields = ('status', 'result', 'started_at', 'finished_at')
+
+class SuggestionJobAdmin(admin.ModelAdmin):
+    actions = ['retry_jobs']
+    list_display = ('id', 'notification', 'kind', 'status', 'attempts', 'claimed_by', 'created_at', 'started_at')
+    list_filter = ('kind', 'status')
+    readonly_fields = ('kind', 'payload', 'status', 'attempts', 'error', 'started_at', 'claimed_by', 'lease_renewed_at')
+
+    @admin.action(description="Retry the selected suggestion jobs")
+    def retry_jobs(self, request, queryset):
+        # Pending and running jobs are already queued
+        failed = list(queryset.filter(status=SuggestionJob.FAILED))
+        for job in failed:
+            SuggestionQueue.requeue(job)
+        SuggestionQueue.notify()
+        self.message_user(request, f"Queued {len(failed)} suggestion job(s) again.")
+
+class WorkerHeartbeatAdmin(admin.ModelAdmin):
+    list_display = ('name', 'kind', 'concurrency', 'started_at', 'last_heartbeat', 'stopped_at',
+                    'jobs_succeeded', 'jobs_failed')
+    list_filter = ('kind',)
+
+class LlmCachedResponseAdmin(admin.ModelAdmin):
+    list_display = ('key', 'model', 'size', 'hits', 'created_at', 'last_used_at')
+    list_filter = ('model',)
+
 # Register your model here.
 admin.site.register(CustomUser, CustomUserAdmin)
 admin.site.register(Student)
-admin.site.register(Lesson)
+admin.site.register(Lesson, LessonAdmin)
 admin.site.register(LessonContent)
 admin.site.register(Query)
 admin.site.register(SubQuery)
@@ -32,4 +76,7 @@ admin.site.register(ImageModel)
 admin.site.register(ImageMedia)
 admin.site.register(File)
 admin.site.register(ContentHistory)
-
+admin.site.register(FaqReclusterJob, FaqReclusterJobAdmin)
+admin.site.register(SuggestionJob, SuggestionJobAdmin)
+admin.site.register(WorkerHeartbeat, WorkerHeartbeatAdmin)
+admin.site.register(LlmCachedResponse, LlmCachedResponseAdmin)
@@ -0,0 +1,7 @@
+from api.controllers.StatsController import StatsController
+from api.services import AnswerCache
+
+
+class AnswerCacheController(StatsController):
+    # Chatbot answer cache hits and misses across workers, entries held by this worker
+    service = AnswerCache
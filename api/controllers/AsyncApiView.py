@@ -0,0 +1,74 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.authentication import SessionAuthentication, TokenAuthentication
+from rest_framework.request import Request
+
+from api.services import RateLimiter
+
+
+class AsyncApiView(View):
+    """
+    Base for async views (streaming, long LLM waits). Authenticates with the
+    same DRF classes as the viewsets; subclasses define async get/post.
+    """
+    authentication_classes = [SessionAuthentication, TokenAuthentication]
+    # Model the view calls; requests draw from the RateLimiter buckets when set
+    llm_model = None
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # SessionAuthentication runs its own CSRF check, as in DRF's APIView
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    def authenticate(self, request):
+        drf_request = Request(request, authenticators=[auth() for auth in self.authentication_classes])
+        return drf_request.user
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            request.user = await sync_to_async(self.authenticate)(request)
+        except exceptions.APIException as exc:
+            return JsonResponse({"detail": str(exc.detail)}, status=exc.status_code)
+
+        if not request.user.is_authenticated:
+            return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+
+        if self.llm_model is not None:
+            throttled = await self.throttle(request, kwargs)
+            if throttled is not None:
+                return throttled
+
+        return await super().dispatch(request, *args, **kwargs)
+
+    async def throttle(self, request, kwargs):
+        # A 429 like DRF's throttles return, before any work is done; None when allowed
+        lesson_id = kwargs.get('lesson_id')
+        if lesson_id is None:
+            data = self.request_data(request)
+            lesson_id = data.get('lesson_id') if data is not None else None
+
+        decision = await RateLimiter.aacquire(request.user.pk, lesson_id, self.llm_model)
+        if decision.allowed:
+            return None
+
+        retry_after = RateLimiter.retry_after_header(decision)
+        response = JsonResponse(
+            {"detail": f"Request was throttled. Expected available in {retry_after} seconds."}, status=429
+        )
+        response['Retry-After'] = retry_after
+        return response
+
+    @staticmethod
+    def request_data(request):
+        # The JSON or form body, like DRF's request.data; None when the JSON is invalid
+        if request.content_type == 'application/json':
+            try:
+                return json.loads(request.body or b'{}')
+            except ValueError:
+                return None
+        return request.POST
@@ -0,0 +1,21 @@
+from api.controllers.AsyncApiView import AsyncApiView
+from api.services import ChatFlow
+
+
+class ChatBotAsyncController(AsyncApiView):
+    """
+    Async ChatBotController.chatbot_response, routed in its place when
+    ASYNC_LLM_VIEWS is on: the worker keeps serving other requests while
+    the model answers.
+    """
+    llm_model = ChatFlow.MODEL
+
+    async def post(self, request, lesson_id, lesson_content_id):
+        try:
+            turn = await ChatFlow.astart(request, lesson_id, lesson_content_id)
+        except ChatFlow.ChatError as e:
+            return e.response
+
+        ai_response = await ChatFlow.aanswer(turn)
+        await ChatFlow.afinish(turn, ai_response)
+        return ChatFlow.json_response(turn, ai_response)
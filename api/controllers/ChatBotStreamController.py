@@ -0,0 +1,59 @@
+import json
+
+import httpx
+from django.http import StreamingHttpResponse
+
+from api.controllers.AsyncApiView import AsyncApiView
+from api.services import ChatFlow, LlmClients
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class ChatBotStreamController(AsyncApiView):
+    """
+    Streaming variant of ChatBotController.chatbot_response: the answer is
+    sent as server-sent events while the model writes it ("token" events,
+    then "done" with the full answer, or "error"). Serve it through ASGI,
+    WSGI servers buffer the whole stream.
+    """
+    llm_model = ChatFlow.MODEL
+
+    async def post(self, request, lesson_id, lesson_content_id):
+        try:
+            turn = await ChatFlow.astart(request, lesson_id, lesson_content_id)
+        except ChatFlow.ChatError as e:
+            return e.response
+
+        events = self.cached_events(turn) if turn.cached_response is not None else self.events(turn)
+
+        response = StreamingHttpResponse(events, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Answer-Cache'] = turn.cache_status
+        # Tell nginx-style proxies not to buffer the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def events(self, turn):
+        # On a client disconnect the server cancels this generator at its current await,
+        # which closes the upstream LLM request; nothing is saved for an unfinished answer
+        parts = []
+        try:
+            stream = LlmClients.astream_chat(ChatFlow.MODEL, turn.messages(), cache=turn.llm_cache, temperature=0)
+            async for delta in stream:
+                parts.append(delta)
+                yield sse("token", {"content": delta})
+        except httpx.HTTPError as exc:
+            yield sse("error", {"error": f"The assistant is unavailable: {exc}"})
+            return
+
+        ai_response = "".join(parts)
+        await ChatFlow.afinish(turn, ai_response)
+        yield sse("done", {"response": ai_response})
+
+    async def cached_events(self, turn):
+        # A cached answer is complete already, send it as a single token
+        await ChatFlow.afinish(turn, turn.cached_response)
+        yield sse("token", {"content": turn.cached_response})
+        yield sse("done", {"response": turn.cached_response})
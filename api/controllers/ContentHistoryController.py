@@ -13,6 +13,9 @@ from api.model.Lesson import Lesson
 from django.core.exceptions import ObjectDoesNotExist
 from django.db.models import FloatField
 from django.db.models.functions import Cast
+import logging
+
+logger = logging.getLogger(__name__)
 
 class ContentHistoryController(ModelViewSet):
     queryset = ContentHistory.objects.all()
@@ -226,40 +229,19 @@ class ContentHistoryController(ModelViewSet):
             if not content_history:
                 return Response({"error": "Content history not found."}, status=status.HTTP_404_NOT_FOUND)
 
-            # Fetch the lesson content for the given lesson_id
-            lesson_contents = LessonContent.objects.filter(lesson_id=lesson_id).order_by('id')
-            lesson_contents_list = list(lesson_contents)
-
             # Process the history content via pagination (split by delimiter)
             result = LessonContentsController.split_content_by_delimiter(content_history.content, isRevert=True)
             page_contents = result[1]  # Get array of content pages
 
-            # Log the number of pages for debugging
-            print(f"Restoring content: Existing lesson pages = {len(lesson_contents_list)}, History content pages = {len(page_contents)}")
-
-            # Update the existing lesson pages with the content from history
-            for index in range(min(len(lesson_contents_list), len(page_contents))):
-                lesson_content = lesson_contents_list[index]
-                lesson_content.contents = page_contents[index].strip()  # Update content of the page
-                lesson_content.save()
-                print(f"Updated LessonContent page {index + 1} with content from history")
-
-            # If the history has more pages than the current lesson, create new pages
-            if len(page_contents) > len(lesson_contents_list):
-                for index in range(len(lesson_contents_list), len(page_contents)):
-                    new_lesson_content = LessonContent(
-                        lesson_id=lesson_id,
-                        contents=page_contents[index].strip()
-                    )
-                    new_lesson_content.save()
-                    print(f"Created new LessonContent page {index + 1} with content from history")
+            # Update the existing lesson pages with the content from history, create pages for the excess
+            updated, created = LessonContentsController.write_pages(lesson_id, page_contents)
+            logger.info("Restored lesson %s from history: updated %d and created %d LessonContent page(s)", lesson_id, updated, created)
 
             # After updating/creating pages, check for pages with only <!-- delimiter --> and remove them
             lesson_contents_after = LessonContent.objects.filter(lesson_id=lesson_id).order_by('id')
 
             for content in lesson_contents_after:
                 if content.contents.strip() == "<!-- delimiter -->":
-                    print(f"Removing blank page with id {content.id}")
                     content.delete()
 
             # Success response after restoration
@@ -268,7 +250,7 @@ class ContentHistoryController(ModelViewSet):
         except LessonContent.DoesNotExist:
             return Response({"error": "Lesson content not found"}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
-            print(f"Error: {str(e)}")
+            logger.exception("Could not restore lesson %s from history %s", lesson_id, history_id)
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
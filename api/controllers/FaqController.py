@@ -1,3 +1,4 @@
+from django.db import transaction
 from django.db.models import Count
 from django.utils import timezone
 from rest_framework import status
@@ -33,6 +34,13 @@ class FaqController(ModelViewSet):
     authentication_classes = [SessionAuthentication, TokenAuthentication]
     pagination_class = StandardResultsSetPagination
 
+    def perform_create(self, serializer):
+        # Counted like the chatbot's FAQs; the post_delete signal takes them off again
+        with transaction.atomic():
+            faq = serializer.save()
+            if faq.grouped_questions_id is not None:
+                faq.grouped_questions.count_faq()
+
     @action(detail=False, methods=['get'])
     def paginated_general_context_group(self, request):
         lesson_id = request.query_params.get('lesson_id')
@@ -118,7 +126,7 @@ class FaqController(ModelViewSet):
             # Iterate through each Query object
             for query in queries:
                 # Retrieve the SubQuery objects associated with the Query
-                subqueries = query.subqueries.all()
+                subqueries = query.turns.all()
 
                 # Create a Faq object for each SubQuery
                 for subquery in subqueries:
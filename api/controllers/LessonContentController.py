@@ -5,8 +5,10 @@ from rest_framework import status
 from rest_framework.authentication import SessionAuthentication, TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 import re
+from django.db import transaction
 
-from api.model.LessonContent import LessonContent
+from api.model.LessonContent import LessonContent, TEXT_METADATA_FIELDS
+from api.services import AnswerCache, LessonRetrieval
 from api.serializer.LessonContentSerializer import LessonContentSerializer
 from api.controllers.permissions.permissions import IsTeacher
 
@@ -115,6 +117,41 @@ class LessonContentsController(GenericViewSet, ListModelMixin, RetrieveModelMixi
 
         return num_pages, page_contents
 
+    @staticmethod
+    def write_pages(lesson_id, page_contents, skip_blank=False):
+        """
+        Writes page_contents over the lesson's pages in id order and creates
+        pages for the rest (blank ones skipped when skip_blank), with one
+        bulk_update and one bulk_create. Returns (updated, created).
+        """
+        existing_pages = list(LessonContent.objects.filter(lesson_id=lesson_id).order_by('id'))
+
+        updated = []
+        for lesson_content, content in zip(existing_pages, page_contents):
+            if lesson_content.contents != content.strip():
+                lesson_content.contents = content.strip()
+                lesson_content.refresh_text_metadata()
+                updated.append(lesson_content)
+
+        created = []
+        for content in page_contents[len(existing_pages):]:
+            if skip_blank and not content.strip():
+                continue
+            new_lesson_content = LessonContent(lesson_id=lesson_id, contents=content.strip())
+            new_lesson_content.refresh_text_metadata()
+            created.append(new_lesson_content)
+
+        with transaction.atomic():
+            LessonContent.objects.bulk_update(updated, ['contents'] + TEXT_METADATA_FIELDS)
+            LessonContent.objects.bulk_create(created)
+
+        # bulk_update and bulk_create send no post_save, drop what the chatbot derived from the pages here
+        if updated or created:
+            transaction.on_commit(lambda: AnswerCache.invalidate(lesson_id))
+            transaction.on_commit(lambda: LessonRetrieval.invalidate(lesson_id))
+
+        return len(updated), len(created)
+
     
     @staticmethod
     def getAllContentsHelper(lesson_id):
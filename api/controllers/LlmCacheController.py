@@ -0,0 +1,7 @@
+from api.controllers.StatsController import StatsController
+from api.services import LlmCache
+
+
+class LlmCacheController(StatsController):
+    # LLM response cache hits and misses across workers, stored entries and their size
+    service = LlmCache
@@ -10,7 +10,7 @@ from api.models import CustomUser
 from api.serializer.QuerySerializer import QuerySerializer
 
 class QueryController(GenericViewSet, ListModelMixin, RetrieveModelMixin, CreateModelMixin, DestroyModelMixin):
-    queryset = Query.objects.all()
+    queryset = Query.objects.select_related('lesson', 'user').prefetch_related('turns')
     serializer_class = QuerySerializer
 
     authentication_classes = [SessionAuthentication, TokenAuthentication]
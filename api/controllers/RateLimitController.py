@@ -0,0 +1,7 @@
+from api.controllers.StatsController import StatsController
+from api.services import RateLimiter
+
+
+class RateLimitController(StatsController):
+    # Requests let through and refused per bucket scope, across workers
+    service = RateLimiter
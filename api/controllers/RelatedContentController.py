@@ -5,14 +5,13 @@ from api.model.RelatedContent import  RelatedContent
 from api.serializer.RelatedContentSerializer import  RelatedContentSerializer
 from api.model.Faq import Faq
 from api.model.Lesson import Lesson
-from api.model.Teacher import Teacher
 from rest_framework.response import Response
+from django.conf import settings
+from django.db import transaction
 from rest_framework.viewsets import ModelViewSet
 from api.model.GroupedQuestions import GroupedQuestions
 from api.model.Notification import Notification
-
-import math
-from collections import Counter
+from api.services import FaqIndex, FaqMatrix, GroupCentroids, NearDuplicates, TeacherSettings, TextVector
 
 
 class RelatedContentController(ModelViewSet):
@@ -21,117 +20,107 @@ class RelatedContentController(ModelViewSet):
 
     @staticmethod
     def tokenize(text):
-        # Split the text into words and remove non-alphanumeric characters
-        return text.lower().split()
+        # Terms of the text after the FAQ_TOKENIZER_STEPS normalization (lowercase, punctuation, stopwords, stem)
+        return TextVector.tokenize(text)
 
     @staticmethod
     def compute_word_frequencies(words):
         # Count the frequency of each word
-        return Counter(words)
+        return TextVector.word_frequencies(words)
 
     @staticmethod
     def cosine_similarity(vec1, vec2):
-        # Compute the dot product
-        dot_product = sum(vec1[word] * vec2.get(word, 0) for word in vec1)
-
-        # Compute the magnitude of each vector
-        magnitude_vec1 = math.sqrt(sum(val ** 2 for val in vec1.values()))
-        magnitude_vec2 = math.sqrt(sum(val ** 2 for val in vec2.values()))
-
-        if not magnitude_vec1 or not magnitude_vec2:
-            return 0.0
+        return TextVector.cosine_similarity(vec1, vec2)
 
-        # Compute cosine similarity
-        return dot_product / (magnitude_vec1 * magnitude_vec2)
+    @staticmethod
+    def match_messages(lesson_id, messages):
+        # Batch matching for offline re-grouping and bulk imports: (faq_id, similarity) per message
+        return FaqMatrix.match_messages(lesson_id, messages)
 
     @staticmethod
-    def process_message_and_add_to_faq(lesson_id, message, similarity_threshold=0.3):
+    def process_message_and_add_to_faq(lesson_id, message, similarity_threshold=0.3, matching_mode=None):
         """
         similarity_threshold: float, controls how flexible or strict the matching is.
         - 0.1: More flexible, groups contextually similar questions.
         - 1.0: High sensitivity, groups only exact matches.
+        matching_mode: 'faq' (nearest single FAQ) or 'centroid' (nearest group
+        centroid), defaults to settings.FAQ_MATCHING_MODE.
         """
 
-        # Convert message to lowercase and tokenize
+        # Normalize the message the same way the stored FAQ vectors were
         message_tokens = RelatedContentController.tokenize(message)
 
         related_contents = RelatedContent.objects.filter(lesson_id=lesson_id)
         lesson = Lesson.objects.get(id=lesson_id)
 
-        faqlist = Faq.objects.filter(lesson_id=lesson_id)
-        max_sim_value = -1  # Initialize max similarity value
-        most_similar_faq = None
-
-        # Find the FAQ with the highest similarity to the new message
         message_vector = RelatedContentController.compute_word_frequencies(message_tokens)
 
-        for faq in faqlist:
-            faq_tokens = RelatedContentController.tokenize(faq.question)
-            faq_vector = RelatedContentController.compute_word_frequencies(faq_tokens)
-            cosine_sim = RelatedContentController.cosine_similarity(message_vector, faq_vector)
+        # Near-verbatim repeats are found through the LSH buckets and skip full scoring
+        duplicate_faq, max_sim_value = NearDuplicates.find_duplicate(lesson_id, message)
 
-            if cosine_sim > max_sim_value:
-                max_sim_value = cosine_sim
-                most_similar_faq = faq
+        if duplicate_faq is not None:
+            best_related_content = duplicate_faq.related_content
+        elif (matching_mode or settings.FAQ_MATCHING_MODE) == 'centroid':
+            # Find the group whose centroid is closest to the new message
+            best_related_content, max_sim_value = GroupCentroids.find_most_similar_group(lesson_id, message_vector)
+        else:
+            # Find the FAQ with the highest similarity to the new message,
+            # scoring only the FAQs that share a term with it
+            most_similar_faq, max_sim_value = FaqIndex.find_most_similar_faq(lesson_id, message_vector)
+            best_related_content = most_similar_faq.related_content if most_similar_faq else None
 
         # Threshold for similarity
-        similarity_threshold = Teacher.objects.filter(id=1).first().threshold
-        if similarity_threshold > 0.4:
-            similarity_threshold = 0.3
-        SIMILARITY_THRESHOLD = similarity_threshold
-        NOTIFICATION_THRESHOLD = Teacher.objects.filter(id=1).first().notification_threshold
+        SIMILARITY_THRESHOLD = TeacherSettings.similarity_threshold()
+        NOTIFICATION_THRESHOLD = TeacherSettings.get().notification_threshold
 
-        print("max_sim_value", max_sim_value)
         # Process based on similarity
-        if max_sim_value >= SIMILARITY_THRESHOLD:
-            matching_related_content = most_similar_faq.related_content if most_similar_faq else related_contents.first()
-            grouped_questions = GroupedQuestions.objects.filter(
-                lesson=lesson, related_content=matching_related_content, notified=False
-            ).first()
-
-            if not grouped_questions:
-                grouped_questions = GroupedQuestions.objects.create(
+        if duplicate_faq is not None or max_sim_value >= SIMILARITY_THRESHOLD:
+            matching_related_content = best_related_content if best_related_content else related_contents.first()
+            with transaction.atomic():
+                grouped_questions = GroupedQuestions.objects.filter(
+                    lesson=lesson, related_content=matching_related_content, notified=False
+                ).first()
+
+                if not grouped_questions:
+                    grouped_questions = GroupedQuestions.objects.create(
+                        related_content=matching_related_content,
+                        lesson=lesson,
+                    )
+
+                Faq.objects.create(
+                    lesson=lesson,
                     related_content=matching_related_content,
+                    grouped_questions=grouped_questions,
+                    question=message
+                )
+                grouped_questions.count_faq()
+
+                # Only the message that brings the group to the threshold notifies
+                if not grouped_questions.notified and grouped_questions.faq_count >= NOTIFICATION_THRESHOLD:
+                    create_notification = Notification.objects.create(
+                        lesson=lesson,
+                        message="Message: Your lesson " + lesson.title + " has an AI suggestion based on FAQs from students!"
+                    )
+                    grouped_questions.notification = create_notification
+                    grouped_questions.notified = True
+                    grouped_questions.save(update_fields=['notification', 'notified'])
+        else:
+            with transaction.atomic():
+                new_related_content = RelatedContent.objects.create(
                     lesson=lesson,
+                    general_context=message
                 )
-
-            faq_count = Faq.objects.filter(
-                related_content=matching_related_content, lesson=lesson, grouped_questions=grouped_questions
-            ).count() + 1
-
-            if faq_count >= NOTIFICATION_THRESHOLD:
-                create_notification = Notification.objects.create(
+                grouped_questions = GroupedQuestions.objects.create(
+                    related_content=new_related_content,
                     lesson=lesson,
-                    message="Message: Your lesson " + lesson.title + " has an AI suggestion based on FAQs from students!"
                 )
-                grouped_questions.notification = create_notification
-                grouped_questions.notified = True
-                grouped_questions.save()
-
-            faq = Faq.objects.create(
-                lesson=lesson,
-                related_content=matching_related_content,
-                grouped_questions=grouped_questions,
-                question=message
-            )
-            faq.save()
-        else:
-            new_related_content = RelatedContent.objects.create(
-                lesson=lesson,
-                general_context=message
-            )
-            grouped_questions = GroupedQuestions.objects.create(
-                related_content=new_related_content,
-                lesson=lesson,
-            )
-            faq = Faq.objects.create(
-                lesson=lesson,
-                related_content=new_related_content,
-                grouped_questions=grouped_questions,
-                question=message
-            )
-            faq.save()
-
+                Faq.objects.create(
+                    lesson=lesson,
+                    related_content=new_related_content,
+                    grouped_questions=grouped_questions,
+                    question=message
+                )
+                grouped_questions.count_faq()
 
 
 # class RelatedContentController(ModelViewSet):
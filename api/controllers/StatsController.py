@@ -0,0 +1,30 @@
+from rest_framework import status
+from rest_framework.authentication import SessionAuthentication, TokenAuthentication
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.viewsets import GenericViewSet
+
+from api.controllers.permissions.permissions import IsTeacher
+
+
+class StatsController(GenericViewSet):
+    """
+    Counters of a service shared by every worker: getStats reports them,
+    resetStats clears them. Subclasses set service to a module with
+    stats() and reset_stats().
+    """
+    authentication_classes = [SessionAuthentication, TokenAuthentication]
+    service = None
+
+    def get_permissions(self):
+        # Signed-in users may read the counters, only teachers reset them
+        if self.action == 'resetStats':
+            return [IsAuthenticated(), IsTeacher()]
+        return [IsAuthenticated()]
+
+    def getStats(self, request):
+        return Response(self.service.stats(), status=status.HTTP_200_OK)
+
+    def resetStats(self, request):
+        self.service.reset_stats()
+        return Response(self.service.stats(), status=status.HTTP_200_OK)
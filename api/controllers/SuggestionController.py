@@ -17,12 +17,12 @@ from langchain_community.chat_models import ChatOpenAI
 from langchain.chains import ConversationChain
 from langchain.memory import ConversationSummaryBufferMemory
 from rest_framework.authentication import SessionAuthentication, TokenAuthentication
+from rest_framework.permissions import IsAuthenticated
 from api.model.Faq import Faq
 from rest_framework.decorators import action
 from api.model.Lesson import Lesson
 from api.model.LessonContent import LessonContent
 from api.model.Query import Query
-import threading
 from django.db import transaction
 from django.db.models import Q
 import time
@@ -30,19 +30,33 @@ from api.model.GroupedQuestions import GroupedQuestions
 from api.model.SubQuery import SubQuery
 from api.controllers.static.prompts import *
 from api.controllers.LessonContentController import LessonContentsController
+from api.controllers.permissions.permissions import IsTeacher
+from api.controllers.permissions.throttles import LlmRateThrottle
 import openai
+from api.services import DelimiterAlignment, LlmClients, PromptBudget, SuggestionInsights, SuggestionQueue
 from requests.exceptions import HTTPError
 import os
 from django.views.decorators.csrf import csrf_exempt
+import logging
+
+logger = logging.getLogger(__name__)
 
 class SuggestionController(ModelViewSet):
     queryset = Suggestion.objects.all()
     serializer_class = SuggestionSerializer
 
     authentication_classes = [SessionAuthentication, TokenAuthentication]
-
-    isRunning = False  # Class-level variable to track background process status
-
+    throttle_classes = [LlmRateThrottle]
+    # Actions that call the LLM, rate limited per user, lesson and model
+    llm_models = {'createInsight': "gpt-4o-mini", 'insert_delimiter_ai': "gpt-4o"}
+    # Model of the suggestions generated by run_suggestion_worker
+    suggestion_model = "gpt-4o"
+
+    def get_permissions(self):
+        # Queueing generation for every notification is for teachers only
+        if self.action == 'startBackgroundCreation':
+            return [IsAuthenticated(), IsTeacher()]
+        return super().get_permissions()
 
     def insert_delimiter_ai(self, request):
         edited_content = request.data.get('edited_content')
@@ -57,131 +71,74 @@ class SuggestionController(ModelViewSet):
                 "data": ""
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        def process_delimiter_task(edited_content, original_content):
-        #     # AI prompt preparation
-        #     prompt = '''
-        #         I wanted you to put delimiter to the edited content base on the original content
-        #         **INSTRUCTIONS FOR HANDLING `<!-- delimiter -->` TAGS**
-        #         1. **KEEP EXISTING DELIMITERS**
-        #         - DO NOT REMOVE ANY EXISTING `<!-- delimiter -->`
-        #         2. THE DELIMITER SHOULD ONLY BASE ON THE ORIGINAL CONTENT.
-        #         - I WILL BE USING THE DELIMITERS TO SEPARATE THE TEXT IT WILL BE TURNED INTO AN ARRAY SO MAKE SURE TO FOLLOW THE DELIMITER BASED ON THE ORIGINAL CONTENT
-        #         - DON'T INCLUDE EVERYTHING IN THE FIRST PAGE FOLLOW THE DELIMITER BASED ON THE ORIGINAL CONTENT
-        #         - IMPORTANT RETAIN ALL THE FILE ASSETS AND VIDEOS AND IMAGES< PICTURE LINKS
-        #         - **VERY IMPORTANT FOLLOW ALL THE INSTRUCTIONS I WILL DIE IF YOU REPLACE THE EDITED CONTENT I AM ONLY ASKING OF ADDING DELIMITER**
-        #         - PLEASE DONT REMOVE ANYTHING I WILL BE DISSAPOINTED
-        #         - PLEASE DONT REMOVE ANYTHING I WILL BE DISSAPOINTED
-        #
-        #         NOTE: IF THERE IS A YOUTUBE LINK VIDEO FROM EDITED CONTENT YOU MUST RETAIN IT AND PUT 1 <br> BELOW IT.
-        #         This is the original content """
-        #     '''
-        #     prompt2 = '''
-        #     """
-        #         INSTRUCTION: I WANTED YOU TO PUT DELIMITER BASED ON THE ORIGINAL CONTENT
-        #
-        #         IMPORTANT NOTICE: MAKE SURE TO NOT CHANGE ANY OF THE CONTENT HERE BUT YOU CAN ONLY ADD THE DELIMITER!!!
-        #         VERY IMPORTANT NOTE: DO NOT EDIT THE EDITED CONTENT
-        #         - IMPORTANT RETAIN ALL THE FILE ASSETS AND VIDEOS AND IMAGES< PICTURE LINKS
-        #         - **VERY IMPORTANT FOLLOW ALL THE INSTRUCTIONS I WILL DIE IF YOU REPLACE THE EDITED CONTENT I AM ONLY ASKING OF ADDING DELIMITER**
-        #
-        #         DON'T MAKE ANY COMMENT JUST REPLY WITH HTML MARKUP, BELOW IS THE EDITED CONTENT:
-        #     '''
-        #     prompt3 = '''
-        #         1. **DELIMITER HANDLING:**
-        #         - DO NOT REMOVE or REPLACE the delimiter `<!-- delimiter -->`.
-        #         - ONLY SPLIT the content based on the exact occurrence of this delimiter.
-        #         - IMPORTANT RETAIN ALL THE FILE ASSETS AND VIDEOS AND IMAGES< PICTURE LINKS
-        #
-        #         - IMPORTANT RETAIN ALL THE FILE ASSETS AND VIDEOS AND IMAGES< PICTURE LINKS
-        #         - **VERY IMPORTANT FOLLOW ALL THE INSTRUCTIONS I WILL DIE IF YOU REPLACE THE EDITED CONTENT I AM ONLY ASKING OF ADDING DELIMITER**
-        #
-        #         - **FAILURE TO FOLLOW THESE INSTRUCTIONS WILL BREAK THE PROCESS.**
-        #     '''
-        #     insert_delimiter_ai = 'I will be giving you text in html form and make sure that you will return html form content, make sure to only reply html'
-        # #     final_prompt = prompt + original_content + prompt2 + edited_content + prompt3
-        #     prompt = '''
-        #             I need you to add delimiters to the edited content based on the original content.
-        #
-        #             **Instructions for Handling `<!-- delimiter -->` Tags**:
-        #             1. **Do not remove existing delimiters** (`<!-- delimiter -->`).
-        #             2. **Delimiters must match the original content structure**:
-        #                 - Use delimiters to separate the text into sections as per the original content.
-        #                 - Retain all assets, videos, images, and links.
-        #             3. **Do not edit or remove any part of the edited content**:
-        #                 - This includes file assets, YouTube links, or images.
-        #                 - Add only delimiters where necessary.
-        #             4. **YouTube links must be followed by a `<br>` tag**.
-        #             5. **your only job is to put delimiter in the edited content and you should try to match where the delimiter of the original content is placced .
-        #
-        #             Note: Reply with the updated HTML content containing only the added delimiters.
-        #         '''
-        #
-        #     final_prompt = f"{prompt}\n\nOriginal Content:\n{original_content}\n\nEdited Content:\n{edited_content}"
-        #
-        #     # OpenAI API call
-        #     openai.api_key = os.environ.get("OPENAI_API_KEY")
-        #     response = openai.ChatCompletion.create(
-        #         model="gpt-4",
-        #         messages=[
-        #             {"role": "system", "content": insert_delimiter_ai},
-        #             {"role": "user", "content": final_prompt},
-        #         ],
-        #         temperature=0.7,
-        #     )
-        #     ai_response = response['choices'][0]['message']['content'].strip()
-
-            insert_delimiter_ai = "I WILL PROVIDE YOU TEXT IN HTML FORMAT, AND YOU MUST RETURN HTML FORMAT CONTENT. ONLY REPLY WITH HTML."
-
-            prompt = '''
-                    I NEED YOU TO ADD DELIMITERS TO THE EDITED CONTENT BASED ON THE ORIGINAL CONTENT.
-
-                    **INSTRUCTIONS FOR HANDLING `<!-- delimiter -->` TAGS**:
-                    1. **DO NOT REMOVE EXISTING DELIMITERS** (`<!-- delimiter -->`).
-                    2. **DELIMITERS MUST MATCH THE ORIGINAL CONTENT STRUCTURE**:
-                        - USE DELIMITERS TO SEPARATE THE TEXT INTO SECTIONS AS PER THE ORIGINAL CONTENT.
-                        - RETAIN ALL FILE ASSETS, VIDEOS, IMAGES, AND LINKS EXACTLY AS THEY ARE.
-                    3. **DO NOT EDIT OR REMOVE ANY PART OF THE EDITED CONTENT**:
-                        - THIS INCLUDES FILE ASSETS, YOUTUBE LINKS, OR IMAGES.
-                        - ADD ONLY DELIMITERS WHERE NECESSARY.
-                    4. **ENSURE YOUTUBE LINKS ARE FOLLOWED BY A `<br>` TAG**.
-                    5. **YOUR ONLY JOB IS TO PLACE DELIMITERS IN THE EDITED CONTENT AND ALIGN THEM WITH THE ORIGINAL CONTENT'S STRUCTURE.**
-
-                    **NOTE**: REPLY ONLY WITH THE UPDATED HTML CONTENT CONTAINING THE DELIMITERS. DO NOT PROVIDE ANY COMMENTS OR EXPLANATIONS.
-            '''
-
-            final_prompt = f"{prompt}\n\nORIGINAL CONTENT:\n{original_content}\n\nEDITED CONTENT:\n{edited_content}"
-
-            # OpenAI API call
-            openai.api_key = os.environ.get("OPENAI_API_KEY")
-            response = openai.ChatCompletion.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": insert_delimiter_ai},
-                    {"role": "user", "content": final_prompt},
-                ],
-                temperature=0.2,
-            )
-            ai_response = response['choices'][0]['message']['content'].strip()
-
-            # save the response in the suggestion model ai_delimiter
-            # You can save `ai_response` to a database or log it
-            print("AI Response:", ai_response)
-
-            suggestion = Suggestion.objects.filter(lesson_id=lesson_id, notification_id=notification_id).first()
-            if suggestion:
-                suggestion.ai_delimiter = ai_response
-                suggestion.save()
+        # Placed locally by diffing the two versions; the LLM is only asked where that was a guess
+        alignment = DelimiterAlignment.align(original_content, edited_content)
+        suggestion = Suggestion.objects.filter(lesson_id=lesson_id, notification_id=notification_id).first()
+        if suggestion:
+            suggestion.ai_delimiter = alignment.content
+            suggestion.save()
+        logger.debug(
+            "Delimiters: %d placed, %d ambiguous in %.1f ms",
+            alignment.placed, len(alignment.ambiguous), alignment.seconds * 1000
+        )
+        # Without a suggestion there is nowhere to store what the LLM would place
+        if not alignment.spans or not settings.DELIMITER_LLM_FALLBACK or suggestion is None:
+            return Response({
+                "success": True,
+                "message": "Delimiters inserted.",
+                "data": alignment.content
+            }, status=status.HTTP_200_OK)
 
-        # Start the task in a new thread
-        thread = threading.Thread(target=process_delimiter_task, args=(edited_content, original_content))
-        thread.start()
+        # Run by `manage.py run_suggestion_worker`; the LLM only sees the spans around the ambiguous delimiters
+        SuggestionQueue.enqueue_delimiters(notification_id, lesson_id, alignment)
 
         return Response({
             "success": True,
             "message": "Processing started. Results will be available later.",
-            "data": None
+            "data": alignment.content
         }, status=status.HTTP_202_ACCEPTED)
 
+    def insert_ambiguous_delimiters(self, notification_id, payload):
+        """
+        Asks the LLM where the ambiguous delimiters of a queued alignment go,
+        one span at a time, and stores the result in the suggestion's
+        ai_delimiter unless it was replaced meanwhile. A reply that changes
+        the span's text or adds a different number of delimiters keeps the
+        local placement of that span.
+        """
+        replies = []
+        for span in payload['spans']:
+            prompt = DELIMITER_SPAN_PROMPT.format(
+                count=span['delimiters'], before=span['before'], after=span['after'], text=span['text'],
+            )
+            response = LlmClients.chat_completion(
+                model=self.llm_models['insert_delimiter_ai'],
+                messages=[
+                    {"role": "system", "content": DELIMITER_SYSTEM_CONTENT},
+                    {"role": "user", "content": prompt},
+                ],
+                temperature=0.2,
+                rate_limit=True,
+            )
+            replies.append(response['choices'][0]['message']['content'].strip())
+
+        spans = [DelimiterAlignment.Span(**span) for span in payload['spans']]
+        content, used = DelimiterAlignment.apply_spans(payload['content'], spans, replies)
+        if used < len(spans):
+            logger.info(
+                "AI response changed %d of %d delimiter span(s) of notification %s, keeping their local delimiters",
+                len(spans) - used, len(spans), notification_id
+            )
+        if not used:
+            return
+
+        # Only over the alignment the job was queued with, a newer edit is not overwritten
+        updated = Suggestion.objects.filter(
+            lesson_id=payload['lesson_id'], notification_id=notification_id, ai_delimiter=payload['content']
+        ).update(ai_delimiter=content)
+        if not updated:
+            logger.info("Delimiters of notification %s changed meanwhile, dropping the AI placement", notification_id)
+
     def get_insert_delimiter_ai(self, request):
         lesson_id = request.data.get('lesson_id')
         notification_id = request.data.get('notification_id')
@@ -198,123 +155,25 @@ class SuggestionController(ModelViewSet):
         }, status=status.HTTP_200_OK)
 
     def createInsight(self, request):
-        lesson_id = request.data.get('lesson_id')
-        notification_id = request.data.get('notification_id')
-        
-        if not lesson_id or not notification_id:
-            return Response({"error": "lesson_id or notification_id is required"}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # guard lesson and notification check if exists
-        print("Checking existing lesson and notification...")
-        existing_lesson = Lesson.objects.filter(id=lesson_id).first()
-        existing_notification = Notification.objects.filter(notif_id=notification_id).first()
-
-        if not existing_lesson or not existing_notification:
-            return Response({"error": "Lesson or Notification does not exist."}, status=status.HTTP_400_BAD_REQUEST)
-
-        # filter suggestion with notif_id 
-        print("Suggestion")
-        suggestions = Suggestion.objects.filter(lesson_id=lesson_id, notification_id=notification_id)
-
-        if suggestions.exists():
-            # If only one suggestion exists, use that suggestion
-            existing_suggestion = suggestions.first()
-            IsCreated = False
-        else:
-            # Create a new suggestion
-            existing_suggestion = Suggestion.objects.create(lesson_id=lesson_id, notification_id=notification_id)
-            IsCreated = True
-
-        # Fetch lesson contents
-        print("Fetching lesson contents...")
-        lesson_contents = LessonContent.objects.filter(lesson_id=lesson_id)
-        
-        # Serialize and clean lesson content data
-        lesson_content_serializer = LessonContentSerializer(lesson_contents, many=True)
-        lesson_content_data = lesson_content_serializer.data
-
-        # Ensure the content field exists in lesson content data
-        lesson_content_text = "\n".join([content['contents'] for content in lesson_content_data if 'contents' in content])
-        # print("content: ", lesson_content_text)
-
-        # Get grouped questions related to the given notification_id
-        print("Fetching grouped questions...")
-        grouped_questions = GroupedQuestions.objects.filter(notification_id=notification_id, lesson_id=lesson_id)
-        
-        # Get FAQs related to these grouped questions
-        faqs = Faq.objects.filter(grouped_questions__in=grouped_questions).select_related('grouped_questions__notification')
-
-        # Prepare the response data with only questions
-        faq_questions = [faq.question for faq in faqs if faq.grouped_questions and faq.grouped_questions.notification]
-
-        # early return
-        if(existing_suggestion.insights is not None):
-
-            if not existing_suggestion.old_content:
-                existing_suggestion.old_content = lesson_content_text
-
-            existing_suggestion.save()
-
-            # Reformat faq_questions into bullet points
-            formatted_faq_questions = '<p><i>'.join([f"&#8226; {question}" for question in faq_questions]) + '</i></p>'
-
-            response_data = {
-                "suggestion": SuggestionSerializer(existing_suggestion).data,
-                "faq_questions": formatted_faq_questions
-            }
-
-            print("Insight is already created, fetching...")
-
-            if IsCreated:
-                return Response(response_data, status=status.HTTP_201_CREATED)
-            
-            return Response(response_data, status=status.HTTP_200_OK)
-
-        # else create one
-        input_text = prompt_create_insights_abs(faq_questions,lesson_content_text)
-        
         try:
-            # Call OpenAI API to get the suggestion
-            openai.api_key = os.environ.get("OPENAI_API_KEY")
-            response = openai.ChatCompletion.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": SUGGESTION_SYSTEM_CONTENT_INSIGHTS},
-                    {"role": "user", "content": input_text}
-                ],
-                max_tokens=4000,
-                temperature=0.7,
-            )
-            ai_response = response['choices'][0]['message']['content'].strip()
+            insight_request = SuggestionInsights.load(request.data.get('lesson_id'), request.data.get('notification_id'))
+        except SuggestionInsights.InsightError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-            # Update the existing suggestion with the new insights and old content
-            existing_suggestion.insights = ai_response
-
-            if not existing_suggestion.old_content:
-                existing_suggestion.old_content = lesson_content_text
-
-            existing_suggestion.save()
-
-            # Reformat faq_questions into bullet points
-            formatted_faq_questions = '<p><i>'.join([f"&#8226; {question}" for question in faq_questions]) + '</i></p>'
-
-            response_data = {
-                "suggestion": SuggestionSerializer(existing_suggestion).data,
-                "faq_questions": formatted_faq_questions
-            }
-
-            print("Insight is created now, fetching...")
+        try:
+            response = None
+            if insight_request.needs_insights:
+                response = LlmClients.chat_completion(
+                    SuggestionInsights.MODEL, insight_request.messages(),
+                    max_tokens=SuggestionInsights.MAX_TOKENS, temperature=SuggestionInsights.TEMPERATURE,
+                )
+            response_data = SuggestionInsights.save(insight_request, response)
+        except Exception as e:
+            logger.exception("Could not create the insights of notification %s", insight_request.suggestion.notification_id)
+            return Response({"error": str(e), "stack_trace": traceback.format_exc()}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-            if IsCreated:
-                return Response(response_data, status=status.HTTP_201_CREATED)
-            
-            return Response(response_data, status=status.HTTP_200_OK)
+        return Response(response_data, status=status.HTTP_201_CREATED if insight_request.created else status.HTTP_200_OK)
 
-        except Exception as e:
-            stack_trace = traceback.format_exc()
-            print(f"Error: {str(e)}\nStack Trace:\n{stack_trace}")
-            return Response({"error": str(e), "stack_trace": stack_trace}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        
     def getContentIfExist(self, request):
         lesson_id = request.data.get('lesson_id')
         notification_id = request.data.get('notification_id')
@@ -360,67 +219,21 @@ class SuggestionController(ModelViewSet):
     ###--------------------------------------------------------------------------------------------------------###
     #                                                                                                            #
     #    CREATING CONTENTS                                                                                       # 
-    #    startBackgroundCreation - starts the process and traverse all the notification and asoociated lessons   #
+    #    startBackgroundCreation - queues notifications missing a suggestion for run_suggestion_worker           #
     #                                                                                                            #
     ###--------------------------------------------------------------------------------------------------------###
     
     @csrf_exempt
     def startBackgroundCreation(self, request):
         """
-        Start background content creation process.
+        Queue the notifications still missing suggestion content. The jobs are run by
+        `manage.py run_suggestion_worker`, never by a web worker.
         """
-        if not self.isRunning:
-            self.isRunning = True
-            thread = threading.Thread(target=self.createContentForAllNotifications, daemon=True)
-            thread.start()
-            return Response({"status": "Background content creation started."}, status=status.HTTP_200_OK)
-        else:
-            return Response({"status": "Background content creation is already running."}, status=status.HTTP_400_BAD_REQUEST)
-
-    def createContentForAllNotifications(self):
-        """
-        Continuously traverse through all notifications and create or update suggestions.
-        Stops when there are no more notifications without suggestions or without content.
-        """
-        while self.isRunning:
-            # Fetch notifications without a suggestion or with a suggestion having no content
-            notifications = Notification.objects.filter(
-                Q(notification__isnull=True) | Q(notification__content__isnull=True)
-            ).distinct()
-
-            if notifications.exists():
-                # Process each notification that needs a suggestion
-                for notification in notifications:
-                    self.createOrUpdateSuggestion(notification)
-
-                # Short sleep to avoid rapid looping (prevents high CPU usage)
-                time.sleep(1)
-
-            else:
-                # No notifications to process, sleep longer before rechecking
-                print("No more notifications to process. Sleeping for 1 minute...")
-                time.sleep(15)  # Sleep for 5 minutes before checking again
-    # Sleep for 5 minutes before checking again
-
-
-        # while self.isRunning:
-        #     # Fetch notifications that do not have an associated suggestion
-        #     notifications = Notification.objects.filter(
-        #         notification__isnull=True
-        #     )
-
-        #     if notifications.exists():
-        #         # Process each notification without a suggestion
-        #         for notification in notifications:
-        #             self.createOrUpdateSuggestion(notification)
-        #     else:
-        #         # No more notifications to process, stop the loop
-        #         print("No more notifications to process. Stopping background creation.")
-        #         self.isRunning = False
-        #         break
-
-        #     # Short sleep to avoid rapid looping (prevents high CPU usage)
-        #     time.sleep(1)
+        queued = SuggestionQueue.enqueue_missing()
+        return Response(
+            {"status": f"Queued {queued} notification(s) for suggestion generation.", "queue": SuggestionQueue.queue_status()},
+            status=status.HTTP_200_OK,
+        )
 
     def createOrUpdateSuggestion(self, notification):
         """
@@ -441,7 +254,7 @@ class SuggestionController(ModelViewSet):
 
             # If suggestion already has content, skip further processing
             if suggestion.content:
-                print(f"Suggestion already exists for notification {notification.notif_id}. Skipping...")
+                logger.info("Suggestion already exists for notification %s, skipping", notification.notif_id)
                 return
 
             # Fetch lesson contents
@@ -453,18 +266,24 @@ class SuggestionController(ModelViewSet):
             faqs = Faq.objects.filter(grouped_questions__in=groupedQuestions).select_related('grouped_questions__notification')
             faqQuestions = [faq.question for faq in faqs if faq.grouped_questions and faq.grouped_questions.notification]
 
-            inputText = prompt_create_content_abs(faqQuestions, lessonContentText)
+            # Trailing pages that do not fit the budget are left out whole; they stay as they are when the suggestion is applied.
+            # The suggestion replaces the pages it was given, so a first page too large for the prompt fails instead of being cut
+            prompt = PromptBudget.build_prompt(
+                self.suggestion_model, prompt_create_content_abs, faqQuestions, [content.contents for content in lessonContents],
+                max_tokens=5700, system_prompt=SUGGESTION_SYSTEM_CONTENT, truncate=False,
+            )
 
-            # Call OpenAI API to get the suggestion
-            openai.api_key = os.environ.get("OPENAI_API_KEY")
-            response = openai.ChatCompletion.create(
-                model="gpt-4o",
+            # Call OpenAI API to get the suggestion. Workers in every process share the model's rate limit,
+            # a request the LLM response cache does not answer waits for a token
+            response = LlmClients.chat_completion(
+                model=self.suggestion_model,
                 messages=[
                     {"role": "system", "content": SUGGESTION_SYSTEM_CONTENT},
-                    {"role": "user", "content": inputText}
+                    {"role": "user", "content": prompt.text}
                 ],
                 max_tokens=5700,
                 temperature=0.5,
+                rate_limit=True,
             )
             aiResponse = response['choices'][0]['message']['content'].strip()
 
@@ -474,12 +293,12 @@ class SuggestionController(ModelViewSet):
                 if not suggestion.old_content:
                     suggestion.old_content = lessonContentText
                 suggestion.save()
-                print(f"Suggestion created for notification {notification.notif_id}: {suggestion.content}\n\n\n")
+                logger.info("Suggestion created for notification %s", notification.notif_id)
 
-        except Exception as e:
-            import traceback
-            print(f"Error in creating content for notification {notification.notif_id}: {e}")
-            traceback.print_exc()
+        except Exception:
+            logger.exception("Error in creating content for notification %s", notification.notif_id)
+            # Raised again so the suggestion queue retries the job
+            raise
         
 
     def updateContent(self, request):
@@ -508,36 +327,12 @@ class SuggestionController(ModelViewSet):
             page_contents = result[1]
             # print("Page contents = ", page_contents)
 
-            # Get All Previous Lesson Contents
-            prev_contents = LessonContent.objects.filter(lesson_id=lesson_id).order_by('id')
-            prev_contents_list = list(prev_contents)
-
-            # print("length")
-            # print("page_contents length = ", len(page_contents))
-            # print("prev_contents_list length = ", len(prev_contents_list))
-
-            # Update existing pages first
-            for index, content in enumerate(page_contents[:len(prev_contents_list)]):
-                lesson_content = prev_contents_list[index]
-                lesson_content.contents = content.strip()  # Assign content of the page
-                lesson_content.save()
-                print(f"Updated LessonContent page {index + 1}: {content}")
-
-            # If new content has more pages than the existing ones, create new LessonContent for the extra pages
-            if len(page_contents) > len(prev_contents_list):
-                for new_index in range(len(prev_contents_list), len(page_contents)):
-                    new_content = page_contents[new_index]
-                    if new_content.strip():  # Only create new page if content is not empty
-                        new_lesson_content = LessonContent(
-                            lesson_id=lesson_id,
-                            contents=new_content.strip()
-                        )
-                        new_lesson_content.save()
-                        print(f"Created new LessonContent page {new_index + 1}: {new_content}")
+            # Update existing pages first, then create the extra ones (skipping empty pages)
+            updated, created = LessonContentsController.write_pages(lesson_id, page_contents, skip_blank=True)
+            logger.info("Updated %d and created %d LessonContent page(s) of lesson %s", updated, created, lesson_id)
 
             # Delete the LessonContent entries where the contents are just the delimiter (empty pages)
             LessonContent.objects.filter(lesson_id=lesson_id, contents="<!-- delimiter -->").delete()
-            print(f"Deleted blank pages with content only as <!-- delimiter -->")
 
             # If new content has fewer pages, just update existing pages (no deletion allowed)
             return Response({"message": "Content updated successfully"}, status=status.HTTP_200_OK)
@@ -546,7 +341,7 @@ class SuggestionController(ModelViewSet):
             return Response({"error": "Lesson not found"}, status=status.HTTP_404_NOT_FOUND)
 
         except Exception as e:
-            print(f"Error: {str(e)}")
+            logger.exception("Could not update the content of lesson %s", lesson_id)
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
     # Revert content logic
@@ -572,35 +367,16 @@ class SuggestionController(ModelViewSet):
             page_contents = result[1]
             # print("Split old content into pages:", page_contents)
 
-            # Get all the existing LessonContent records for the lesson_id
-            lesson_contents = LessonContent.objects.filter(lesson_id=lesson_id).order_by('id')
-            lesson_contents_list = list(lesson_contents)
-
-            print(f"Existing pages: {len(lesson_contents_list)}, Reverted content pages: {len(page_contents)}")
-
-            # Update existing pages
-            for index in range(min(len(lesson_contents_list), len(page_contents))):
-                lesson_content = lesson_contents_list[index]
-                lesson_content.contents = page_contents[index].strip()  # Assign the old page content
-                lesson_content.save()
-                print(f"Updated LessonContent page {index + 1} with old content")
-
-            # If old content has more pages, create new LessonContent for the excess pages
-            if len(page_contents) > len(lesson_contents_list):
-                for index in range(len(lesson_contents_list), len(page_contents)):
-                    new_lesson_content = LessonContent(
-                        lesson_id=lesson_id,
-                        contents=page_contents[index].strip()
-                    )
-                    new_lesson_content.save()
-                    print(f"Created new LessonContent page {index + 1} with old content")
+            # Update existing pages with the old content, create pages for the excess
+            updated, created = LessonContentsController.write_pages(lesson_id, page_contents)
+            logger.info("Reverted lesson %s: updated %d and created %d LessonContent page(s)", lesson_id, updated, created)
 
             return Response({"message": "Lesson content reverted successfully"}, status=status.HTTP_200_OK)
 
         except LessonContent.DoesNotExist:
             return Response({"error": "Lesson content not found"}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
-            print(f"Error: {str(e)}")
+            logger.exception("Could not revert the content of lesson %s", lesson_id)
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
 
@@ -0,0 +1,46 @@
+import logging
+import traceback
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+
+from api.controllers.AsyncApiView import AsyncApiView
+from api.services import LlmClients, SuggestionInsights
+
+logger = logging.getLogger(__name__)
+
+
+class SuggestionInsightController(AsyncApiView):
+    """
+    Async SuggestionController.createInsight, routed in its place when
+    ASYNC_LLM_VIEWS is on.
+    """
+    llm_model = SuggestionInsights.MODEL
+
+    async def post(self, request):
+        data = self.request_data(request)
+        if data is None:
+            return JsonResponse({"error": "Invalid request body"}, status=400)
+
+        try:
+            insight_request = await sync_to_async(SuggestionInsights.load)(
+                data.get('lesson_id'), data.get('notification_id')
+            )
+        except SuggestionInsights.InsightError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+
+        try:
+            response = None
+            if insight_request.needs_insights:
+                messages = await sync_to_async(insight_request.messages)()
+                response = await LlmClients.achat_completion(
+                    SuggestionInsights.MODEL, messages,
+                    max_tokens=SuggestionInsights.MAX_TOKENS, temperature=SuggestionInsights.TEMPERATURE,
+                )
+            # The nested lesson serializer reads related rows, which the async ORM cannot do lazily
+            response_data = await sync_to_async(SuggestionInsights.save)(insight_request, response)
+        except Exception as e:
+            logger.exception("Could not create the insights of notification %s", insight_request.suggestion.notification_id)
+            return JsonResponse({"error": str(e), "stack_trace": traceback.format_exc()}, status=500)
+
+        return JsonResponse(response_data, status=201 if insight_request.created else 200)
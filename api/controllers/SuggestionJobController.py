@@ -0,0 +1,16 @@
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.viewsets import GenericViewSet
+from rest_framework.authentication import SessionAuthentication, TokenAuthentication
+from rest_framework.permissions import IsAuthenticated
+
+from api.services import SuggestionQueue
+
+
+class SuggestionJobController(GenericViewSet):
+    authentication_classes = [SessionAuthentication, TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def getQueueStatus(self, request):
+        # Queue depth per status and age in seconds of the oldest pending notification
+        return Response(SuggestionQueue.queue_status(), status=status.HTTP_200_OK)
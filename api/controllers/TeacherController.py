@@ -8,6 +8,7 @@ from rest_framework.viewsets import GenericViewSet
 from rest_framework.mixins import CreateModelMixin
 from api.model.Teacher import Teacher
 from api.serializer.TeacherSerializer import TeacherSerializer
+from api.services import TeacherSettings
 
 
 class TeacherController(ModelViewSet):
@@ -17,11 +18,10 @@ class TeacherController(ModelViewSet):
 
     @action(detail=False, methods=['get'], permission_classes=[AllowAny], url_path='getthreshold')
     def get_threshold(self, request):
-        try:
-            teacher_profile = Teacher.objects.get(id=1)
-            return Response({"similarity_threshold": teacher_profile.threshold})
-        except Teacher.DoesNotExist:
+        teacher_settings = TeacherSettings.get()
+        if teacher_settings is None:
             return Response({"error": "TeacherProfile not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"similarity_threshold": teacher_settings.threshold})
 
     @action(detail=False, methods=['patch'], url_path='setthreshold')
     def set_threshold(self, request):
@@ -46,11 +46,10 @@ class TeacherController(ModelViewSet):
 
     @action(detail=False, methods=['get'],url_path='getsuggestion')
     def get_suggestion(self, request):
-        try:
-            teacher_profile = Teacher.objects.get(id=1)
-            return Response({"teacher_allow_suggestion": teacher_profile.suggestion})
-        except Teacher.DoesNotExist:
+        teacher_settings = TeacherSettings.get()
+        if teacher_settings is None:
             return Response({"error": "TeacherProfile not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"teacher_allow_suggestion": teacher_settings.suggestion})
 
     @action(detail=False, methods=['patch'], url_path='setsuggestion')
     def set_suggestion(self, request):
@@ -68,11 +67,10 @@ class TeacherController(ModelViewSet):
 
     @action(detail=False, methods=['get'], permission_classes=[AllowAny], url_path='getnotification')
     def get_notification_threshold(self, request):
-        try:
-            teacher_profile = Teacher.objects.get(id=1)
-            return Response({"notification_threshold": teacher_profile.notification_threshold})
-        except Teacher.DoesNotExist:
+        teacher_settings = TeacherSettings.get()
+        if teacher_settings is None:
             return Response({"error": "TeacherProfile not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"notification_threshold": teacher_settings.notification_threshold})
 
     @action(detail=False, methods=['patch'], url_path='setnotification')
     def set_notification_threshold(self, request):
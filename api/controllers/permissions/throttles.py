@@ -0,0 +1,23 @@
+from rest_framework.throttling import BaseThrottle
+
+from api.services import RateLimiter
+
+
+class LlmRateThrottle(BaseThrottle):
+    """
+    Token buckets per user, per lesson and per model (RateLimiter) for the
+    viewset actions that call the LLM. The view maps those actions to their
+    model in llm_models; other actions are not throttled.
+    """
+
+    def allow_request(self, request, view):
+        model = getattr(view, 'llm_models', {}).get(getattr(view, 'action', None))
+        if model is None:
+            return True
+
+        lesson_id = view.kwargs.get('lesson_id') or request.data.get('lesson_id')
+        self.decision = RateLimiter.acquire(request.user.pk, lesson_id, model)
+        return self.decision.allowed
+
+    def wait(self):
+        return self.decision.retry_after
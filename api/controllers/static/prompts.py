@@ -15,6 +15,22 @@ def prompt_history_content(lesson_title,lesson_subtitle,content):
 
 SUGGESTION_SYSTEM_CONTENT = "You are a helpful assistant. RETURN AN HTML MARKUP. USE <br> for breaking lines. I DONT WANT TO SEE ANY NEWLINES \n ON YOUR RESPONSE. I WILL BE DISAPPOINTED"
 SUGGESTION_SYSTEM_CONTENT_INSIGHTS = "You are a helpful assistant. ALWAYS RESPOND IN HTML MARKUP, USE <br> for newlines instead of \\n, dont state the title like \" Insights\" instead go directly to your answer and use <h1> up to <h3> for titles, not **"
+DELIMITER_SYSTEM_CONTENT = "I WILL PROVIDE YOU TEXT IN HTML FORMAT, AND YOU MUST RETURN HTML FORMAT CONTENT. ONLY REPLY WITH HTML."
+# Filled in with str.format() for each span of an edited suggestion whose page breaks were not clear
+DELIMITER_SPAN_PROMPT = """ADD EXACTLY {count} `<!-- delimiter -->` TAG(S) TO THE EDITED PART BELOW.
+A DELIMITER STARTS A NEW PAGE. THE ORIGINAL LESSON HAD A PAGE BREAK BETWEEN THE TWO ORIGINAL PARTS BELOW,
+PUT THE DELIMITERS WHERE THE EDITED PART MOVES FROM WHAT WAS BEFORE THE BREAK TO WHAT WAS AFTER IT.
+DO NOT CHANGE, ADD OR REMOVE ANYTHING ELSE, KEEP EVERY TAG, LINK AND EXISTING DELIMITER EXACTLY AS IT IS.
+REPLY ONLY WITH THE EDITED PART AND ITS DELIMITERS, NO COMMENTS OR EXPLANATIONS.
+
+ORIGINAL, BEFORE THE PAGE BREAK:
+{before}
+
+ORIGINAL, AFTER THE PAGE BREAK:
+{after}
+
+EDITED PART:
+{text}"""
 
 # SUGGESTION_SYSTEM_CONTENT_PROPOSE = f"""VERY IMPORTANT NOTE: GIVEN THESE HTML MARKUP REMOVE ALL THE CONTENT WRAPPED BY <mark style="background-color: lightcoral;"> UNTIL YOU FIND ITS CLOSING TAG
 #                                       VERY IMPORTANT NOTE: ALSO IF YOU ENCOUNTER <mark></mark> WITH NO STYLE OF BACKGROUND COLOR LIGHTCORAL YOU MUST RETAIN IT AND REMOVE ITS TAG SO THAT
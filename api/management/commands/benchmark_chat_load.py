@@ -0,0 +1,62 @@
+import asyncio
+import statistics
+import time
+
+import httpx
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test a running server's chatbot endpoint with many concurrent chats and report how many the "
+        "server kept in flight. Point the server at `manage.py run_stub_llm` (LLM_API_BASE) first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help="Base URL of the server under test.")
+        parser.add_argument('--stub-url', default='http://127.0.0.1:8089', help="Base URL of the stub LLM.")
+        parser.add_argument('--token', required=True, help="DRF auth token of a user.")
+        parser.add_argument('--lesson', type=int, required=True)
+        parser.add_argument('--page', type=int, required=True, help="Lesson content id.")
+        parser.add_argument('--requests', type=int, default=100)
+        parser.add_argument('--concurrency', type=int, default=50)
+
+    def handle(self, *args, **options):
+        asyncio.run(self.run(options))
+
+    async def run(self, options):
+        endpoint = f"{options['url'].rstrip('/')}/api/lessons/{options['lesson']}/pages/{options['page']}/chatbot/"
+        headers = {"Authorization": f"Token {options['token']}"}
+        limits = httpx.Limits(max_connections=options['concurrency'])
+        gate = asyncio.Semaphore(options['concurrency'])
+        latencies, errors = [], []
+
+        async with httpx.AsyncClient(headers=headers, limits=limits, timeout=300) as client:
+            await client.post(f"{options['stub_url'].rstrip('/')}/stats/reset")
+
+            async def chat(i):
+                async with gate:
+                    start = time.perf_counter()
+                    try:
+                        response = await client.post(endpoint, json={"message": f"load test question {i}"})
+                        response.raise_for_status()
+                        latencies.append(time.perf_counter() - start)
+                    except httpx.HTTPError as exc:
+                        errors.append(exc)
+
+            start = time.perf_counter()
+            await asyncio.gather(*(chat(i) for i in range(options['requests'])))
+            elapsed = time.perf_counter() - start
+
+            stats = (await client.get(f"{options['stub_url'].rstrip('/')}/stats")).json()
+
+        if not latencies:
+            self.stderr.write(f"All {len(errors)} requests failed, e.g. {errors[0]!r}")
+            return
+
+        latencies.sort()
+        self.stdout.write(
+            f"{len(latencies)} chats in {elapsed:.1f}s ({len(latencies) / elapsed:.1f}/s), "
+            f"p50={statistics.median(latencies):.2f}s p95={latencies[int(len(latencies) * 0.95) - 1]:.2f}s, "
+            f"errors={len(errors)}, max concurrent chats at the LLM={stats['max_in_flight']}"
+        )
@@ -0,0 +1,68 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from api.model.ContentHistory import ContentHistory
+from api.services import DelimiterAlignment
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure DelimiterAlignment against recorded lesson edits: every content history version with a parent "
+        "is an edit of the parent, and its own delimiters are the expected placement. Reports exactly placed "
+        "documents, placed delimiters, the share that would still go to the LLM (ambiguous) and the time per "
+        "document. The accuracy on synthetic edits is covered by DelimiterAlignmentTests in api/tests.py."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lesson', type=int, help="Only use this lesson id.")
+
+    def handle(self, *args, **options):
+        pairs = self.recorded_pairs(options)
+
+        counts = defaultdict(int)
+        timings = []
+        for original, expected in pairs:
+            edited = expected.replace(DelimiterAlignment.DELIMITER, "")
+            expected_boundaries = DelimiterAlignment.boundaries(expected)
+            if len(expected_boundaries) != len(DelimiterAlignment.boundaries(original)):
+                # Pages were added or removed: there is no placement to compare with
+                counts['skipped'] += 1
+                continue
+
+            alignment = DelimiterAlignment.align(original, edited)
+            placed = DelimiterAlignment.boundaries(alignment.content)
+            timings.append(alignment.seconds * 1000)
+            counts['documents'] += 1
+            counts['exact'] += placed == expected_boundaries
+            counts['delimiters'] += len(expected_boundaries)
+            counts['correct'] += len(set(placed) & set(expected_boundaries))
+            counts['ambiguous'] += len(alignment.ambiguous)
+            counts['documents_ambiguous'] += bool(alignment.ambiguous)
+
+        if not counts['documents']:
+            self.stdout.write(f"No edits to compare ({counts['skipped']} skipped).")
+            return
+
+        timings.sort()
+        documents = counts['documents']
+        delimiters = counts['delimiters'] or 1
+        self.stdout.write(
+            f"documents={documents} (skipped {counts['skipped']})  exact={counts['exact'] / documents:6.1%}  "
+            f"delimiters={counts['delimiters']} correct={counts['correct'] / delimiters:6.1%}  "
+            f"ambiguous={counts['ambiguous'] / delimiters:6.1%} "
+            f"(LLM fallback for {counts['documents_ambiguous'] / documents:6.1%} of documents)"
+        )
+        self.stdout.write(
+            f"time per document: p50={timings[len(timings) // 2]:.2f} ms  "
+            f"p95={timings[min(len(timings) - 1, int(len(timings) * 0.95))]:.2f} ms  max={timings[-1]:.2f} ms"
+        )
+
+    @staticmethod
+    def recorded_pairs(options):
+        # (parent content, child content) of every saved edit
+        versions = ContentHistory.objects.filter(parent__isnull=False).select_related('parent').order_by('historyId')
+        if options['lesson']:
+            versions = versions.filter(lessonId=options['lesson'])
+        for version in versions.iterator():
+            yield version.parent.content, version.content
@@ -0,0 +1,85 @@
+import random
+import time
+from collections import Counter, defaultdict
+
+from django.core.management.base import BaseCommand
+
+from api.services import TextVector
+from api.services.FaqIndex import LessonFaqIndex
+from api.services.GroupCentroids import best_group
+
+COMMON_WORDS = ["what", "is", "the", "how", "does", "why", "a", "of", "in", "can"]
+
+
+class Command(BaseCommand):
+    help = "Compare nearest-FAQ and group-centroid matching on synthetic topics: grouping quality and latency."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', type=int, default=5000)
+        parser.add_argument('--topics', type=int, default=50)
+        parser.add_argument('--threshold', type=float, default=0.3)
+        parser.add_argument('--seed', type=int, default=7)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        topics = [[f"topic{t}word{w}" for w in range(8)] for t in range(options['topics'])]
+
+        stream = []
+        for _ in range(options['questions']):
+            topic = rng.randrange(len(topics))
+            words = rng.sample(COMMON_WORDS, 2) + rng.sample(topics[topic], rng.randint(1, 3))
+            rng.shuffle(words)
+            stream.append((topic, TextVector.word_frequencies(TextVector.tokenize(" ".join(words)))))
+
+        for mode in ('faq', 'centroid'):
+            assignments, elapsed = self.simulate(mode, stream, options['threshold'])
+            purity, groups = self.purity(assignments, [topic for topic, _ in stream])
+            self.stdout.write(
+                f"mode={mode:<8}  groups={groups:>5} (topics={len(topics)})  purity={purity:.3f}  "
+                f"latency={elapsed * 1000 / len(stream):.3f} ms/question"
+            )
+
+    def simulate(self, mode, stream, threshold):
+        term_ids = {}
+        index = LessonFaqIndex(lesson_id=None)
+        faq_groups = {}
+        centroids = {}
+        assignments = []
+
+        start = time.perf_counter()
+        for faq_id, (_, word_counts) in enumerate(stream, start=1):
+            message_vector = {term_ids.setdefault(term, len(term_ids) + 1): count for term, count in word_counts.items()}
+            message_norm = TextVector.vector_norm(word_counts)
+
+            if mode == 'centroid':
+                group_id, similarity = best_group(
+                    message_vector, message_norm,
+                    ((gid, centroid, norm) for gid, (centroid, norm) in centroids.items()),
+                )
+            else:
+                best_faq, similarity = index.best_match(message_vector, message_norm)
+                group_id = faq_groups.get(best_faq)
+
+            if group_id is None or similarity < threshold:
+                group_id = len(centroids) + 1
+                centroids[group_id] = ({}, 0.0)
+
+            # Same bookkeeping the signals do for a stored FAQ
+            term_vector = sorted(message_vector.items())
+            index.add(faq_id, term_vector, message_norm)
+            faq_groups[faq_id] = group_id
+            centroid, _ = centroids[group_id]
+            for term_id, count in term_vector:
+                centroid[str(term_id)] = centroid.get(str(term_id), 0) + count
+            centroids[group_id] = (centroid, TextVector.vector_norm(centroid))
+            assignments.append(group_id)
+
+        return assignments, time.perf_counter() - start
+
+    @staticmethod
+    def purity(assignments, truth):
+        members = defaultdict(Counter)
+        for group_id, topic in zip(assignments, truth):
+            members[group_id][topic] += 1
+        dominant = sum(counter.most_common(1)[0][1] for counter in members.values())
+        return dominant / len(truth), len(members)
@@ -0,0 +1,92 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.services import TextVector
+from api.services.FaqIndex import LessonFaqIndex
+from api.services.FaqMatrix import FaqMatrix
+
+WORDS = [
+    "what", "is", "the", "how", "does", "why", "difference", "between", "example", "of",
+    "entrepreneur", "startup", "market", "innovation", "risk", "capital", "business", "plan",
+    "customer", "product", "value", "proposition", "pitch", "investor", "funding", "growth",
+    "strategy", "competition", "technology", "opportunity", "model", "canvas", "revenue",
+    "cost", "segment", "channel", "partner", "resource", "activity", "prototype", "mvp",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark FAQ matching: brute-force scan vs inverted index vs sparse matrix batch (in memory, no DB). "
+        "Index latency still grows with the lesson, through the postings of the rare words of each message."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000, 100000])
+        parser.add_argument('--messages', type=int, default=200)
+        parser.add_argument('--vocabulary', type=int, default=20000)
+        parser.add_argument('--seed', type=int, default=7)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        # Long-tail vocabulary: a few common words plus many rare topic terms
+        vocabulary = WORDS + [f"term{i}" for i in range(options['vocabulary'])]
+
+        def random_question():
+            common = rng.sample(WORDS[:10], 2)
+            rare = [rng.choice(vocabulary) for _ in range(rng.randint(2, 6))]
+            return " ".join(common + rare)
+
+        term_ids = {}
+
+        def to_term_vector(word_counts):
+            return {term_ids.setdefault(term, len(term_ids) + 1): count for term, count in word_counts.items()}
+
+        messages = [TextVector.word_frequencies(TextVector.tokenize(random_question()))
+                    for _ in range(options['messages'])]
+
+        for size in options['sizes']:
+            questions = [random_question() for _ in range(size)]
+            vectors = [TextVector.word_frequencies(TextVector.tokenize(q)) for q in questions]
+            term_vectors = [sorted(to_term_vector(vector).items()) for vector in vectors]
+            norms = [TextVector.vector_norm(vector) for vector in vectors]
+            index = LessonFaqIndex(lesson_id=None)
+            for faq_id, (term_vector, norm) in enumerate(zip(term_vectors, norms), start=1):
+                index.add(faq_id, term_vector, norm)
+
+            start = time.perf_counter()
+            indexed = [index.best_match(to_term_vector(message), TextVector.vector_norm(message))
+                       for message in messages]
+            index_ms = (time.perf_counter() - start) * 1000 / len(messages)
+
+            matrix = FaqMatrix(range(1, size + 1), term_vectors, norms)
+            start = time.perf_counter()
+            batched = matrix.best_matches(
+                [sorted(to_term_vector(message).items()) for message in messages],
+                [TextVector.vector_norm(message) for message in messages],
+            )
+            matrix_ms = (time.perf_counter() - start) * 1000 / len(messages)
+
+            brute_messages = messages[:max(1, min(len(messages), 2_000_000 // size))]
+            start = time.perf_counter()
+            brute = [self.brute_force(message, vectors) for message in brute_messages]
+            brute_ms = (time.perf_counter() - start) * 1000 / len(brute_messages)
+
+            index_mismatches = sum(1 for a, b in zip(indexed, brute) if a != b)
+            matrix_mismatches = sum(1 for a, b in zip(batched, brute) if a != b)
+            self.stdout.write(
+                f"faqs={size:>7}  index={index_ms:8.3f} ms/msg  matrix={matrix_ms:8.3f} ms/msg  "
+                f"brute={brute_ms:9.3f} ms/msg  "
+                f"mismatches index={index_mismatches}/{len(brute)} matrix={matrix_mismatches}/{len(brute)}"
+            )
+
+    @staticmethod
+    def brute_force(message_vector, vectors):
+        # Same scan process_message_and_add_to_faq used to run
+        max_sim_value, best_id = -1, None
+        for faq_id, vector in enumerate(vectors, start=1):
+            cosine_sim = TextVector.cosine_similarity(message_vector, vector)
+            if cosine_sim > max_sim_value:
+                max_sim_value, best_id = cosine_sim, faq_id
+        return best_id, max_sim_value
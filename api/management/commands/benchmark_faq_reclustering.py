@@ -0,0 +1,85 @@
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from api.model.Faq import Faq
+from api.model.GroupedQuestions import GroupedQuestions
+from api.model.Lesson import Lesson
+from api.model.RelatedContent import RelatedContent
+from api.services import FaqReclustering, NearDuplicates, TextVector, Vocabulary
+
+COMMON_WORDS = ["what", "is", "the", "how", "does", "why", "a", "of", "in", "can"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Time FAQ re-clustering of a synthetic lesson, stored in the database and rolled back afterwards. "
+        "Every --repeat-every question is a near-verbatim repeat of an earlier one."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+        parser.add_argument('--topics', type=int, default=500)
+        parser.add_argument('--repeat-every', type=int, default=5)
+        parser.add_argument('--threshold', type=float, default=0.3)
+        parser.add_argument('--seed', type=int, default=7)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        # Made-up words, so questions of different topics share no more shingles than real ones
+        letters = "abcdefghijklmnopqrstuvwxyz"
+        topics = [
+            ["".join(rng.choice(letters) for _ in range(rng.randint(5, 10))) for _ in range(8)]
+            for _ in range(options['topics'])
+        ]
+
+        for size in options['sizes']:
+            questions = []
+            for i in range(size):
+                if questions and i % options['repeat_every'] == 0:
+                    questions.append(rng.choice(questions).upper() + "?")
+                    continue
+                words = rng.sample(COMMON_WORDS, 2) + rng.sample(rng.choice(topics), rng.randint(1, 3))
+                rng.shuffle(words)
+                questions.append(" ".join(words))
+
+            with transaction.atomic():
+                start = time.perf_counter()
+                faq_count = self.store(questions)
+                stored = time.perf_counter() - start
+
+                start = time.perf_counter()
+                faq_count, group_count = FaqReclustering.recluster_lesson(self.lesson.id, options['threshold'])
+                elapsed = time.perf_counter() - start
+                transaction.set_rollback(True)
+
+            self.stdout.write(
+                f"faqs={faq_count:>7}  groups={group_count:>6}  recluster={elapsed:7.2f}s  "
+                f"(setup {stored:.2f}s, duplicate threshold {settings.FAQ_DUPLICATE_THRESHOLD})"
+            )
+
+    def store(self, questions):
+        # Stored as the signals would, in one pass instead of a save per FAQ
+        lesson_number = (Lesson.objects.aggregate(Max('lessonNumber'))['lessonNumber__max'] or 0) + 1
+        self.lesson = Lesson.objects.create(lessonNumber=lesson_number, title="Re-clustering benchmark", subtitle="")
+        related_content = RelatedContent.objects.create(lesson=self.lesson, general_context=questions[0])
+        grouped_questions = GroupedQuestions.objects.create(lesson=self.lesson, related_content=related_content)
+
+        word_counts = [TextVector.word_frequencies(TextVector.tokenize(question)) for question in questions]
+        term_ids = Vocabulary.term_ids({term for counts in word_counts for term in counts}, create=True)
+        faqs = [
+            Faq(
+                lesson=self.lesson, related_content=related_content, grouped_questions=grouped_questions,
+                question=question,
+                term_vector=sorted([term_ids[term], count] for term, count in counts.items()),
+                vector_norm=TextVector.vector_norm(counts),
+                minhash_signature=NearDuplicates.signature(question),
+            )
+            for question, counts in zip(questions, word_counts)
+        ]
+        Faq.objects.bulk_create(faqs, batch_size=FaqReclustering.BATCH_SIZE)
+        return len(faqs)
@@ -0,0 +1,83 @@
+import statistics
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import openai
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from langchain_community.chat_models import ChatOpenAI
+
+from api.services import LlmClients
+
+MODEL = "gpt-3.5-turbo"
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare a ChatOpenAI built per request (the old chatbot path) with the shared LlmClients pool. "
+        "Start `manage.py run_stub_llm` first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8089/v1')
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=8)
+
+    def handle(self, *args, **options):
+        base_url = options['base_url']
+        warnings.filterwarnings('ignore', message=".*ChatOpenAI.*")
+        with override_settings(LLM_API_BASE=base_url, OPENAI_API_KEY=LlmClients.api_key() or 'stub'):
+            for mode in ('per-request', 'pooled'):
+                connections_before = self.server_connections(base_url)
+                latencies, elapsed = self.run(mode, options['requests'], options['concurrency'])
+                connections = self.server_connections(base_url) - connections_before
+                latencies.sort()
+                self.stdout.write(
+                    f"{mode:<12} {len(latencies) / elapsed:7.1f} req/s  "
+                    f"p50={statistics.median(latencies) * 1000:6.1f} ms  "
+                    f"p95={latencies[int(len(latencies) * 0.95) - 1] * 1000:6.1f} ms  "
+                    f"new connections={connections}"
+                )
+
+    def run(self, mode, total, concurrency):
+        call = self.per_request_call if mode == 'per-request' else self.pooled_call
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            latencies = list(executor.map(call, range(total)))
+        return latencies, time.perf_counter() - start
+
+    @staticmethod
+    def per_request_call(i):
+        # runserver and the old chatbot: a new thread, a new ChatOpenAI and a new HTTP session per message
+        result = {}
+
+        def request():
+            start = time.perf_counter()
+            openai.requestssession = None
+            llm = ChatOpenAI(
+                openai_api_key=LlmClients.api_key(), openai_api_base=settings.LLM_API_BASE,
+                model_name=MODEL, temperature=0,
+            )
+            llm.invoke(f"question {i}")
+            result['latency'] = time.perf_counter() - start
+
+        thread = threading.Thread(target=request)
+        thread.start()
+        thread.join()
+        return result['latency']
+
+    @staticmethod
+    def pooled_call(i):
+        start = time.perf_counter()
+        llm = LlmClients.chat_model(MODEL, temperature=0)
+        with LlmClients.limit(MODEL):
+            llm.invoke(f"question {i}")
+        return time.perf_counter() - start
+
+    @staticmethod
+    def server_connections(base_url):
+        return requests.get(base_url.rsplit('/v1', 1)[0] + '/stats', timeout=5).json()['connections']
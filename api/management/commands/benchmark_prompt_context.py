@@ -0,0 +1,76 @@
+import random
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from api.controllers.static.prompts import prompt_history_content
+from api.model.Lesson import Lesson
+from api.services import LessonRetrieval, TextVector, TokenCounter
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare chatbot prompt tokens with the whole page and with retrieved chunks, over the lesson pages "
+        "in the database. Questions are built from sentences of each page; 'found' is the share of questions "
+        "whose source sentence made it into the retrieved context."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lesson', type=int, help="Only benchmark this lesson id.")
+        parser.add_argument('--questions', type=int, default=5, help="Questions per page.")
+        parser.add_argument('--seed', type=int, default=7)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        lessons = Lesson.objects.order_by('id')
+        if options['lesson']:
+            lessons = lessons.filter(id=options['lesson'])
+
+        totals = defaultdict(int)
+        for lesson in lessons:
+            index = LessonRetrieval.LessonIndex.for_lesson(lesson.id)
+            page_texts = dict(lesson.lessoncontent_set.values_list('id', 'plain_text'))
+            counts = defaultdict(int)
+
+            for page_id, plain_text in page_texts.items():
+                for sentence, question in self.questions(rng, plain_text, options['questions']):
+                    chunks = index.select(page_id, question)
+                    context = "\n...\n".join(chunk.text for chunk in chunks)
+                    counts['questions'] += 1
+                    counts['page'] += self.prompt_tokens(lesson, plain_text)
+                    counts['retrieval'] += self.prompt_tokens(lesson, context)
+                    counts['found'] += any(sentence in chunk.text for chunk in chunks)
+
+            if counts['questions']:
+                self.report(f"lesson {lesson.id}", counts)
+            for key, value in counts.items():
+                totals[key] += value
+
+        if not totals['questions']:
+            self.stdout.write("No lesson page has enough text to ask about.")
+            return
+        self.report("total", totals)
+
+    @staticmethod
+    def questions(rng, plain_text, count):
+        # (source sentence, a question made of a few of its content words)
+        sentences = [
+            sentence.strip() for sentence in LessonRetrieval._SENTENCE_END.split(plain_text)
+            if len(TextVector.tokenize(sentence)) >= 3
+        ]
+        for sentence in rng.sample(sentences, min(count, len(sentences))):
+            words = [word for word in sentence.split() if word.lower() not in TextVector.STOPWORDS]
+            yield sentence, "What about " + " ".join(rng.sample(words, min(3, len(words)))) + "?"
+
+    @staticmethod
+    def prompt_tokens(lesson, content):
+        return TokenCounter.count_tokens(prompt_history_content(lesson.get_title(), lesson.get_subtitle(), content))[0]
+
+    def report(self, label, counts):
+        questions = counts['questions']
+        reduction = 1 - counts['retrieval'] / counts['page'] if counts['page'] else 0.0
+        self.stdout.write(
+            f"{label:<12} questions={questions:>5}  "
+            f"page={counts['page'] / questions:8.1f} tokens  retrieval={counts['retrieval'] / questions:8.1f} tokens  "
+            f"reduction={reduction:6.1%}  found={counts['found'] / questions:6.1%}"
+        )
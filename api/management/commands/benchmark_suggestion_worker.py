@@ -0,0 +1,80 @@
+import threading
+import time
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+from django.test.utils import override_settings
+
+from api.model.Lesson import Lesson
+from api.model.LessonContent import LessonContent
+from api.model.Notification import Notification
+from api.model.SuggestionJob import SuggestionJob
+from api.services import LlmClients, SuggestionQueue
+
+PAGE = "<p>Suggestion benchmark page {}. " + "Polynomials are sums of terms with whole exponents. " * 20 + "</p>"
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure suggestion worker throughput at several pool sizes against `manage.py run_stub_llm` "
+        "(its --latency stands in for a gpt-4o call). Creates a throwaway lesson with --jobs notifications "
+        "per run and deletes it afterwards; refuses to run while other suggestion jobs are queued."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8089/v1')
+        parser.add_argument('--jobs', type=int, default=40)
+        parser.add_argument('--concurrency', default='1,4,8',
+                            help="Comma separated pool sizes to compare.")
+        parser.add_argument('--pages', type=int, default=3, help="Pages of the benchmark lesson.")
+
+    def handle(self, *args, **options):
+        if SuggestionJob.objects.exists():
+            raise CommandError("The suggestion queue is not empty; run the benchmark on an idle database.")
+
+        base_url = options['base_url']
+        sizes = [int(size) for size in options['concurrency'].split(',')]
+        overrides = {
+            'LLM_API_BASE': base_url,
+            'OPENAI_API_KEY': LlmClients.api_key() or 'stub',
+            # Measure the pool, not the limits around it
+            'LLM_CONCURRENCY': [f"gpt-4o={max(sizes)}"],
+            'RATE_LIMIT_ENABLED': False,
+        }
+        with override_settings(**overrides):
+            baseline = None
+            for concurrency in sizes:
+                elapsed, failed, in_flight = self.run(concurrency, options['jobs'], options['pages'], base_url)
+                rate = options['jobs'] / elapsed
+                baseline = baseline or rate
+                self.stdout.write(
+                    f"concurrency={concurrency:>3}  {options['jobs']} jobs in {elapsed:6.2f}s  "
+                    f"{rate:6.2f} jobs/s  speedup={rate / baseline:5.2f}x  "
+                    f"failed={failed}  max in flight at the LLM={in_flight}"
+                )
+
+    def run(self, concurrency, jobs, pages, base_url):
+        lesson_number = (Lesson.objects.aggregate(Max('lessonNumber'))['lessonNumber__max'] or 0) + 1
+        lesson = Lesson.objects.create(lessonNumber=lesson_number, title="Suggestion benchmark")
+        try:
+            LessonContent.objects.bulk_create([
+                LessonContent(lesson=lesson, contents=PAGE.format(page)) for page in range(pages)
+            ])
+            for i in range(jobs):
+                # Queued by the post_save signal, like any other notification
+                Notification.objects.create(lesson=lesson, message=f"Benchmark notification {i}")
+
+            stub_url = base_url.rsplit('/v1', 1)[0]
+            requests.post(f"{stub_url}/stats/reset", timeout=5)
+            failed = []
+            start = time.perf_counter()
+            SuggestionQueue.run_jobs(
+                "benchmark", concurrency, threading.Event(), poll_interval=0.1, burst=True,
+                on_finished=lambda job, succeeded: succeeded or failed.append(job.id),
+            )
+            elapsed = time.perf_counter() - start
+            in_flight = requests.get(f"{stub_url}/stats", timeout=5).json()['max_in_flight']
+            return elapsed, len(failed), in_flight
+        finally:
+            lesson.delete()
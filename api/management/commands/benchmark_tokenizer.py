@@ -0,0 +1,45 @@
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.model.Faq import Faq
+from api.services.TextVector import Pipeline
+
+SAMPLE_QUESTIONS = [
+    "What is polymorphism?", "what is polymorphism", "How does a startup validate its business model canvas?",
+    "Why are investors interested in recurring revenue?", "Can you explain the difference between MVP and prototype?",
+    "What are the qualities of successful entrepreneurs?", "How do I identify customer segments for my product?",
+]
+
+
+class Command(BaseCommand):
+    help = "Microbenchmark the FAQ text normalization pipeline in tokens per second."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--texts', type=int, default=50000, help="Number of texts to tokenize.")
+        parser.add_argument('--from-db', action='store_true', help="Sample FAQ questions from the database.")
+
+    def handle(self, *args, **options):
+        questions = SAMPLE_QUESTIONS
+        if options['from_db']:
+            questions = list(Faq.objects.values_list('question', flat=True)[:10000]) or SAMPLE_QUESTIONS
+
+        rng = random.Random(7)
+        texts = [rng.choice(questions) for _ in range(options['texts'])]
+        words = sum(len(text.split()) for text in texts)
+
+        configurations = [
+            ('split only', ['lowercase']),
+            ('configured', settings.FAQ_TOKENIZER_STEPS),
+        ]
+        for label, steps in configurations:
+            pipeline = Pipeline(steps)
+            start = time.perf_counter()
+            terms = sum(len(pipeline.tokenize(text)) for text in texts)
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f"{label:<11} steps={','.join(sorted(steps)):<36} {words / elapsed:>12,.0f} input tokens/s  "
+                f"terms kept={terms / words:.0%}"
+            )
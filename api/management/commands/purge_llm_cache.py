@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from api.services import LlmCache
+
+
+class Command(BaseCommand):
+    help = "Delete stored LLM responses: all of them, or only those past LLM_CACHE_TTL and/or of one model."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', help="Only delete responses of this model, e.g. gpt-4o.")
+        parser.add_argument('--expired', action='store_true', help="Only delete responses past LLM_CACHE_TTL.")
+
+    def handle(self, *args, **options):
+        deleted = LlmCache.purge(model=options['model'], expired_only=options['expired'])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} cached LLM response(s)"))
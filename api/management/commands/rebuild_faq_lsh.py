@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.model.Faq import Faq
+from api.model.FaqLshBucket import FaqLshBucket
+from api.services import NearDuplicates
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = "Recompute FAQ MinHash signatures and rebuild the LSH buckets used for near-duplicate detection."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lesson', type=int, help="Only rebuild the FAQs of this lesson id.")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        faqs = Faq.objects.order_by('id')
+        buckets = FaqLshBucket.objects.all()
+        if options['lesson']:
+            faqs = faqs.filter(lesson_id=options['lesson'])
+            buckets = buckets.filter(lesson_id=options['lesson'])
+
+        rebuilt = 0
+        with transaction.atomic():
+            buckets.delete()
+
+            last_id = 0
+            while True:
+                batch = list(faqs.filter(id__gt=last_id).only('id', 'lesson_id', 'question')[:BATCH_SIZE])
+                if not batch:
+                    break
+
+                new_buckets = []
+                for faq in batch:
+                    faq.minhash_signature = NearDuplicates.signature(faq.question)
+                    new_buckets.extend(NearDuplicates.build_buckets(faq))
+
+                Faq.objects.bulk_update(batch, ['minhash_signature'])
+                FaqLshBucket.objects.bulk_create(new_buckets)
+                rebuilt += len(batch)
+                last_id = batch[-1].id
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt LSH buckets for {rebuilt} FAQs in {time.perf_counter() - start:.2f}s"
+        ))
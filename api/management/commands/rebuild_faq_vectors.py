@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.model.Faq import Faq
+from api.services import FaqIndex, GroupCentroids, Vocabulary
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = "Re-tokenize FAQ questions with the current FAQ_TOKENIZER_STEPS and rebuild term vectors and group centroids."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lesson', type=int, help="Only rebuild the FAQs of this lesson id.")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        faqs = Faq.objects.order_by('id')
+        if options['lesson']:
+            faqs = faqs.filter(lesson_id=options['lesson'])
+
+        rebuilt = 0
+        with transaction.atomic():
+            last_id = 0
+            while True:
+                batch = list(faqs.filter(id__gt=last_id).only('id', 'question')[:BATCH_SIZE])
+                if not batch:
+                    break
+
+                for faq in batch:
+                    faq.term_vector, faq.vector_norm = Vocabulary.vectorize_text(faq.question, create=True)
+
+                Faq.objects.bulk_update(batch, ['term_vector', 'vector_norm'])
+                rebuilt += len(batch)
+                last_id = batch[-1].id
+
+            groups = GroupCentroids.rebuild(options['lesson'])
+
+        # Every worker drops its in-memory FAQ indexes and reloads the new vectors
+        FaqIndex.invalidate_all()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {rebuilt} FAQ vectors and {groups} group centroids in {time.perf_counter() - start:.2f}s"
+        ))
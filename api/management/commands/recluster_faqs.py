@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from api.services import FaqReclustering
+
+
+class Command(BaseCommand):
+    help = "Re-cluster the FAQ history of one lesson (or every lesson) in a single vectorized pass."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lesson', type=int, help="Only re-cluster the FAQs of this lesson id.")
+        parser.add_argument('--threshold', type=float,
+                            help="Similarity threshold to group at (defaults to the teacher's current threshold).")
+
+    def handle(self, *args, **options):
+        report = FaqReclustering.recluster(options['lesson'], options['threshold'])
+        self.stdout.write(self.style.SUCCESS(FaqReclustering.format_report(report)))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F
+
+from api.model.GroupedQuestions import GroupedQuestions
+
+
+class Command(BaseCommand):
+    help = "Recompute GroupedQuestions.faq_count from the Faq rows and report the groups that had drifted."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lesson', type=int, help="Only reconcile the groups of this lesson id.")
+        parser.add_argument('--dry-run', action='store_true', help="Report drifted counters without fixing them.")
+
+    def handle(self, *args, **options):
+        groups = GroupedQuestions.objects.all()
+        if options['lesson']:
+            groups = groups.filter(lesson_id=options['lesson'])
+
+        with transaction.atomic():
+            drifted = list(
+                groups.annotate(actual=Count('faqs')).exclude(faq_count=F('actual')).order_by('pk').values_list(
+                    'grouped_question_id', 'faq_count', 'actual'
+                )
+            )
+            for group_id, stored, actual in drifted:
+                self.stdout.write(f"group {group_id}: faq_count={stored}, actual={actual}")
+                if not options['dry_run']:
+                    GroupedQuestions.objects.filter(pk=group_id).update(faq_count=actual)
+
+        verb = "Found" if options['dry_run'] else "Fixed"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {len(drifted)} drifted FAQ counter(s)"))
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.model.LessonContent import LessonContent, TEXT_METADATA_FIELDS
+from api.services import LessonRetrieval, TokenCounter
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute LessonContent.plain_text and token counts from contents, e.g. after contents were "
+        "changed outside the app or when earlier counts were only estimated."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lesson', type=int, help="Only refresh the pages of this lesson id.")
+        parser.add_argument('--estimated-only', action='store_true',
+                            help=f"Only refresh pages whose token count is an estimate ('{TokenCounter.ESTIMATE}').")
+
+    def handle(self, *args, **options):
+        pages = LessonContent.objects.order_by('id')
+        if options['lesson']:
+            pages = pages.filter(lesson_id=options['lesson'])
+        if options['estimated_only']:
+            pages = pages.filter(token_encoding=TokenCounter.ESTIMATE)
+
+        # Collected first: with --estimated-only the refreshed pages no longer match the filter afterwards.
+        # The id ordering would otherwise be part of the DISTINCT
+        lesson_ids = list(pages.order_by().values_list('lesson_id', flat=True).distinct())
+
+        refreshed = 0
+        with transaction.atomic():
+            batch = []
+            for page in pages.only('id', 'contents').iterator(chunk_size=BATCH_SIZE):
+                page.refresh_text_metadata()
+                batch.append(page)
+                if len(batch) >= BATCH_SIZE:
+                    LessonContent.objects.bulk_update(batch, TEXT_METADATA_FIELDS)
+                    refreshed += len(batch)
+                    batch = []
+            LessonContent.objects.bulk_update(batch, TEXT_METADATA_FIELDS)
+            refreshed += len(batch)
+
+        # Chunk indexes are built from plain_text
+        for lesson_id in lesson_ids:
+            LessonRetrieval.invalidate(lesson_id)
+
+        self.stdout.write(self.style.SUCCESS(f"Refreshed {refreshed} lesson page(s)"))
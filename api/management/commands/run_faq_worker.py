@@ -0,0 +1,68 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api.services import FaqQueue, FaqReclustering, WorkerHeartbeats
+
+
+class Command(BaseCommand):
+    help = "Drain the FAQ classification queue filled by the chatbot endpoint and the re-clustering jobs queued from the admin."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=settings.FAQ_WORKER_CONCURRENCY,
+                            help="Number of jobs processed in parallel by this process.")
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help="Seconds to wait before checking an empty queue again.")
+
+    def handle(self, *args, **options):
+        if not WorkerHeartbeats.shared_cache():
+            raise CommandError(
+                f"The default cache {settings.CACHES['default']['BACKEND']} is private to this process; "
+                "set CACHE_BACKEND to a backend the web process shares (see CACHES in settings)."
+            )
+
+        stop = threading.Event()
+
+        def request_stop(signum, frame):
+            self.stdout.write("Stopping after the jobs in progress...")
+            stop.set()
+
+        signal.signal(signal.SIGTERM, request_stop)
+        signal.signal(signal.SIGINT, request_stop)
+
+        threads = [
+            threading.Thread(target=self.work, args=(stop, options['poll_interval']), name=f"faq-worker-{i}")
+            for i in range(max(1, options['concurrency']))
+        ]
+        for thread in threads:
+            thread.start()
+
+        self.stdout.write(f"FAQ worker started with {len(threads)} thread(s)")
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(timeout=0.5)
+
+    def work(self, stop, poll_interval):
+        try:
+            while not stop.is_set():
+                recluster_job = FaqReclustering.claim_next_job()
+                if recluster_job is not None:
+                    if not FaqReclustering.process_job(recluster_job):
+                        self.stderr.write(f"FAQ re-clustering job {recluster_job.id} failed")
+                    continue
+
+                job = FaqQueue.claim_next_job()
+                if job is None:
+                    stop.wait(poll_interval)
+                    continue
+
+                processed = FaqQueue.process_job(job)
+                if processed is None:
+                    self.stderr.write(f"FAQ classification job {job.id} was claimed again by another worker")
+                elif not processed:
+                    self.stderr.write(f"FAQ classification job {job.id} failed (attempt {job.attempts})")
+        finally:
+            connection.close()
@@ -0,0 +1,161 @@
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+
+class StubLlmHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so clients can keep their connections alive between requests
+    protocol_version = 'HTTP/1.1'
+    server_version = 'StubLLM/1.0'
+    # Headers and body go out in separate writes; with Nagle on, kept-alive
+    # connections would wait for the client's delayed ACK on every response
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.stats_lock:
+            self.server.stats['connections'] += 1
+        # Stands in for the TCP + TLS handshake a new connection to the real API costs
+        time.sleep(self.server.handshake_latency)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/stats':
+            with self.server.stats_lock:
+                self.send_json(dict(self.server.stats))
+        else:
+            self.send_json({"error": {"message": "Not found"}}, status=404)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self.send_json({"error": {"message": "Invalid JSON body"}}, status=400)
+            return
+
+        if self.path.rstrip('/') == '/stats/reset':
+            with self.server.stats_lock:
+                self.server.stats.update(connections=0, requests=0, max_in_flight=self.server.stats['in_flight'])
+                self.send_json(dict(self.server.stats))
+            return
+
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self.send_json({"error": {"message": "Not found"}}, status=404)
+            return
+
+        with self.server.stats_lock:
+            stats = self.server.stats
+            stats['requests'] += 1
+            stats['in_flight'] += 1
+            stats['max_in_flight'] = max(stats['max_in_flight'], stats['in_flight'])
+        try:
+            self.answer(body)
+        finally:
+            with self.server.stats_lock:
+                self.server.stats['in_flight'] -= 1
+
+    def answer(self, body):
+        time.sleep(self.server.latency)
+
+        prompt = body.get('messages', [{}])[-1].get('content', '')
+        words = (f"Stub answer to: {prompt}".split() * self.server.words)[:self.server.words]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        if body.get('stream'):
+            self.send_stream(completion_id, body.get('model', 'stub'), words)
+            return
+
+        self.send_json({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get('model', 'stub'),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": " ".join(words)},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": sum(len(m.get('content', '').split()) for m in body.get('messages', [])),
+                "completion_tokens": len(words),
+                "total_tokens": 0,
+            },
+        })
+
+    def send_json(self, payload, status=200):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_stream(self, completion_id, model, words):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def chunk(delta, finish_reason=None):
+            event = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            self.write_chunk(f"data: {json.dumps(event)}\n\n".encode())
+
+        chunk({"role": "assistant", "content": ""})
+        for i, word in enumerate(words):
+            time.sleep(self.server.token_latency)
+            chunk({"content": word if i == 0 else " " + word})
+        chunk({}, finish_reason="stop")
+        self.write_chunk(b"data: [DONE]\n\n")
+        self.write_chunk(b"")
+
+    def write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+class Command(BaseCommand):
+    help = "Serve an OpenAI-compatible /v1/chat/completions stub to benchmark the LLM clients offline."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8089)
+        parser.add_argument('--handshake-latency', type=float, default=0.1,
+                            help="Seconds added to every new connection, like a TLS handshake to the real API.")
+        parser.add_argument('--latency', type=float, default=0.05,
+                            help="Seconds spent before answering, like the model's time to first token.")
+        parser.add_argument('--token-latency', type=float, default=0.005,
+                            help="Seconds between streamed tokens.")
+        parser.add_argument('--words', type=int, default=40, help="Length of every answer in words.")
+        parser.add_argument('--verbose', action='store_true', help="Log every request.")
+
+    def handle(self, *args, **options):
+        server = ThreadingHTTPServer((options['host'], options['port']), StubLlmHandler)
+        server.daemon_threads = True
+        server.handshake_latency = options['handshake_latency']
+        server.latency = options['latency']
+        server.token_latency = options['token_latency']
+        server.words = options['words']
+        server.verbose = options['verbose']
+        server.stats = {'connections': 0, 'requests': 0, 'in_flight': 0, 'max_in_flight': 0}
+        server.stats_lock = threading.Lock()
+
+        self.stdout.write(f"Stub LLM listening on http://{options['host']}:{options['port']}/v1 (GET /stats for counters, POST /stats/reset to clear them)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
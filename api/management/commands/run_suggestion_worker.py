@@ -0,0 +1,103 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+
+from api.model.WorkerHeartbeat import WorkerHeartbeat
+from api.services import LlmClients, SuggestionQueue, WorkerHeartbeats
+
+
+class Command(BaseCommand):
+    help = (
+        "Drain the suggestion queue filled when notifications are created. Run as many processes as needed; "
+        "each one keeps a heartbeat row and renews the leases of the jobs it holds. Jobs run on a pool of "
+        "--concurrency threads, at most LLM_CONCURRENCY for the suggestion model, and every LLM call waits "
+        "for the model's RATE_LIMIT_MODELS bucket shared by all processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=settings.SUGGESTION_WORKER_CONCURRENCY,
+                            help="Number of jobs processed in parallel by this process.")
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help="Seconds to wait before checking an empty queue again. On PostgreSQL new "
+                                 "jobs wake the worker, which then only checks every few minutes.")
+        parser.add_argument('--heartbeat-interval', type=float, default=settings.SUGGESTION_WORKER_HEARTBEAT_SECONDS,
+                            help="Seconds between heartbeats.")
+        parser.add_argument('--burst', action='store_true',
+                            help="Exit once the queue is empty instead of waiting for new jobs.")
+
+    def handle(self, *args, **options):
+        if not WorkerHeartbeats.shared_cache():
+            raise CommandError(
+                f"The default cache {settings.CACHES['default']['BACKEND']} is private to this process; "
+                "set CACHE_BACKEND to a backend the web process shares (see CACHES in settings)."
+            )
+
+        stop = threading.Event()
+
+        def request_stop(signum, frame):
+            self.stdout.write("Stopping after the jobs in progress...")
+            stop.set()
+
+        signal.signal(signal.SIGTERM, request_stop)
+        signal.signal(signal.SIGINT, request_stop)
+
+        concurrency = max(1, options['concurrency'])
+        cap = SuggestionQueue.concurrency_cap()
+        if concurrency > cap:
+            self.stdout.write(f"Concurrency lowered from {concurrency} to the suggestion model's LLM_CONCURRENCY of {cap}")
+            concurrency = cap
+
+        self.worker = WorkerHeartbeats.register(WorkerHeartbeat.SUGGESTION, concurrency)
+        # Jobs finished since the last heartbeat, [succeeded, failed]
+        self.finished = [0, 0]
+        self.finished_lock = threading.Lock()
+
+        # Beats until the last job has finished, so the leases of jobs finishing after a stop request hold
+        heartbeat_stop = threading.Event()
+        heartbeat = threading.Thread(target=self.heartbeat, args=(heartbeat_stop, options['heartbeat_interval']),
+                                     name="suggestion-heartbeat", daemon=True)
+        heartbeat.start()
+
+        self.stdout.write(f"Suggestion worker {self.worker.name} started with {concurrency} thread(s)")
+        try:
+            SuggestionQueue.run_jobs(
+                self.worker.name, concurrency, stop,
+                poll_interval=options['poll_interval'], burst=options['burst'], on_finished=self.job_finished,
+            )
+        finally:
+            heartbeat_stop.set()
+            heartbeat.join()
+            WorkerHeartbeats.stop(self.worker, *self.take_finished())
+            LlmClients.close_session()
+            connection.close()
+        self.stdout.write(f"Suggestion worker {self.worker.name} stopped")
+
+    def job_finished(self, job, succeeded):
+        with self.finished_lock:
+            self.finished[0 if succeeded else 1] += 1
+        if not succeeded:
+            self.stderr.write(f"Suggestion job {job.id} failed (attempt {job.attempts})")
+
+    def take_finished(self):
+        with self.finished_lock:
+            finished, self.finished = self.finished, [0, 0]
+        return finished
+
+    def heartbeat(self, stop, interval):
+        try:
+            while not stop.wait(interval):
+                finished = self.take_finished()
+                try:
+                    SuggestionQueue.renew_leases(self.worker.name)
+                    WorkerHeartbeats.beat(self.worker, *finished)
+                except DatabaseError as e:
+                    # Beat again next time, a heartbeat thread that died would let every lease expire
+                    self.stderr.write(f"Heartbeat failed: {e}")
+                    with self.finished_lock:
+                        self.finished = [a + b for a, b in zip(self.finished, finished)]
+                    connection.close()
+        finally:
+            connection.close()
@@ -0,0 +1,43 @@
+import logging
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from api.services import LlmClients
+
+logger = logging.getLogger(__name__)
+
+
+class LlmCallCountMiddleware:
+    """
+    Counts the LLM API calls made while handling each request and reports
+    them in the X-LLM-Calls response header. Async-capable so async views
+    are not pushed onto a thread; calls made while a streaming response is
+    sent happen after the headers and are not counted.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        with LlmClients.count_calls() as calls:
+            response = self.get_response(request)
+        return self.report(request, response, calls)
+
+    async def __acall__(self, request):
+        with LlmClients.count_calls() as calls:
+            response = await self.get_response(request)
+        return self.report(request, response, calls)
+
+    @staticmethod
+    def report(request, response, calls):
+        if calls.count:
+            response['X-LLM-Calls'] = str(calls.count)
+            logger.info("%s %s made %d LLM call(s)", request.method, request.path, calls.count)
+        return response
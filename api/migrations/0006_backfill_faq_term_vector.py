@@ -0,0 +1,44 @@
+import math
+from collections import Counter
+
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def backfill_term_vectors(apps, schema_editor):
+    Faq = apps.get_model('api', 'Faq')
+    Term = apps.get_model('api', 'Term')
+
+    term_ids = {}
+    last_id = 0
+    while True:
+        batch = list(Faq.objects.filter(id__gt=last_id).order_by('id')[:BATCH_SIZE])
+        if not batch:
+            break
+
+        word_counts = {faq.id: Counter(faq.question.lower().split()) for faq in batch}
+
+        new_terms = {term for counts in word_counts.values() for term in counts} - term_ids.keys()
+        if new_terms:
+            Term.objects.bulk_create([Term(text=term) for term in new_terms], ignore_conflicts=True)
+            term_ids.update(Term.objects.filter(text__in=new_terms).values_list('text', 'id'))
+
+        for faq in batch:
+            counts = word_counts[faq.id]
+            faq.term_vector = sorted([term_ids[term], count] for term, count in counts.items())
+            faq.vector_norm = math.sqrt(sum(count ** 2 for count in counts.values()))
+
+        Faq.objects.bulk_update(batch, ['term_vector', 'vector_norm'])
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_faq_term_vector'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_term_vectors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.6 on 2026-10-18 13:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_backfill_faq_term_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='relatedcontent',
+            name='centroid_norm',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='relatedcontent',
+            name='centroid_vector',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='relatedcontent',
+            name='member_count',
+            field=models.IntegerField(default=0),
+        ),
+    ]
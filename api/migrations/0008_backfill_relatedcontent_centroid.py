@@ -0,0 +1,40 @@
+import math
+from collections import Counter, defaultdict
+
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def backfill_centroids(apps, schema_editor):
+    Faq = apps.get_model('api', 'Faq')
+    RelatedContent = apps.get_model('api', 'RelatedContent')
+
+    centroids = defaultdict(Counter)
+    member_counts = Counter()
+    for related_content_id, term_vector in Faq.objects.values_list('related_content_id', 'term_vector').iterator():
+        for term_id, count in term_vector:
+            centroids[related_content_id][str(term_id)] += count
+        member_counts[related_content_id] += 1
+
+    related_contents = list(RelatedContent.objects.filter(related_content_id__in=member_counts.keys()))
+    for related_content in related_contents:
+        centroid = centroids[related_content.related_content_id]
+        related_content.centroid_vector = dict(centroid)
+        related_content.centroid_norm = math.sqrt(sum(total ** 2 for total in centroid.values()))
+        related_content.member_count = member_counts[related_content.related_content_id]
+
+    RelatedContent.objects.bulk_update(
+        related_contents, ['centroid_vector', 'centroid_norm', 'member_count'], batch_size=BATCH_SIZE
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_relatedcontent_centroid'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_centroids, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.6 on 2026-10-18 13:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_backfill_relatedcontent_centroid'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='faq',
+            name='minhash_signature',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.CreateModel(
+            name='FaqLshBucket',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.SmallIntegerField()),
+                ('bucket', models.BigIntegerField()),
+                ('faq', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lsh_buckets', to='api.faq')),
+                ('lesson', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='faq_lsh_buckets', to='api.lesson')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['lesson', 'band', 'bucket'], name='api_faqlshb_lesson__c69abc_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.6 on 2026-10-18 13:45
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_faq_minhash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FaqClassificationJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('message', models.TextField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.IntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('lesson', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='faq_classification_jobs', to='api.lesson')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'id'], name='api_faqclas_status_23a967_idx')],
+            },
+        ),
+    ]
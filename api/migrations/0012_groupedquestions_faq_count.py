@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 13:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_faqreclusterjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='groupedquestions',
+            name='faq_count',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_faq_counts(apps, schema_editor):
+    Faq = apps.get_model('api', 'Faq')
+    GroupedQuestions = apps.get_model('api', 'GroupedQuestions')
+
+    counts = Faq.objects.filter(grouped_questions=OuterRef('pk')).values('grouped_questions').annotate(
+        total=Count('id')
+    ).values('total')
+    GroupedQuestions.objects.update(faq_count=Coalesce(Subquery(counts), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_groupedquestions_faq_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_faq_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.6 on 2026-10-18 14:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_backfill_groupedquestions_faq_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lessoncontent',
+            name='plain_text',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='lessoncontent',
+            name='token_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='lessoncontent',
+            name='token_encoding',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+    ]
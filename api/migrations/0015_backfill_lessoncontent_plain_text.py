@@ -0,0 +1,51 @@
+import tiktoken
+from bs4 import BeautifulSoup
+from django.db import migrations
+
+BATCH_SIZE = 500
+
+# Frozen copy of TokenCounter.count_tokens, so later changes to the service do not change this migration
+ENCODING = 'cl100k_base'
+ESTIMATE = 'estimate'
+
+
+def load_encoding():
+    # None when tiktoken cannot load the encoding (it downloads it on first use)
+    try:
+        return tiktoken.get_encoding(ENCODING)
+    except Exception:
+        return None
+
+
+def count_tokens(encoding, text):
+    if encoding is None:
+        # About four characters per token for English text
+        return (len(text) + 3) // 4, ESTIMATE
+    return len(encoding.encode(text, disallowed_special=())), ENCODING
+
+
+def backfill_plain_text(apps, schema_editor):
+    LessonContent = apps.get_model('api', 'LessonContent')
+    encoding = load_encoding()
+
+    batch = []
+    for lesson_content in LessonContent.objects.only('id', 'contents').iterator(chunk_size=BATCH_SIZE):
+        lesson_content.plain_text = BeautifulSoup(lesson_content.contents, 'html.parser').get_text()
+        lesson_content.token_count, lesson_content.token_encoding = count_tokens(encoding, lesson_content.plain_text)
+        batch.append(lesson_content)
+        if len(batch) >= BATCH_SIZE:
+            LessonContent.objects.bulk_update(batch, ['plain_text', 'token_count', 'token_encoding'])
+            batch = []
+
+    LessonContent.objects.bulk_update(batch, ['plain_text', 'token_count', 'token_encoding'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_lessoncontent_plain_text'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_plain_text, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.6 on 2026-10-18 14:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_backfill_lessoncontent_plain_text'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='subquery',
+            options={'ordering': ['created_at', 'id']},
+        ),
+        migrations.AddField(
+            model_name='subquery',
+            name='query',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='turns', to='api.query'),
+        ),
+        migrations.AlterField(
+            model_name='query',
+            name='subqueries',
+            field=models.ManyToManyField(related_name='+', to='api.subquery'),
+        ),
+        migrations.AddIndex(
+            model_name='subquery',
+            index=models.Index(fields=['query', 'created_at'], name='subquery_query_created_idx'),
+        ),
+    ]
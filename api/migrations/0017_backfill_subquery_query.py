@@ -0,0 +1,34 @@
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def link_subqueries(apps, schema_editor):
+    Query = apps.get_model('api', 'Query')
+    SubQuery = apps.get_model('api', 'SubQuery')
+    Link = Query.subqueries.through
+
+    # A SubQuery linked to several queries keeps the oldest one
+    first_query = Link.objects.filter(subquery_id=OuterRef('pk')).order_by('query_id').values('query_id')[:1]
+    SubQuery.objects.filter(query__isnull=True).update(query_id=Subquery(first_query))
+
+
+def unlink_subqueries(apps, schema_editor):
+    Query = apps.get_model('api', 'Query')
+    SubQuery = apps.get_model('api', 'SubQuery')
+    Link = Query.subqueries.through
+
+    Link.objects.bulk_create([
+        Link(query_id=query_id, subquery_id=subquery_id)
+        for subquery_id, query_id in SubQuery.objects.filter(query__isnull=False).values_list('id', 'query_id')
+    ], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_subquery_query'),
+    ]
+
+    operations = [
+        migrations.RunPython(link_subqueries, unlink_subqueries),
+    ]
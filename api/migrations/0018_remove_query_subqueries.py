@@ -0,0 +1,17 @@
+# Generated by Django 5.0.6 on 2026-10-18 14:22
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_backfill_subquery_query'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='query',
+            name='subqueries',
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.0.6 on 2026-10-18 14:27
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_remove_query_subqueries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SuggestionJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.IntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('notification', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='suggestion_job', to='api.notification')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'id'], name='api_suggest_status_944836_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations
+from django.db.models import Q
+
+
+def queue_missing_suggestions(apps, schema_editor):
+    Notification = apps.get_model('api', 'Notification')
+    SuggestionJob = apps.get_model('api', 'SuggestionJob')
+
+    # Notifications the old polling thread would still have picked up
+    notification_ids = Notification.objects.filter(
+        Q(notification__isnull=True) | Q(notification__content__isnull=True)
+    ).values_list('notif_id', flat=True).distinct()
+    SuggestionJob.objects.bulk_create(
+        [SuggestionJob(notification_id=notification_id) for notification_id in notification_ids],
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0019_suggestionjob'),
+    ]
+
+    operations = [
+        migrations.RunPython(queue_missing_suggestions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.0.6 on 2026-10-18 14:29
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def start_leases(apps, schema_editor):
+    # Running jobs keep the lease they were claimed with
+    SuggestionJob = apps.get_model('api', 'SuggestionJob')
+    SuggestionJob.objects.filter(lease_renewed_at__isnull=True).update(lease_renewed_at=F('started_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0020_queue_missing_suggestions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='suggestionjob',
+            name='claimed_by',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='suggestionjob',
+            name='lease_renewed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='WorkerHeartbeat',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('suggestion', 'Suggestion generation')], max_length=20)),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('hostname', models.CharField(max_length=255)),
+                ('pid', models.IntegerField()),
+                ('concurrency', models.IntegerField(default=1)),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_heartbeat', models.DateTimeField(default=django.utils.timezone.now)),
+                ('stopped_at', models.DateTimeField(blank=True, null=True)),
+                ('jobs_succeeded', models.IntegerField(default=0)),
+                ('jobs_failed', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'last_heartbeat'], name='api_workerh_kind_26d96c_idx')],
+            },
+        ),
+        migrations.RunPython(start_leases, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,81 @@
+import hashlib
+import re
+import zlib
+
+import numpy as np
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+# Frozen copy of NearDuplicates as of 0009, so later changes to the service do not change this migration
+NUM_HASHES = 64
+ROWS_PER_BAND = 4
+NUM_BANDS = NUM_HASHES // ROWS_PER_BAND
+SHINGLE_SIZE = 3
+
+_SEEDS = np.random.RandomState(20241205).randint(0, np.iinfo(np.int64).max, size=NUM_HASHES, dtype=np.int64).astype(np.uint64)
+
+_NON_ALPHANUMERIC = re.compile(r'[^0-9a-z]+')
+
+
+def signature(text):
+    normalized = _NON_ALPHANUMERIC.sub(' ', text.lower()).strip()
+    if len(normalized) <= SHINGLE_SIZE:
+        shingle_set = {normalized} if normalized else set()
+    else:
+        shingle_set = {normalized[i:i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1)}
+    if not shingle_set:
+        return []
+
+    hashes = np.fromiter((zlib.crc32(s.encode()) for s in shingle_set), dtype=np.uint64, count=len(shingle_set))
+    values = hashes[None, :] ^ _SEEDS[:, None]
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+    return (values ^ (values >> np.uint64(31))).min(axis=1).tolist()
+
+
+def band_buckets(minhash_signature):
+    buckets = []
+    for band in range(NUM_BANDS):
+        rows = minhash_signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(repr(rows).encode(), digest_size=8).digest()
+        buckets.append(int.from_bytes(digest, 'big', signed=True))
+    return buckets
+
+
+def backfill_minhash(apps, schema_editor):
+    Faq = apps.get_model('api', 'Faq')
+    FaqLshBucket = apps.get_model('api', 'FaqLshBucket')
+
+    # FAQs saved since 0009 already have their signature and buckets
+    faqs = Faq.objects.filter(minhash_signature=[]).order_by('id')
+    last_id = 0
+    while True:
+        batch = list(faqs.filter(id__gt=last_id).only('id', 'lesson_id', 'question')[:BATCH_SIZE])
+        if not batch:
+            break
+
+        buckets = []
+        for faq in batch:
+            faq.minhash_signature = signature(faq.question)
+            if faq.minhash_signature:
+                buckets.extend(
+                    FaqLshBucket(lesson_id=faq.lesson_id, faq_id=faq.id, band=band, bucket=bucket)
+                    for band, bucket in enumerate(band_buckets(faq.minhash_signature))
+                )
+
+        Faq.objects.bulk_update(batch, ['minhash_signature'])
+        FaqLshBucket.objects.filter(faq_id__in=[faq.id for faq in batch]).delete()
+        FaqLshBucket.objects.bulk_create(buckets)
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0022_llmcachedresponse'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_minhash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,107 @@
+import math
+import re
+from collections import Counter, defaultdict
+
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+# Frozen copy of TextVector.Pipeline: 0006 built the vectors with lower().split(),
+# the matcher now tokenizes with the default FAQ_TOKENIZER_STEPS below. The steps are
+# pinned so a replay never depends on the settings; a deployment with other steps
+# runs `manage.py rebuild_faq_vectors` after migrating
+STEPS = frozenset(('lowercase', 'punctuation', 'stopwords', 'stem'))
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below between
+both but by can could did do does doing down during each few for from further had has have having he her
+here hers herself him himself his how i if in into is it its itself just me more most my myself no nor not
+now of off on once only or other our ours ourselves out over own same she should so some such than that
+the their theirs them themselves then there these they this those through to too under until up very was
+we were what when where which while who whom why will with would you your yours yourself yourselves
+""".split())
+
+_SUFFIXES = (
+    ('ational', 'ate'), ('ization', 'ize'), ('fulness', 'ful'), ('iveness', 'ive'),
+    ('ations', 'ate'), ('ation', 'ate'), ('ments', ''), ('ment', ''), ('ingly', ''),
+    ('edly', ''), ('sses', 'ss'), ('ies', 'y'), ('ing', ''), ('ers', ''), ('er', ''),
+    ('ed', ''), ('ly', ''), ('ss', 'ss'), ('s', ''),
+)
+_MIN_STEM_LENGTH = 3
+_PUNCTUATION = re.compile(r"[^\w\s]+")
+
+
+def tokenize(text, steps):
+    if 'lowercase' in steps:
+        text = text.lower()
+    if 'punctuation' in steps:
+        text = _PUNCTUATION.sub(' ', text)
+
+    tokens = []
+    for word in text.split():
+        if 'stopwords' in steps and word in STOPWORDS:
+            continue
+        if 'stem' in steps:
+            for suffix, replacement in _SUFFIXES:
+                if word.endswith(suffix) and len(word) - len(suffix) + len(replacement) >= _MIN_STEM_LENGTH:
+                    word = word[:-len(suffix)] + replacement
+                    break
+        tokens.append(word)
+    return tokens
+
+
+def retokenize_faq_vectors(apps, schema_editor):
+    Faq = apps.get_model('api', 'Faq')
+    Term = apps.get_model('api', 'Term')
+    RelatedContent = apps.get_model('api', 'RelatedContent')
+
+    term_ids = {}
+    centroids = defaultdict(Counter)
+    member_counts = Counter()
+    last_id = 0
+    while True:
+        faqs = Faq.objects.filter(id__gt=last_id).only('id', 'question', 'related_content_id').order_by('id')
+        batch = list(faqs[:BATCH_SIZE])
+        if not batch:
+            break
+
+        word_counts = {faq.id: Counter(tokenize(faq.question, STEPS)) for faq in batch}
+
+        new_terms = {term for counts in word_counts.values() for term in counts} - term_ids.keys()
+        if new_terms:
+            Term.objects.bulk_create([Term(text=term) for term in new_terms], ignore_conflicts=True)
+            term_ids.update(Term.objects.filter(text__in=new_terms).values_list('text', 'id'))
+
+        for faq in batch:
+            counts = word_counts[faq.id]
+            faq.term_vector = sorted([term_ids[term], count] for term, count in counts.items())
+            faq.vector_norm = math.sqrt(sum(count ** 2 for count in counts.values()))
+            for term_id, count in faq.term_vector:
+                centroids[faq.related_content_id][str(term_id)] += count
+            member_counts[faq.related_content_id] += 1
+
+        Faq.objects.bulk_update(batch, ['term_vector', 'vector_norm'])
+        last_id = batch[-1].id
+
+    # Group centroids are sums of the member vectors, so they move with them;
+    # groups left without FAQs are reset so no stale terms stay behind
+    related_contents = list(RelatedContent.objects.all())
+    for related_content in related_contents:
+        centroid = centroids.get(related_content.related_content_id, {})
+        related_content.centroid_vector = dict(centroid)
+        related_content.centroid_norm = math.sqrt(sum(total ** 2 for total in centroid.values()))
+        related_content.member_count = member_counts[related_content.related_content_id]
+
+    RelatedContent.objects.bulk_update(
+        related_contents, ['centroid_vector', 'centroid_norm', 'member_count'], batch_size=BATCH_SIZE
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0023_backfill_faq_minhash'),
+    ]
+
+    operations = [
+        migrations.RunPython(retokenize_faq_vectors, migrations.RunPython.noop),
+    ]
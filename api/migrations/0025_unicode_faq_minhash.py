@@ -0,0 +1,85 @@
+import hashlib
+import re
+import unicodedata
+import zlib
+
+import numpy as np
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+# Frozen copy of NearDuplicates with Unicode shingles. ASCII questions hash as they did
+# in 0023, every other question had its non-Latin letters dropped and is recomputed
+NUM_HASHES = 64
+ROWS_PER_BAND = 4
+NUM_BANDS = NUM_HASHES // ROWS_PER_BAND
+SHINGLE_SIZE = 3
+
+_SEEDS = np.random.RandomState(20241205).randint(0, np.iinfo(np.int64).max, size=NUM_HASHES, dtype=np.int64).astype(np.uint64)
+
+_NON_ALPHANUMERIC = re.compile(r'[\W_]+')
+
+
+def signature(text):
+    normalized = _NON_ALPHANUMERIC.sub(' ', unicodedata.normalize('NFKC', text).casefold()).strip()
+    if len(normalized) <= SHINGLE_SIZE:
+        shingle_set = {normalized} if normalized else set()
+    else:
+        shingle_set = {normalized[i:i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1)}
+    if not shingle_set:
+        return []
+
+    hashes = np.fromiter((zlib.crc32(s.encode()) for s in shingle_set), dtype=np.uint64, count=len(shingle_set))
+    values = hashes[None, :] ^ _SEEDS[:, None]
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+    return (values ^ (values >> np.uint64(31))).min(axis=1).tolist()
+
+
+def band_buckets(minhash_signature):
+    buckets = []
+    for band in range(NUM_BANDS):
+        rows = minhash_signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(repr(rows).encode(), digest_size=8).digest()
+        buckets.append(int.from_bytes(digest, 'big', signed=True))
+    return buckets
+
+
+def rehash_non_ascii_faqs(apps, schema_editor):
+    Faq = apps.get_model('api', 'Faq')
+    FaqLshBucket = apps.get_model('api', 'FaqLshBucket')
+
+    last_id = 0
+    while True:
+        batch = list(Faq.objects.filter(id__gt=last_id).only('id', 'lesson_id', 'question').order_by('id')[:BATCH_SIZE])
+        if not batch:
+            break
+        last_id = batch[-1].id
+
+        changed = [faq for faq in batch if not faq.question.isascii()]
+        if not changed:
+            continue
+
+        buckets = []
+        for faq in changed:
+            faq.minhash_signature = signature(faq.question)
+            if faq.minhash_signature:
+                buckets.extend(
+                    FaqLshBucket(lesson_id=faq.lesson_id, faq_id=faq.id, band=band, bucket=bucket)
+                    for band, bucket in enumerate(band_buckets(faq.minhash_signature))
+                )
+
+        Faq.objects.bulk_update(changed, ['minhash_signature'])
+        FaqLshBucket.objects.filter(faq_id__in=[faq.id for faq in changed]).delete()
+        FaqLshBucket.objects.bulk_create(buckets)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0024_retokenize_faq_vectors'),
+    ]
+
+    operations = [
+        migrations.RunPython(rehash_non_ascii_faqs, migrations.RunPython.noop),
+    ]
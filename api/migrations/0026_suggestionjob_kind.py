@@ -0,0 +1,33 @@
+# Generated by Django 5.0.6 on 2026-10-18 15:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0025_unicode_faq_minhash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='suggestionjob',
+            name='kind',
+            field=models.CharField(choices=[('suggestion', 'Suggestion'), ('delimiters', 'Delimiters')], default='suggestion', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='suggestionjob',
+            name='payload',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AlterField(
+            model_name='suggestionjob',
+            name='notification',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='suggestion_jobs', to='api.notification'),
+        ),
+        migrations.AddConstraint(
+            model_name='suggestionjob',
+            constraint=models.UniqueConstraint(fields=('notification', 'kind'), name='suggestionjob_notification_kind'),
+        ),
+    ]
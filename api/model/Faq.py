@@ -11,6 +11,11 @@ class Faq(models.Model):
     grouped_questions = models.ForeignKey(GroupedQuestions, on_delete=models.CASCADE, related_name='faqs',null=True)
     related_content = models.ForeignKey(RelatedContent, on_delete=models.CASCADE, related_name='faqs')
     question = models.TextField()
+    # [[term_id, count], ...] of the tokenized question, kept in sync on save
+    term_vector = models.JSONField(default=list, blank=True)
+    vector_norm = models.FloatField(default=0.0)
+    # MinHash signature of the question's character shingles, see NearDuplicates
+    minhash_signature = models.JSONField(default=list, blank=True)
 
 
     def __str__(self):
@@ -0,0 +1,20 @@
+from django.db import models
+
+from api.model.Faq import Faq
+from api.model.Lesson import Lesson
+
+
+class FaqLshBucket(models.Model):
+    # One row per (FAQ, band) of its MinHash signature, shared by every worker
+    lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, related_name='faq_lsh_buckets')
+    faq = models.ForeignKey(Faq, on_delete=models.CASCADE, related_name='lsh_buckets')
+    band = models.SmallIntegerField()
+    bucket = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['lesson', 'band', 'bucket']),
+        ]
+
+    def __str__(self):
+        return f"FAQ {self.faq_id} band {self.band}: {self.bucket}"
@@ -0,0 +1,31 @@
+from django.db import models
+from django.utils import timezone
+
+from api.model.Lesson import Lesson
+
+
+class FaqReclusterJob(models.Model):
+    # An offline re-clustering of one lesson's FAQs (all lessons when lesson is empty), queued from the admin
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, null=True, blank=True, related_name='faq_recluster_jobs')
+    threshold = models.FloatField(null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    result = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        target = f"lesson {self.lesson_id}" if self.lesson_id else "all lessons"
+        return f"FAQ re-clustering job {self.id} ({self.status}) for {target}"
@@ -12,3 +12,11 @@ class GroupedQuestions(models.Model):
      related_content = models.ForeignKey(RelatedContent, on_delete=models.CASCADE, related_name='grouped_questions')
      notification = models.ForeignKey(Notification, on_delete=models.CASCADE, related_name='grouped_questions',null= True)
      notified = models.BooleanField(default=False,null=True)
+     # Number of FAQs in this group, kept in step with the Faq rows (see count_faq)
+     faq_count = models.IntegerField(default=0)
+
+     def count_faq(self):
+          # Atomic increment; the row stays locked until the caller's transaction ends,
+          # so concurrent messages for the same group are counted one after another
+          GroupedQuestions.objects.filter(pk=self.pk).update(faq_count=models.F('faq_count') + 1)
+          self.refresh_from_db(fields=['faq_count', 'notified'])
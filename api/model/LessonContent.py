@@ -1,7 +1,12 @@
 
+from bs4 import BeautifulSoup
 from django.db import models
 from api.model.Lesson import Lesson
 from api.model.ImageModel import ImageModel 
+from api.services import TokenCounter
+
+# Columns derived from contents, rewritten whenever contents is
+TEXT_METADATA_FIELDS = ['plain_text', 'token_count', 'token_encoding']
 
 class LessonContent(models.Model):
     lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE)
@@ -9,6 +14,10 @@ class LessonContent(models.Model):
     url = models.URLField(max_length=255, null=True, blank=True)
     files = models.FileField(upload_to='media/', null=True, blank=True)
     images = models.ManyToManyField(ImageModel, related_name='lesson_contents', blank=True)
+    # contents without the HTML, as the chatbot and prompts read it
+    plain_text = models.TextField(default="", blank=True)
+    token_count = models.IntegerField(default=0)
+    token_encoding = models.CharField(max_length=32, default="", blank=True)
 
     class Meta:
         ordering = ['id']
@@ -16,6 +25,25 @@ class LessonContent(models.Model):
     def __str__(self):
         return self.contents
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'contents' in update_fields:
+            self.refresh_text_metadata()
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | set(TEXT_METADATA_FIELDS)
+        super().save(*args, **kwargs)
+
+    def refresh_text_metadata(self):
+        # Call before bulk_create/bulk_update, which skip save()
+        self.plain_text = BeautifulSoup(self.contents, 'html.parser').get_text()
+        self.token_count, self.token_encoding = TokenCounter.count_tokens(self.plain_text)
+
+    def get_plain_text(self):
+        # Rows written around save() (raw SQL, queryset.update) may not have it yet
+        if not self.plain_text and self.contents:
+            self.refresh_text_metadata()
+        return self.plain_text
+
     def get_lesson_id(self):
         return self.lesson_id
 
@@ -0,0 +1,17 @@
+from django.db import models
+from django.utils import timezone
+
+
+class LlmCachedResponse(models.Model):
+    # A chat completion stored under the hash of its request, see api/services/LlmCache.py
+    key = models.CharField(max_length=64, unique=True)
+    model = models.CharField(max_length=100)
+    response = models.JSONField()
+    # Bytes of the stored response, for the size-based eviction
+    size = models.IntegerField()
+    hits = models.IntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.model} response {self.key[:12]} ({self.hits} hits)"
@@ -1,19 +1,40 @@
 from django.db import models
 from api.models import CustomUser
 from .Lesson import Lesson
-from .SubQuery import SubQuery
 
 class Query(models.Model):
     lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE)
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
-    subqueries = models.ManyToManyField(SubQuery)
+    # No longer written, the conversation is the SubQuery rows of this query (turns)
     context = models.TextField(blank=True, default='')
 
     def __str__(self):
         return f"Query for Lesson {self.lesson.lessonNumber} by {self.user.username}"
 
     def get_subqueries(self):
-        return self.subqueries.all()
+        return self.turns.all()
+
+    def recent_turns(self, limit):
+        # The latest limit turns, oldest first, read through the (query, created_at) index
+        return list(self.turns.order_by('-created_at', '-id')[:limit])[::-1]
+
+    async def arecent_turns(self, limit):
+        return [turn async for turn in self.turns.order_by('-created_at', '-id')[:limit]][::-1]
+
+    @staticmethod
+    def turns_to_messages(turns, limit):
+        # The last limit chat messages of the turns, a question and its answer per turn
+        messages = []
+        for turn in turns:
+            messages.append({"role": "user", "content": turn.question, "time": turn.created_at.isoformat()})
+            messages.append({"role": "assistant", "content": turn.response, "time": turn.created_at.isoformat()})
+        return messages[-limit:] if limit > 0 else []
+
+    def recent_messages(self, limit):
+        return Query.turns_to_messages(self.recent_turns((limit + 1) // 2), limit)
+
+    async def arecent_messages(self, limit):
+        return Query.turns_to_messages(await self.arecent_turns((limit + 1) // 2), limit)
 
     def get_lesson(self):
         return self.lesson
@@ -32,10 +53,13 @@ class Query(models.Model):
         self.user = user_instance
 
     def add_subquery(self, subquery_instance):
-        self.subqueries.add(subquery_instance)
+        subquery_instance.query = self
+        subquery_instance.save(update_fields=['query'])
 
     def remove_subquery(self, subquery_instance):
-        self.subqueries.remove(subquery_instance)
+        if subquery_instance.query_id == self.id:
+            subquery_instance.query = None
+            subquery_instance.save(update_fields=['query'])
 
     def set_context(self, context):
         self.context = context
\ No newline at end of file
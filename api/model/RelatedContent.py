@@ -1,6 +1,7 @@
-
 # from api.model.Faq import Faq
 
+import math
+
 from api.model.Lesson import Lesson
 
 
@@ -10,8 +11,31 @@ class RelatedContent(models.Model):
     related_content_id = models.AutoField(primary_key=True)
     lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE,related_name='lesson')
     general_context = models.TextField(default="", null=False)
+    # Running sum of the member FAQ term vectors ({"term_id": count}) and its norm
+    centroid_vector = models.JSONField(default=dict, blank=True)
+    centroid_norm = models.FloatField(default=0.0)
+    member_count = models.IntegerField(default=0)
 
     def __str__(self):
         return str(self.related_content_id)
+
+    def add_member(self, term_vector):
+        self._update_centroid(term_vector, 1)
+
+    def remove_member(self, term_vector):
+        self._update_centroid(term_vector, -1)
+
+    def _update_centroid(self, term_vector, sign):
+        centroid = self.centroid_vector
+        for term_id, count in term_vector:
+            key = str(term_id)
+            total = centroid.get(key, 0) + sign * count
+            if total > 0:
+                centroid[key] = total
+            else:
+                centroid.pop(key, None)
+
+        self.member_count = max(0, self.member_count + sign)
+        self.centroid_norm = math.sqrt(sum(total ** 2 for total in centroid.values()))
+    
     
-    
\ No newline at end of file
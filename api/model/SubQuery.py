@@ -3,9 +3,16 @@ from django.utils import timezone
 from django.db import models
 
 class SubQuery(models.Model):
+    # One row per chatbot turn, appended to its conversation and never rewritten
+    query = models.ForeignKey('api.Query', on_delete=models.CASCADE, related_name='turns', null=True, db_index=False)
     question = models.TextField()
     response = models.TextField()
     created_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        ordering = ['created_at', 'id']
+        # Reading the latest turns of a conversation, newest first
+        indexes = [models.Index(fields=['query', 'created_at'], name='subquery_query_created_idx')]
+
     def __str__(self):
         return f"SubQuery - Question: {self.question[:50]}"
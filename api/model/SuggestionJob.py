@@ -0,0 +1,51 @@
+from django.db import models
+from django.utils import timezone
+
+from api.model.Notification import Notification
+
+
+class SuggestionJob(models.Model):
+    # A notification waiting for its suggested lesson content, or for the LLM to place the delimiters
+    # of its edited suggestion that DelimiterAlignment could not place with confidence
+    SUGGESTION = 'suggestion'
+    DELIMITERS = 'delimiters'
+
+    KIND_CHOICES = [
+        (SUGGESTION, 'Suggestion'),
+        (DELIMITERS, 'Delimiters'),
+    ]
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (FAILED, 'Failed'),
+    ]
+
+    notification = models.ForeignKey(Notification, on_delete=models.CASCADE, related_name='suggestion_jobs')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default=SUGGESTION)
+    # What a delimiters job works on: the aligned content and its ambiguous spans
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.IntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # The worker holding the lease renews it with every heartbeat
+    claimed_by = models.CharField(max_length=255, blank=True, default='')
+    lease_renewed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id']),
+        ]
+        constraints = [
+            # At most one job of each kind per notification
+            models.UniqueConstraint(fields=['notification', 'kind'], name='suggestionjob_notification_kind'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} job {self.id} ({self.status}) for notification {self.notification_id}"
@@ -0,0 +1,9 @@
+from django.db import models
+
+
+class Term(models.Model):
+    # Vocabulary of FAQ tokens, ids are referenced by Faq.term_vector
+    text = models.TextField(unique=True)
+
+    def __str__(self):
+        return self.text
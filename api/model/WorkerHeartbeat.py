@@ -0,0 +1,31 @@
+from django.db import models
+from django.utils import timezone
+
+
+class WorkerHeartbeat(models.Model):
+    # One row per running worker process, refreshed while it is alive
+    SUGGESTION = 'suggestion'
+
+    KIND_CHOICES = [
+        (SUGGESTION, 'Suggestion generation'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    # hostname:pid, also stored on the jobs the worker holds
+    name = models.CharField(max_length=255, unique=True)
+    hostname = models.CharField(max_length=255)
+    pid = models.IntegerField()
+    concurrency = models.IntegerField(default=1)
+    started_at = models.DateTimeField(default=timezone.now)
+    last_heartbeat = models.DateTimeField(default=timezone.now)
+    stopped_at = models.DateTimeField(null=True, blank=True)
+    jobs_succeeded = models.IntegerField(default=0)
+    jobs_failed = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'last_heartbeat']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} worker {self.name}"
@@ -1,15 +1,22 @@
+import json
+
+from django.conf import settings
 from rest_framework import serializers
 from api.model.Query import Query
 from api.serializer.SubQuerySerializer import SubQuerySerializer
 
 class QuerySerializer(serializers.ModelSerializer):
-    subqueries = SubQuerySerializer(many=True, read_only=True)
-    context = serializers.CharField(read_only=True)
+    subqueries = SubQuerySerializer(source='turns', many=True, read_only=True)
+    # The latest turns in the shape Query.context used to hold
+    context = serializers.SerializerMethodField()
 
     class Meta:
         model = Query
         fields = ('id', 'lesson', 'user', 'subqueries', 'context')
 
+    def get_context(self, instance):
+        return json.dumps(instance.recent_messages(settings.CHATBOT_HISTORY_MESSAGES))
+
     def to_representation(self, instance):
         representation = super().to_representation(instance)
         representation['lesson'] = {
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from api.services import TextVector
+
+HITS_KEY = 'chatbot_answer_cache_hits'
+MISSES_KEY = 'chatbot_answer_cache_misses'
+
+HIT = 'hit'
+MISS = 'miss'
+BYPASS = 'bypass'
+
+Entry = namedtuple('Entry', ['answer', 'stored_at'])
+
+# (lesson_id, lesson_content_id, question, prompt digest) -> Entry, least recently used first
+_entries = OrderedDict()
+# lesson_id -> keys of its entries, the context of a page can come from any page of its lesson
+_lessons = {}
+_lock = threading.Lock()
+
+# steps -> TextVector.Pipeline, one per setting so overridden settings get their own
+_pipelines = {}
+
+
+def normalize_question(question):
+    """
+    The question as the cache compares it: the words left by the
+    CHATBOT_ANSWER_CACHE_STEPS of the FAQ tokenizer, in their order. The
+    default, case and punctuation, keeps every word; adding 'stem' also
+    matches plural and tense changes. Questions that normalize differently
+    never share an answer, so paraphrases ("what's a polynomial" and
+    "define a polynomial") miss the cache. There is no similarity
+    threshold: a near match can be a negation or a different question.
+    """
+    steps = frozenset(settings.CHATBOT_ANSWER_CACHE_STEPS)
+    pipeline = _pipelines.get(steps)
+    if pipeline is None:
+        pipeline = _pipelines.setdefault(steps, TextVector.Pipeline(steps))
+    return " ".join(pipeline.tokenize(question))
+
+
+def prompt_digest(history_content, conversation_context):
+    """
+    Digest of everything besides the question that the answer was written
+    from: the lesson text of the prompt (the page, or the chunks retrieval
+    picked from it and its neighbours) and the earlier turns sent with it.
+    """
+    turns = [(turn.get("role"), turn.get("content")) for turn in conversation_context]
+    payload = json.dumps([history_content, turns], separators=(',', ':'))
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+def answer_key(lesson_content, question, history_content, conversation_context):
+    question = normalize_question(question)
+    if not question:
+        return None
+    return (
+        lesson_content.lesson_id, lesson_content.id, question,
+        prompt_digest(history_content, conversation_context),
+    )
+
+
+def enabled():
+    return settings.CHATBOT_ANSWER_CACHE_SIZE > 0
+
+
+def bypassed(user, body):
+    # Teachers testing prompts can skip the cache with "bypass_cache": true
+    return bool(body.get('bypass_cache')) and getattr(user, 'role', None) == 'teacher'
+
+
+def _drop(key):
+    _entries.pop(key, None)
+    lesson_keys = _lessons.get(key[0])
+    if lesson_keys is not None:
+        lesson_keys.discard(key)
+        if not lesson_keys:
+            del _lessons[key[0]]
+
+
+def lookup(lesson_content, question, history_content, conversation_context):
+    """
+    The stored answer to the same question, after normalize_question,
+    asked about the page with the same lesson text and earlier turns in
+    the prompt, when it is younger than CHATBOT_ANSWER_CACHE_TTL seconds;
+    otherwise None.
+    """
+    key = answer_key(lesson_content, question, history_content, conversation_context)
+    if key is None:
+        return None
+
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry.stored_at > settings.CHATBOT_ANSWER_CACHE_TTL:
+            _drop(key)
+            return None
+        _entries.move_to_end(key)
+        return entry.answer
+
+
+def store(lesson_content, question, history_content, conversation_context, answer):
+    key = answer_key(lesson_content, question, history_content, conversation_context)
+    if key is None or not answer:
+        return
+
+    with _lock:
+        _entries[key] = Entry(answer, time.monotonic())
+        _entries.move_to_end(key)
+        _lessons.setdefault(key[0], set()).add(key)
+
+        while len(_entries) > settings.CHATBOT_ANSWER_CACHE_SIZE:
+            _drop(next(iter(_entries)))
+
+
+def invalidate(lesson_id):
+    # A page change can alter the context of every page of the lesson; other workers
+    # miss on the new prompt text instead
+    with _lock:
+        for key in list(_lessons.get(lesson_id, ())):
+            _drop(key)
+
+
+def _counter_key(outcome):
+    return HITS_KEY if outcome == HIT else MISSES_KEY
+
+
+def record(outcome):
+    # Hit/miss counters live in the shared cache so the stats cover every worker
+    if outcome == BYPASS:
+        return
+    key = _counter_key(outcome)
+    cache.add(key, 0, timeout=None)
+    cache.incr(key)
+
+
+async def arecord(outcome):
+    if outcome == BYPASS:
+        return
+    key = _counter_key(outcome)
+    await cache.aadd(key, 0, timeout=None)
+    await cache.aincr(key)
+
+
+def stats():
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    with _lock:
+        entries = len(_entries)
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+        # Entries held by the worker answering this request
+        'entries': entries,
+    }
+
+
+def reset_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
@@ -0,0 +1,214 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponseBadRequest, HttpResponseNotFound, JsonResponse
+from langchain.chains import ConversationChain
+from langchain.memory import ConversationSummaryBufferMemory
+
+from api.controllers.static.prompts import CHATBOT_OUTPUT_CONTEXT, prompt_history_content
+from api.model.Lesson import Lesson
+from api.model.LessonContent import LessonContent
+from api.model.Query import Query
+from api.model.SubQuery import SubQuery
+from api.services import AnswerCache, FaqQueue, LessonRetrieval, LlmClients
+
+MODEL = "gpt-3.5-turbo"
+
+
+class ChatError(Exception):
+    # Carries the response a view returns as is (bad body, unknown lesson or page)
+    def __init__(self, response):
+        super().__init__(response.status_code)
+        self.response = response
+
+
+class ChatTurn:
+    """
+    One student message to the chatbot: what the sync, async and streaming
+    views need to answer it, loaded by start().
+    """
+
+    def __init__(self, user, body, message, lesson, lesson_content):
+        self.user = user
+        self.body = body
+        self.message = message
+        self.lesson = lesson
+        self.lesson_content = lesson_content
+        self.history_content = None
+        self.query = None
+        self.conversation_context = []
+        self.cache_status = AnswerCache.BYPASS
+        self.cached_response = None
+
+    @property
+    def llm_cache(self):
+        # A teacher bypassing the answer cache skips the LLM response cache too
+        return not AnswerCache.bypassed(self.user, self.body)
+
+    def messages(self):
+        return build_messages(self.history_content, self.conversation_context, self.message)
+
+
+def parse_body(request):
+    try:
+        body = json.loads(request.body)
+        return body, body['message']
+    except (ValueError, KeyError):
+        raise ChatError(HttpResponseBadRequest("Invalid request body"))
+
+
+def check_found(lesson, lesson_content):
+    if lesson is None:
+        raise ChatError(JsonResponse({"error": "Lesson not found"}, status=404))
+    if lesson_content is None:
+        raise ChatError(HttpResponseNotFound("Lesson content not found"))
+
+
+def lookup_answer(turn):
+    # A stored answer to the same question with the same prompt context skips the LLM
+    if AnswerCache.enabled() and not AnswerCache.bypassed(turn.user, turn.body):
+        turn.cached_response = AnswerCache.lookup(
+            turn.lesson_content, turn.message, turn.history_content, turn.conversation_context
+        )
+        turn.cache_status = AnswerCache.MISS if turn.cached_response is None else AnswerCache.HIT
+
+
+def start(request, lesson_id, lesson_content_id):
+    """
+    Parses the request body and loads the lesson page, the prompt context,
+    the earlier turns and any cached answer. Raises ChatError with the
+    response to return when the body or the ids are invalid.
+    """
+    body, message = parse_body(request)
+    lesson = Lesson.objects.filter(id=lesson_id).first()
+    lesson_content = LessonContent.objects.filter(id=lesson_content_id, lesson_id=lesson_id).first()
+    check_found(lesson, lesson_content)
+
+    turn = ChatTurn(request.user, body, message, lesson, lesson_content)
+    turn.history_content = history_content(lesson, lesson_content, message)
+
+    # Earlier turns of this student's conversation about the lesson
+    turn.query, created = Query.objects.get_or_create(lesson=lesson, user=request.user)
+    turn.conversation_context = turn.query.recent_messages(settings.CHATBOT_HISTORY_MESSAGES)
+
+    lookup_answer(turn)
+    AnswerCache.record(turn.cache_status)
+    return turn
+
+
+async def astart(request, lesson_id, lesson_content_id):
+    body, message = parse_body(request)
+    lesson = await Lesson.objects.filter(id=lesson_id).afirst()
+    lesson_content = await LessonContent.objects.filter(id=lesson_content_id, lesson_id=lesson_id).afirst()
+    check_found(lesson, lesson_content)
+
+    turn = ChatTurn(request.user, body, message, lesson, lesson_content)
+    # Retrieval may build the lesson's chunk index, which runs on the sync side
+    turn.history_content = await sync_to_async(history_content)(lesson, lesson_content, message)
+
+    turn.query, created = await Query.objects.aget_or_create(lesson=lesson, user=request.user)
+    turn.conversation_context = await turn.query.arecent_messages(settings.CHATBOT_HISTORY_MESSAGES)
+
+    lookup_answer(turn)
+    await AnswerCache.arecord(turn.cache_status)
+    return turn
+
+
+def answer(turn):
+    # The cached answer, or the model's
+    if turn.cached_response is not None:
+        return turn.cached_response
+    if settings.CHATBOT_PROMPT_MODE == 'summary':
+        return summary_response(turn.history_content, turn.message)
+    # One request with the whole prompt, no summarization round trip first
+    response = LlmClients.chat_completion(MODEL, turn.messages(), cache=turn.llm_cache, temperature=0)
+    return response['choices'][0]['message']['content']
+
+
+async def aanswer(turn):
+    if turn.cached_response is not None:
+        return turn.cached_response
+    if settings.CHATBOT_PROMPT_MODE == 'summary':
+        # The LangChain memory is sync only
+        return await sync_to_async(summary_response, thread_sensitive=False)(turn.history_content, turn.message)
+    response = await LlmClients.achat_completion(MODEL, turn.messages(), cache=turn.llm_cache, temperature=0)
+    return response['choices'][0]['message']['content']
+
+
+def store_answer(turn, ai_response):
+    # Caches a new answer in this worker's memory
+    if turn.cache_status == AnswerCache.MISS:
+        AnswerCache.store(
+            turn.lesson_content, turn.message, turn.history_content, turn.conversation_context, ai_response
+        )
+
+
+def save_turn(turn, ai_response):
+    # One appended row per turn, the earlier turns are never rewritten. The message is queued
+    # for FAQ grouping in the same transaction, run_faq_worker adds it to the FAQ off the request path
+    with transaction.atomic():
+        SubQuery.objects.create(query=turn.query, question=turn.message, response=ai_response)
+        FaqQueue.enqueue(turn.lesson.id, turn.message)
+
+
+def finish(turn, ai_response):
+    # Caches a new answer and saves the exchange
+    store_answer(turn, ai_response)
+    save_turn(turn, ai_response)
+
+
+async def afinish(turn, ai_response):
+    store_answer(turn, ai_response)
+    # A transaction keeps to one connection, so the save runs on the sync side
+    await sync_to_async(save_turn)(turn, ai_response)
+
+
+def json_response(turn, ai_response):
+    response = JsonResponse({"response": ai_response})
+    response['X-Answer-Cache'] = turn.cache_status
+    return response
+
+
+def history_content(lesson, lesson_content, user_message):
+    if settings.CHATBOT_CONTEXT_MODE == 'retrieval':
+        # Only the parts of the lesson relevant to the question
+        content_text = LessonRetrieval.select_context(lesson_content, user_message)
+    else:
+        # The whole page; plain text is extracted from the page HTML when the page is saved
+        content_text = lesson_content.get_plain_text()
+
+    # Prepare the history content for the assistant's introduction
+    return prompt_history_content(lesson.get_title(), lesson.get_subtitle(), content_text)
+
+
+def build_messages(history_content, conversation_context, user_message):
+    messages = [
+        {"role": "system", "content": history_content},
+        {"role": "assistant", "content": CHATBOT_OUTPUT_CONTEXT},
+    ]
+    messages.extend(
+        {"role": turn["role"], "content": turn["content"]}
+        for turn in conversation_context[-settings.CHATBOT_HISTORY_MESSAGES:]
+        if turn.get("role") in ("user", "assistant") and turn.get("content")
+    )
+    messages.append({"role": "user", "content": f"Can you answer my question or Do what I say directly: {user_message}?"})
+    return messages
+
+
+def summary_response(history_content, user_message):
+    # Setup the OpenAI model and memory; the model and its connection pool are shared across requests
+    llm = LlmClients.chat_model(MODEL, temperature=0)
+    memory = ConversationSummaryBufferMemory(llm=llm)
+
+    with LlmClients.limit(MODEL):
+        memory.save_context({"input": history_content}, {"output": CHATBOT_OUTPUT_CONTEXT})
+
+        # Setup the conversation chain
+        conversation = ConversationChain(llm=llm,
+                                         memory=memory,
+                                         verbose=True)
+
+        # Generate AI response based on user message
+        return conversation.predict(input=f"Can you answer my question or Do what I say directly: {user_message}?")
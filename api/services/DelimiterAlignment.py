@@ -0,0 +1,364 @@
+import re
+import time
+from bisect import bisect_left
+from collections import namedtuple
+from difflib import SequenceMatcher
+
+from api.services import TextVector
+
+DELIMITER = "<!-- delimiter -->"
+
+# Comments, tags and words; whitespace between them is left out of the comparison
+_TOKEN = re.compile(r'<!--.*?-->|<[^>]*>|[^<\s]+', re.DOTALL)
+_DELIMITER = re.compile(r'<!--\s*delimiter\s*-->', re.IGNORECASE)
+_TAG_NAME = re.compile(r'<\s*(/?)\s*([a-zA-Z][\w-]*)')
+
+# Elements a page can start or end at
+BLOCK_TAGS = frozenset("""
+    address article aside blockquote br dd details div dl dt figcaption figure footer form h1 h2 h3 h4 h5 h6
+    header hr iframe img li main nav ol p pre section table tbody td tfoot th thead tr ul video
+""".split())
+VOID_TAGS = frozenset("area base br col embed hr img input link meta source track wbr".split())
+
+# A split counts as clearly best when it agrees with this many more words than any other
+MIN_MARGIN = 2
+# Changed passages longer than this many tokens only match on runs of two or more tokens
+SHORT_RANGE = 8
+
+# Tokens of the original pages on either side of an ambiguous delimiter sent with its span
+CONTEXT_TOKENS = 40
+
+Token = namedtuple('Token', ['text', 'start', 'end'])
+Alignment = namedtuple('Alignment', ['content', 'placed', 'ambiguous', 'seconds', 'spans'])
+# Part of the aligned content around ambiguous delimiters, content[start:end]. text is the same part of
+# the edited document, without the delimiters (their number) placed in it; before and after are the
+# original text ahead of the first of them and behind the last
+Span = namedtuple('Span', ['start', 'end', 'text', 'delimiters', 'before', 'after'])
+
+
+def tokenize(html):
+    """
+    (tokens, delimiter positions): the tags and words of html with their
+    character spans, delimiters left out, and for each delimiter the
+    index of the token it came before.
+    """
+    tokens = []
+    delimiters = []
+    for match in _TOKEN.finditer(html):
+        if _DELIMITER.fullmatch(match.group()):
+            delimiters.append(len(tokens))
+        else:
+            tokens.append(Token(match.group(), match.start(), match.end()))
+    return tokens, delimiters
+
+
+def _key(token):
+    # Tags compare without attribute spacing or case differences, words exactly
+    if token.text.startswith('<'):
+        return " ".join(token.text.lower().split())
+    return token.text
+
+
+def _tag(token):
+    # (is closing, name) of a tag token, None for words and comments
+    if not token.text.startswith('<') or token.text.startswith('<!'):
+        return None
+    match = _TAG_NAME.match(token.text)
+    return (match.group(1) == '/', match.group(2).lower()) if match else None
+
+
+def _is_word(token):
+    return not token.text.startswith('<')
+
+
+def _terms(tokens):
+    return set(TextVector.tokenize(" ".join(token.text for token in tokens if _is_word(token))))
+
+
+def _depths(tokens):
+    # Number of elements open before each position (and after the last token)
+    depths = [0]
+    for token in tokens:
+        tag = _tag(token)
+        depth = depths[-1]
+        if tag is not None and tag[1] not in VOID_TAGS and not token.text.endswith('/>'):
+            depth = max(0, depth + (-1 if tag[0] else 1))
+        depths.append(depth)
+    return depths
+
+
+def _split_points(tokens, depths, start, end):
+    """
+    Positions in tokens[start:end] where a page may begin: after a closing
+    (or void) block tag or before an opening one, at the outermost level
+    the range reaches.
+    """
+    points = []
+    for position in range(start, end + 1):
+        previous_tag = _tag(tokens[position - 1]) if position > 0 else None
+        next_tag = _tag(tokens[position]) if position < len(tokens) else None
+        if (
+            position == 0 or position == len(tokens)
+            or (previous_tag is not None and previous_tag[1] in BLOCK_TAGS
+                and (previous_tag[0] or previous_tag[1] in VOID_TAGS))
+            or (next_tag is not None and next_tag[1] in BLOCK_TAGS and not next_tag[0])
+        ):
+            points.append(position)
+    if not points:
+        return points
+    outermost = min(depths[position] for position in points)
+    return [position for position in points if depths[position] == outermost]
+
+
+def _close_splits(points, tokens, before_terms, after_terms):
+    """
+    The split points that put about as many of the words like the text
+    before the delimiter ahead of it, and of those like the text after it
+    behind it, as the best one does: within MIN_MARGIN words of it, best first.
+    """
+    scores = []
+    score = 0
+    previous = points[0]
+    for point in points:
+        for token in tokens[previous:point]:
+            if _is_word(token):
+                for term in TextVector.tokenize(token.text):
+                    score += (term in before_terms) - (term in after_terms)
+        previous = point
+        scores.append((score, point))
+
+    # Ties go to the later point, keeping new content with the preceding page
+    ranked = sorted(scores, reverse=True)
+    return [point for score, point in ranked if score > ranked[0][0] - MIN_MARGIN]
+
+
+def _text_units(keys):
+    # Token ranges of the text between block tags (inline tags included), the units the documents are matched by
+    units = []
+    start = 0
+    # The extra block tag closes the last unit
+    for index, key in enumerate(keys + ['<p>']):
+        match = _TAG_NAME.match(key)
+        if match and match.group(2) in BLOCK_TAGS:
+            if any(not keys[token].startswith('<') for token in range(start, index)):
+                units.append((start, index))
+            start = index + 1
+    return units
+
+
+def _match(original_keys, edited_keys):
+    """
+    Edited position of every original token that survived unchanged. The
+    blocks of text are matched first and the tokens only in between them,
+    which keeps a lesson in milliseconds and stops the tags every page
+    repeats (</p>, the same image) from matching across pages.
+    """
+    original_units = _text_units(original_keys)
+    edited_units = _text_units(edited_keys)
+    matcher = SequenceMatcher(
+        None,
+        [tuple(original_keys[start:end]) for start, end in original_units],
+        [tuple(edited_keys[start:end]) for start, end in edited_units],
+        autojunk=False,
+    )
+
+    pairs = [
+        (original_units[i + offset], edited_units[j + offset])
+        for i, j, size in matcher.get_matching_blocks() for offset in range(size)
+    ]
+    # Tokens after the last matched text are diffed like any other gap
+    pairs.append(((len(original_keys), len(original_keys)), (len(edited_keys), len(edited_keys))))
+
+    mapped = {}
+    original_previous = edited_previous = 0
+    for (original_start, original_end), (edited_start, edited_end) in pairs:
+        gap = SequenceMatcher(
+            None, original_keys[original_previous:original_start], edited_keys[edited_previous:edited_start],
+            autojunk=False,
+        )
+        # A lone common word ("the") matching inside a rewritten passage is no anchor
+        shortest = 1 if original_start - original_previous <= SHORT_RANGE else 2
+        for i, j, size in gap.get_matching_blocks():
+            if size >= shortest:
+                for offset in range(size):
+                    mapped[original_previous + i + offset] = edited_previous + j + offset
+
+        for offset in range(original_end - original_start):
+            mapped[original_start + offset] = edited_start + offset
+        original_previous, edited_previous = original_end, edited_end
+    return mapped
+
+
+def _kept_edge(tokens, mapped, index, step):
+    """
+    Edited position of tokens[index] when it and the markup beyond it (in
+    the step direction) moved together with the next word; None when that
+    is not certain, as a repeated tag like </p> can match in another page.
+    """
+    if index not in mapped:
+        return None
+    following = index
+    while 0 <= following < len(tokens):
+        if mapped.get(following) != mapped[index] + following - index:
+            return None
+        if _is_word(tokens[following]):
+            break
+        following += step
+    return mapped[index]
+
+
+def align(original, edited):
+    """
+    Places the delimiters of original into edited: both are diffed as
+    tag and word streams and every delimiter goes to where the words
+    around it went. When words were added or rewritten at a delimiter, it
+    goes to the block boundary whose surrounding words best match the
+    original pages, and is reported as ambiguous when no boundary is
+    clearly best. Delimiters already in edited are kept, and a deleted
+    page leaves a single delimiter, never an empty page. Returns
+    Alignment(content, number placed, indexes of the ambiguous delimiters
+    of original, seconds taken, spans), where spans are the Spans of
+    content the ambiguous delimiters were placed in.
+    """
+    started = time.perf_counter()
+    original_tokens, original_delimiters = tokenize(original)
+    edited_tokens, edited_delimiters = tokenize(edited)
+
+    mapped = _match([_key(token) for token in original_tokens], [_key(token) for token in edited_tokens])
+    mapped_words = sorted(index for index in mapped if _is_word(original_tokens[index]))
+    depths = _depths(edited_tokens)
+
+    pages = [0] + original_delimiters + [len(original_tokens)]
+    positions = []
+    ambiguous = []
+    # (edited start, edited end, delimiter index) of the range each ambiguous delimiter was placed in
+    ranges = []
+    for index, boundary in enumerate(original_delimiters):
+        # The nearest unchanged words on either side of the delimiter
+        word = bisect_left(mapped_words, boundary)
+        left_word = mapped_words[word - 1] if word > 0 else None
+        right_word = mapped_words[word] if word < len(mapped_words) else None
+        start = mapped[left_word] + 1 if left_word is not None else 0
+        end = mapped[right_word] if right_word is not None else len(edited_tokens)
+        first = left_word + 1 if left_word is not None else 0
+        last = right_word if right_word is not None else len(original_tokens)
+
+        # Where the markup on either side of the delimiter stayed in place, it goes between it
+        low = _kept_edge(original_tokens, mapped, boundary - 1, -1)
+        low = start if low is None else low + 1
+        high = _kept_edge(original_tokens, mapped, boundary, 1)
+        high = end if high is None else high
+
+        points = _split_points(edited_tokens, depths, start, end)
+        points = [point for point in points if low <= point <= high] or points
+        if not points:
+            positions.append(end)
+            continue
+
+        # More than one place left when something was added or rewritten at the delimiter:
+        # compare the new words with the rewritten words on each side, or with the whole page
+        # where nothing was rewritten. When that is not decisive and words were rewritten on
+        # one side only, the new words most likely replace them
+        rewritten_before = _terms(original_tokens[first:boundary])
+        rewritten_after = _terms(original_tokens[boundary:last])
+        close = _close_splits(
+            points, edited_tokens,
+            rewritten_before or _terms(original_tokens[pages[index]:boundary]),
+            rewritten_after or _terms(original_tokens[boundary:pages[index + 2]]),
+        )
+        if len(close) == 1 or bool(rewritten_before) != bool(rewritten_after):
+            position = close[0] if len(close) == 1 else (max(close) if rewritten_before else min(close))
+            confident = True
+        else:
+            position, confident = close[0], False
+        positions.append(position)
+        if not confident:
+            ambiguous.append(index)
+            ranges.append((
+                edited_tokens[start - 1].end if start > 0 else 0,
+                edited_tokens[end].start if end < len(edited_tokens) else len(edited),
+                index,
+            ))
+
+    # A delimiter already at the position is not repeated. The delimiters around a deleted page
+    # map to the same position (or to either end), where more than one would open an empty page
+    existing = set(edited_delimiters)
+    inserts = sorted(position for position in set(positions) - existing if 0 < position < len(edited_tokens))
+
+    parts = []
+    previous = 0
+    offsets = []
+    for position in inserts:
+        offset = edited_tokens[position].start if position < len(edited_tokens) else len(edited)
+        parts.append(edited[previous:offset])
+        parts.append(DELIMITER)
+        previous = offset
+        offsets.append(offset)
+    parts.append(edited[previous:])
+
+    spans = _spans(ranges, offsets, edited, original, original_tokens, pages)
+    return Alignment("".join(parts), len(inserts), ambiguous, time.perf_counter() - started, spans)
+
+
+def _spans(ranges, offsets, edited, original, original_tokens, pages):
+    """
+    Spans of the aligned content for the ranges of edited the ambiguous
+    delimiters were placed in, overlapping ranges merged. offsets are the
+    positions in edited the delimiters were inserted at, in order.
+    """
+    merged = []
+    for start, end, index in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+            merged[-1][3] = index
+        else:
+            merged.append([start, end, index, index])
+
+    spans = []
+    for start, end, first, last in merged:
+        # A delimiter inserted where the range starts or ends falls inside it
+        before_start = bisect_left(offsets, start)
+        through_end = bisect_left(offsets, end + 1)
+        delimiters = through_end - before_start
+        if not delimiters:
+            continue
+
+        first_boundary, last_boundary = pages[first + 1], pages[last + 1]
+        context_start = max(pages[first], first_boundary - CONTEXT_TOKENS)
+        context_end = min(pages[last + 2], last_boundary + CONTEXT_TOKENS)
+        spans.append(Span(
+            start + len(DELIMITER) * before_start, end + len(DELIMITER) * through_end, edited[start:end], delimiters,
+            original[original_tokens[context_start].start:original_tokens[first_boundary - 1].end]
+            if first_boundary > context_start else "",
+            original[original_tokens[last_boundary].start:original_tokens[context_end - 1].end]
+            if context_end > last_boundary else "",
+        ))
+    return spans
+
+
+def same_content(first, second):
+    # True when the two documents differ only in delimiters and whitespace
+    return [_key(token) for token in tokenize(first)[0]] == [_key(token) for token in tokenize(second)[0]]
+
+
+def boundaries(html):
+    # Token positions of the delimiters of html, to compare two placements
+    return tokenize(html)[1]
+
+
+def apply_spans(content, spans, replies):
+    """
+    content with each span replaced by its reply where the reply is the
+    span's text with exactly its number of delimiters added; other spans
+    keep the local placement. Returns (content, number of replies used).
+    """
+    used = 0
+    # From the end, so the offsets of the earlier spans still hold
+    for span, reply in sorted(zip(spans, replies), key=lambda pair: pair[0].start, reverse=True):
+        if reply is None or not same_content(reply, span.text):
+            continue
+        if len(boundaries(reply)) != len(boundaries(span.text)) + span.delimiters:
+            continue
+        content = content[:span.start] + reply + content[span.end:]
+        used += 1
+    return content, used
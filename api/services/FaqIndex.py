@@ -0,0 +1,285 @@
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from api.model.Faq import Faq
+from api.services import Vocabulary
+
+
+# Bumped in the shared cache after every committed FAQ change of a lesson, see faq_saved()
+LESSON_VERSION_KEY = 'faq_index_lesson_version:{}'
+
+# Terms in more FAQs than this ("what", "is") are read in impact order and stop early, see best_match()
+COMMON_TERM_POSTINGS = 500
+# Relative slack on the early stop, so float rounding never drops a FAQ that ties the best one
+_BOUND_SLACK = 1e-9
+
+
+class LessonFaqIndex:
+    """
+    Inverted index over the FAQ questions of a single lesson.
+    term_id -> {faq_id: count}, plus the stored norm of every FAQ vector,
+    so a message is only scored against FAQs sharing at least one term.
+    impacts keeps the postings of the common terms a message was matched
+    on sorted by count / norm as well. version is the lesson version the
+    index holds every change up to, None until it is loaded.
+    """
+
+    def __init__(self, lesson_id):
+        self.lesson_id = lesson_id
+        self.postings = defaultdict(dict)
+        self.impacts = {}
+        self.norms = {}
+        self.terms = {}
+        self.first_faq_id = None
+        self.version = None
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.norms)
+
+    def add(self, faq_id, term_vector, norm):
+        with self.lock:
+            if faq_id in self.norms:
+                self.remove(faq_id)
+
+            for term_id, count in term_vector:
+                self.postings[term_id][faq_id] = count
+                if term_id in self.impacts:
+                    insort(self.impacts[term_id], (-count / norm, faq_id))
+
+            self.terms[faq_id] = [term_id for term_id, _ in term_vector]
+            self.norms[faq_id] = norm
+            if self.first_faq_id is None or faq_id < self.first_faq_id:
+                self.first_faq_id = faq_id
+
+    def remove(self, faq_id):
+        with self.lock:
+            terms = self.terms.pop(faq_id, None)
+            if terms is None:
+                return
+
+            norm = self.norms[faq_id]
+            for term_id in terms:
+                posting = self.postings.get(term_id)
+                if posting is None:
+                    continue
+                count = posting.pop(faq_id, None)
+                impacts = self.impacts.get(term_id)
+                if impacts is not None and count is not None:
+                    del impacts[bisect_left(impacts, (-count / norm, faq_id))]
+                if not posting:
+                    del self.postings[term_id]
+                    self.impacts.pop(term_id, None)
+
+            del self.norms[faq_id]
+            if faq_id == self.first_faq_id:
+                self.first_faq_id = min(self.norms) if self.norms else None
+
+    def best_match(self, message_vector, message_norm):
+        """
+        message_vector maps term ids to counts, message_norm covers every
+        word of the message (including ones outside the vocabulary).
+        Returns (faq_id, similarity) of the most similar FAQ, matching the
+        brute-force scan: ties go to the lowest id, and when nothing shares
+        a term the first FAQ is returned with similarity 0.0.
+        Returns (None, -1) when the lesson has no FAQs.
+
+        Every FAQ sharing a rare term with the message is scored, so the
+        cost grows with the postings of the message's rare terms. FAQs
+        sharing only common terms are read best first from impacts and
+        the scan stops once none of the rest can reach the best similarity
+        (Fagin's threshold algorithm). That is exact, but how early it stops
+        depends on the lesson: a message made of common words that no FAQ
+        matches well still reads most of their postings.
+        """
+        with self.lock:
+            if not self.norms:
+                return None, -1
+
+            if not message_norm:
+                return self.first_faq_id, 0.0
+
+            common = {
+                term_id: weight for term_id, weight in message_vector.items()
+                if len(self.postings.get(term_id, ())) > COMMON_TERM_POSTINGS
+            }
+
+            dot_products = defaultdict(int)
+            for term_id, weight in message_vector.items():
+                if term_id not in common:
+                    for faq_id, count in self.postings.get(term_id, {}).items():
+                        dot_products[faq_id] += weight * count
+            for term_id, weight in common.items():
+                posting = self.postings[term_id]
+                for faq_id in dot_products:
+                    dot_products[faq_id] += weight * posting.get(faq_id, 0)
+
+            best_id, best_sim = self.first_faq_id, 0.0
+            for faq_id, dot_product in dot_products.items():
+                best_id, best_sim = self._better(faq_id, dot_product, message_norm, best_id, best_sim)
+
+            if common:
+                best_id, best_sim = self._best_common_match(common, message_norm, dot_products, best_id, best_sim)
+            return best_id, best_sim
+
+    def _better(self, faq_id, dot_product, message_norm, best_id, best_sim):
+        cosine_sim = dot_product / (message_norm * self.norms[faq_id])
+        if cosine_sim > best_sim or (cosine_sim == best_sim and faq_id < best_id):
+            return faq_id, cosine_sim
+        return best_id, best_sim
+
+    def _best_common_match(self, common, message_norm, scored, best_id, best_sim):
+        # The FAQs outside scored share only common terms with the message. An unread FAQ scores at
+        # most the sum of each term's weight times the count / norm the term's impacts have reached
+        impacts = [(weight, self._impacts(term_id), self.postings[term_id]) for term_id, weight in common.items()]
+        seen = set(scored)
+        depth = 0
+        while True:
+            bound = 0.0
+            for weight, term_impacts, _ in impacts:
+                if depth < len(term_impacts):
+                    ratio, faq_id = term_impacts[depth]
+                    bound -= weight * ratio
+                    if faq_id not in seen:
+                        seen.add(faq_id)
+                        dot_product = sum(w * posting.get(faq_id, 0) for w, _, posting in impacts)
+                        best_id, best_sim = self._better(faq_id, dot_product, message_norm, best_id, best_sim)
+            if bound * (1 + _BOUND_SLACK) < best_sim * message_norm:
+                return best_id, best_sim
+            depth += 1
+
+    def _impacts(self, term_id):
+        # Built the first time the term is common in a message, then kept up to date by add() and remove()
+        impacts = self.impacts.get(term_id)
+        if impacts is None:
+            impacts = sorted((-count / self.norms[faq_id], faq_id) for faq_id, count in self.postings[term_id].items())
+            self.impacts[term_id] = impacts
+        return impacts
+
+    def load(self):
+        # The version is read before the rows: every change it counts was committed before it was bumped
+        version = cache.get(LESSON_VERSION_KEY.format(self.lesson_id), 0)
+        rows = list(Faq.objects.filter(lesson_id=self.lesson_id).values_list('id', 'term_vector', 'vector_norm'))
+        with self.lock:
+            self.postings = defaultdict(dict)
+            self.impacts = {}
+            self.norms = {}
+            self.terms = {}
+            self.first_faq_id = None
+            for faq_id, term_vector, norm in rows:
+                self.add(faq_id, term_vector, norm)
+            self.version = version
+
+    def sync(self):
+        # Reload when another process committed a change to the lesson's FAQs (added, edited or deleted)
+        if cache.get(LESSON_VERSION_KEY.format(self.lesson_id), 0) != self.version:
+            self.load()
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+# Bumped in the shared cache when stored vectors are rebuilt, so every worker reloads
+VERSION_KEY = 'faq_index_version'
+_version = {'value': None, 'checked_at': 0.0}
+
+
+def _check_version():
+    now = time.monotonic()
+    if now - _version['checked_at'] < settings.FAQ_INDEX_CHECK_SECONDS:
+        return
+
+    version = cache.get(VERSION_KEY)
+    with _indexes_lock:
+        if version != _version['value']:
+            _indexes.clear()
+            _version['value'] = version
+        _version['checked_at'] = now
+
+
+def invalidate_all():
+    cache.set(VERSION_KEY, time.time_ns(), timeout=None)
+    with _indexes_lock:
+        _indexes.clear()
+        _version['checked_at'] = 0.0
+
+
+def get_index(lesson_id):
+    _check_version()
+    with _indexes_lock:
+        index = _indexes.get(lesson_id)
+        if index is None:
+            index = LessonFaqIndex(lesson_id)
+            _indexes[lesson_id] = index
+
+    index.sync()
+    return index
+
+
+def find_most_similar_faq(lesson_id, message_vector):
+    """
+    Returns (faq, similarity) for the FAQ of the lesson most similar to
+    message_vector (a word frequency Counter), or (None, -1) when the
+    lesson has no FAQs yet.
+    """
+    index = get_index(lesson_id)
+
+    # Words outside the vocabulary cannot match any FAQ, so nothing is inserted here
+    term_vector, message_norm = Vocabulary.vectorize(message_vector)
+    term_vector = dict(term_vector)
+
+    while True:
+        faq_id, similarity = index.best_match(term_vector, message_norm)
+        if faq_id is None:
+            return None, similarity
+
+        faq = Faq.objects.select_related('related_content').filter(id=faq_id).first()
+        if faq is not None:
+            return faq, similarity
+
+        # Deleted by another process, drop it and score again
+        index.remove(faq_id)
+
+
+def _committed(lesson_id, apply):
+    """
+    Runs apply(index) on the lesson's index of this process once the
+    transaction commits, and bumps the lesson version for the others.
+    When nobody else changed the lesson in between, the index stays
+    current instead of reloading.
+    """
+    def on_commit():
+        key = LESSON_VERSION_KEY.format(lesson_id)
+        cache.add(key, 0, timeout=None)
+        index = _indexes.get(lesson_id)
+        if index is None:
+            cache.incr(key)
+            return
+        with index.lock:
+            apply(index)
+            version = cache.incr(key)
+            if index.version == version - 1:
+                index.version = version
+
+    transaction.on_commit(on_commit)
+
+
+def faq_saved(faq):
+    faq_id, term_vector, norm = faq.id, faq.term_vector, faq.vector_norm
+    _committed(faq.lesson_id, lambda index: index.add(faq_id, term_vector, norm))
+
+
+def faq_deleted(faq):
+    faq_id = faq.id
+    _committed(faq.lesson_id, lambda index: index.remove(faq_id))
+
+
+def lesson_changed(lesson_id):
+    # Rows changed in bulk, without signals: reload this process's index, the others follow the version
+    _committed(lesson_id, lambda index: index.load())
@@ -0,0 +1,94 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from api.model.Faq import Faq
+from api.services import Vocabulary
+
+# Upper bound on dense score cells materialized at once (batch rows x FAQs)
+MAX_SCORE_CELLS = 4_000_000
+
+
+def _to_csr(term_vectors, num_columns):
+    indptr = [0]
+    indices = []
+    data = []
+    for term_vector in term_vectors:
+        for term_id, count in term_vector:
+            indices.append(term_id)
+            data.append(count)
+        indptr.append(len(indices))
+
+    return csr_matrix(
+        (np.asarray(data, dtype=np.float64), np.asarray(indices, dtype=np.int64), np.asarray(indptr, dtype=np.int64)),
+        shape=(len(term_vectors), num_columns),
+    )
+
+
+class FaqMatrix:
+    """
+    A lesson's FAQ term-frequency vectors as a CSR matrix (one row per FAQ,
+    ordered by id) plus row norms. Scores a batch of messages with one
+    sparse product and picks the best FAQ per message with argmax, giving
+    the same result as comparing each message to every FAQ one by one.
+    """
+
+    def __init__(self, faq_ids, term_vectors, norms):
+        self.faq_ids = np.asarray(faq_ids, dtype=np.int64)
+        self.norms = np.asarray(norms, dtype=np.float64)
+        self.term_vectors = term_vectors
+        self.num_columns = 1 + max((term_id for vector in term_vectors for term_id, _ in vector), default=0)
+        self.matrix = _to_csr(term_vectors, self.num_columns)
+
+    def __len__(self):
+        return len(self.faq_ids)
+
+    @classmethod
+    def for_lesson(cls, lesson_id):
+        rows = Faq.objects.filter(lesson_id=lesson_id).order_by('id').values_list('id', 'term_vector', 'vector_norm')
+        faq_ids, term_vectors, norms = zip(*rows) if rows else ((), (), ())
+        return cls(faq_ids, list(term_vectors), norms)
+
+    def best_matches(self, message_vectors, message_norms):
+        """
+        message_vectors: list of [[term_id, count], ...], message_norms: their norms.
+        Returns a list of (faq_id, similarity), (None, -1) when there are no FAQs.
+        """
+        if not len(self.faq_ids):
+            return [(None, -1) for _ in message_vectors]
+
+        # Terms the lesson has never seen cannot contribute to any dot product
+        message_vectors = [
+            [[term_id, count] for term_id, count in vector if term_id < self.num_columns]
+            for vector in message_vectors
+        ]
+        messages = _to_csr(message_vectors, self.num_columns)
+        message_norms = np.asarray(message_norms, dtype=np.float64)
+
+        results = []
+        chunk_size = max(1, MAX_SCORE_CELLS // len(self.faq_ids))
+        for start in range(0, len(message_vectors), chunk_size):
+            end = start + chunk_size
+            dot_products = (messages[start:end] @ self.matrix.T).toarray()
+            denominators = message_norms[start:end, None] * self.norms[None, :]
+            scores = np.divide(dot_products, denominators, out=np.zeros_like(dot_products), where=denominators > 0)
+
+            best_rows = scores.argmax(axis=1)
+            for offset, row in enumerate(best_rows):
+                results.append((int(self.faq_ids[row]), float(scores[offset, row])))
+
+        return results
+
+    def best_match(self, message_vector, message_norm):
+        return self.best_matches([message_vector], [message_norm])[0]
+
+
+def match_messages(lesson_id, messages):
+    """
+    Returns (faq_id, similarity) of the most similar FAQ for every message
+    text, scoring the whole batch against the lesson in one pass.
+    """
+    vectorized = [Vocabulary.vectorize_text(message) for message in messages]
+    return FaqMatrix.for_lesson(lesson_id).best_matches(
+        [term_vector for term_vector, _ in vectorized],
+        [norm for _, norm in vectorized],
+    )
@@ -0,0 +1,95 @@
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from api.model.FaqClassificationJob import FaqClassificationJob
+from api.model.Lesson import Lesson
+
+MAX_ATTEMPTS = 3
+
+
+def enqueue(lesson_id, message):
+    return FaqClassificationJob.objects.create(lesson_id=lesson_id, message=message)
+
+
+def claim_next_job():
+    """
+    Marks the oldest pending job (or a running one whose worker stopped
+    answering) as running and returns it, or None when the queue is empty.
+    Rows locked by another worker are skipped. Every claim counts as an
+    attempt, so a job whose workers keep dying fails after MAX_ATTEMPTS.
+    """
+    stale_before = timezone.now() - timedelta(seconds=settings.FAQ_QUEUE_LEASE_SECONDS)
+    with transaction.atomic():
+        jobs = FaqClassificationJob.objects.select_for_update(skip_locked=True).filter(
+            Q(status=FaqClassificationJob.PENDING) |
+            Q(status=FaqClassificationJob.RUNNING, started_at__lt=stale_before)
+        ).order_by('id')
+
+        while True:
+            job = jobs.first()
+            if job is None:
+                return None
+
+            if job.attempts >= MAX_ATTEMPTS:
+                job.status = FaqClassificationJob.FAILED
+                job.error = job.error or f"Lease expired on attempt {job.attempts}"
+                job.save(update_fields=['status', 'error'])
+                continue
+
+            job.status = FaqClassificationJob.RUNNING
+            job.started_at = timezone.now()
+            job.attempts += 1
+            job.save(update_fields=['status', 'started_at', 'attempts'])
+            return job
+
+
+def _claimed(job):
+    # The job as this claim left it; a worker reclaiming an expired lease bumps attempts
+    return FaqClassificationJob.objects.filter(
+        pk=job.pk, status=FaqClassificationJob.RUNNING, attempts=job.attempts
+    )
+
+
+def process_job(job):
+    """
+    Adds the job's message to the lesson's FAQs and deletes the job in the
+    same transaction. Returns True when done, False when it failed, or None
+    when the lease expired and another worker claimed the job meanwhile.
+    """
+    # Imported here, the controller module pulls in the whole view layer
+    from api.controllers.RelatedContentController import RelatedContentController
+
+    try:
+        with transaction.atomic():
+            # Holding the job row keeps a reclaiming worker off it until the FAQ is committed
+            if _claimed(job).select_for_update().values_list('pk', flat=True).first() is None:
+                return None
+            # One message per lesson at a time, so concurrent workers never split a group
+            Lesson.objects.select_for_update().filter(id=job.lesson_id).first()
+            RelatedContentController.process_message_and_add_to_faq(job.lesson_id, job.message)
+            _claimed(job).delete()
+    except Exception:
+        job.error = traceback.format_exc()
+        job.status = FaqClassificationJob.FAILED if job.attempts >= MAX_ATTEMPTS else FaqClassificationJob.PENDING
+        if not _claimed(job).update(error=job.error, status=job.status):
+            return None
+        return False
+
+    return True
+
+
+def queue_status():
+    counts = FaqClassificationJob.objects.aggregate(
+        pending=Count('id', filter=Q(status=FaqClassificationJob.PENDING)),
+        running=Count('id', filter=Q(status=FaqClassificationJob.RUNNING)),
+        failed=Count('id', filter=Q(status=FaqClassificationJob.FAILED)),
+        oldest_pending=Min('created_at', filter=Q(status=FaqClassificationJob.PENDING)),
+    )
+    oldest_pending = counts.pop('oldest_pending')
+    counts['lag_seconds'] = (timezone.now() - oldest_pending).total_seconds() if oldest_pending else 0.0
+    return counts
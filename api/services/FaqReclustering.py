@@ -0,0 +1,266 @@
+import math
+import time
+import traceback
+from collections import Counter, defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from api.model.Faq import Faq
+from api.model.FaqReclusterJob import FaqReclusterJob
+from api.model.GroupedQuestions import GroupedQuestions
+from api.model.Lesson import Lesson
+from api.model.RelatedContent import RelatedContent
+from api.services import FaqIndex, NearDuplicates, TeacherSettings
+from api.services.FaqMatrix import FaqMatrix
+
+# Rows of the FAQ x FAQ similarity product computed at once
+CHUNK_ROWS = 2000
+BATCH_SIZE = 1000
+
+
+def nearest_earlier(matrix):
+    """
+    For every FAQ row i, the earlier row j < i with the highest cosine
+    similarity (lowest j on ties) and that similarity, the same choice the
+    online matcher made when FAQ i arrived. Rows without any earlier FAQ
+    sharing a term get (0, 0.0); the first row gets (-1, -1).
+    """
+    size = len(matrix)
+    best_rows = np.zeros(size, dtype=np.int64)
+    best_sims = np.zeros(size, dtype=np.float64)
+    if size:
+        best_rows[0], best_sims[0] = -1, -1
+
+    transposed = matrix.matrix.T.tocsr()
+    for start in range(0, size, CHUNK_ROWS):
+        end = min(size, start + CHUNK_ROWS)
+        products = (matrix.matrix[start:end] @ transposed[:, :end]).tocoo()
+
+        rows = products.row + start
+        cols = products.col
+        earlier = cols < rows
+        rows, cols, dots = rows[earlier], cols[earlier], products.data[earlier]
+        if not len(rows):
+            continue
+
+        sims = dots / (matrix.norms[rows] * matrix.norms[cols])
+        order = np.lexsort((cols, -sims, rows))
+        rows, cols, sims = rows[order], cols[order], sims[order]
+        first = np.ones(len(rows), dtype=bool)
+        first[1:] = rows[1:] != rows[:-1]
+        best_rows[rows[first]] = cols[first]
+        best_sims[rows[first]] = sims[first]
+
+    return best_rows, best_sims
+
+
+def earlier_duplicates(signatures, threshold):
+    """
+    For every row, the earlier row NearDuplicates.find_duplicate returned
+    when the row's FAQ arrived: the highest estimated similarity among the
+    earlier rows sharing an LSH band, lowest row on ties, when it reaches
+    threshold; -1 otherwise. Rows with an empty signature have no duplicate.
+    """
+    duplicates = np.full(len(signatures), -1, dtype=np.int64)
+    values = np.array(
+        [signature or [0] * NearDuplicates.NUM_HASHES for signature in signatures], dtype=np.uint64
+    ).reshape(len(signatures), NearDuplicates.NUM_HASHES)
+    # Band rows stand in for the hashed bucket keys; both collide on exactly the same rows
+    bands = defaultdict(list)
+    first_rows = {}
+    for row, signature in enumerate(signatures):
+        if not signature:
+            continue
+
+        keys = [
+            (band, tuple(signature[band * NearDuplicates.ROWS_PER_BAND:(band + 1) * NearDuplicates.ROWS_PER_BAND]))
+            for band in range(NearDuplicates.NUM_BANDS)
+        ]
+        # An exact repeat is the best possible match, its first row wins the tie
+        best_row = first_rows.setdefault(tuple(signature), row)
+        if best_row == row:
+            best_row = -1
+            candidates = np.array(sorted({candidate for key in keys for candidate in bands[key]}), dtype=np.int64)
+            if len(candidates):
+                # Same estimate as NearDuplicates.estimated_similarity, argmax keeps the lowest row on ties
+                similarities = (values[candidates] == values[row]).sum(axis=1) / NearDuplicates.NUM_HASHES
+                best = int(similarities.argmax())
+                if similarities[best] >= threshold:
+                    best_row = int(candidates[best])
+
+        duplicates[row] = best_row
+        for key in keys:
+            bands[key].append(row)
+
+    return duplicates
+
+
+def cluster(matrix, threshold, duplicates=None):
+    """
+    Replays online FAQ grouping over the lesson's FAQs in id order: a FAQ
+    joins the group of its near-verbatim earlier duplicate (duplicates,
+    from earlier_duplicates) or else of its most similar earlier FAQ when
+    the similarity reaches threshold, otherwise it starts a new group.
+    Returns one group label per row.
+    """
+    best_rows, best_sims = nearest_earlier(matrix)
+    labels = np.empty(len(matrix), dtype=np.int64)
+    next_label = 0
+    for row in range(len(matrix)):
+        if duplicates is not None and duplicates[row] >= 0:
+            labels[row] = labels[duplicates[row]]
+        elif best_rows[row] >= 0 and best_sims[row] >= threshold:
+            labels[row] = labels[best_rows[row]]
+        else:
+            labels[row] = next_label
+            next_label += 1
+    return labels
+
+
+def recluster_lesson(lesson_id, threshold):
+    """
+    Regroups every FAQ of the lesson at threshold and writes the new
+    RelatedContent/GroupedQuestions rows. Groups that already sent a
+    notification are kept as history; their FAQs only move to the new
+    RelatedContent. Returns (faq_count, group_count).
+    """
+    rows = Faq.objects.filter(lesson_id=lesson_id).order_by('id').values_list(
+        'id', 'question', 'term_vector', 'vector_norm', 'minhash_signature', 'grouped_questions_id'
+    )
+    faq_ids, questions, term_vectors, norms, signatures, group_ids = zip(*rows) if rows else ((),) * 6
+    # Near-verbatim repeats first, as online matching does
+    duplicates = earlier_duplicates(signatures, settings.FAQ_DUPLICATE_THRESHOLD)
+    labels = cluster(FaqMatrix(faq_ids, list(term_vectors), norms), threshold, duplicates).tolist()
+
+    notified_groups = set(GroupedQuestions.objects.filter(lesson_id=lesson_id, notified=True).values_list(
+        'grouped_question_id', flat=True
+    ))
+
+    # The first FAQ of a group names it, as in process_message_and_add_to_faq
+    leaders = {}
+    centroids = {}
+    members = Counter()
+    for question, term_vector, label in zip(questions, term_vectors, labels):
+        leaders.setdefault(label, question)
+        centroid = centroids.setdefault(label, Counter())
+        for term_id, count in term_vector:
+            centroid[str(term_id)] += count
+        members[label] += 1
+
+    new_related_contents = RelatedContent.objects.bulk_create([
+        RelatedContent(
+            lesson_id=lesson_id,
+            general_context=leaders[label],
+            centroid_vector=dict(centroids[label]),
+            centroid_norm=math.sqrt(sum(total ** 2 for total in centroids[label].values())),
+            member_count=members[label],
+        )
+        for label in range(len(leaders))
+    ], batch_size=BATCH_SIZE)
+
+    pending_counts = Counter(
+        label for group_id, label in zip(group_ids, labels) if group_id not in notified_groups
+    )
+    pending_labels = sorted(pending_counts)
+    new_groups = dict(zip(pending_labels, GroupedQuestions.objects.bulk_create([
+        GroupedQuestions(
+            lesson_id=lesson_id, related_content=new_related_contents[label], faq_count=pending_counts[label]
+        )
+        for label in pending_labels
+    ], batch_size=BATCH_SIZE)))
+
+    # One UPDATE per new group; bulk_update's per-row CASE gets slow past a few thousand rows
+    moves = defaultdict(list)
+    for faq_id, group_id, label in zip(faq_ids, group_ids, labels):
+        moves[label, group_id in notified_groups].append(faq_id)
+    for (label, notified), moved_ids in moves.items():
+        fields = {'related_content': new_related_contents[label]}
+        if not notified:
+            fields['grouped_questions'] = new_groups[label]
+        for start in range(0, len(moved_ids), BATCH_SIZE):
+            Faq.objects.filter(id__in=moved_ids[start:start + BATCH_SIZE]).update(**fields)
+
+    # Drop the old pending groups, then the old RelatedContent no longer used by anything
+    new_group_ids = [group.grouped_question_id for group in new_groups.values()]
+    new_related_content_ids = [related_content.related_content_id for related_content in new_related_contents]
+    GroupedQuestions.objects.filter(lesson_id=lesson_id).filter(~Q(notified=True)).exclude(
+        grouped_question_id__in=new_group_ids
+    ).delete()
+    old_related_contents = RelatedContent.objects.filter(lesson_id=lesson_id).exclude(
+        related_content_id__in=new_related_content_ids
+    )
+    old_related_contents.filter(grouped_questions__isnull=True, faqs__isnull=True).delete()
+    # The rest only back notified groups; emptied so new messages never match them
+    old_related_contents.update(centroid_vector={}, centroid_norm=0.0, member_count=0)
+
+    # The FAQs moved without signals, every process reloads the lesson's index once this commits
+    FaqIndex.lesson_changed(lesson_id)
+
+    return len(faq_ids), len(new_related_contents)
+
+
+def recluster(lesson_id=None, threshold=None):
+    """
+    Re-clusters one lesson (or all of them) in a single transaction.
+    threshold defaults to the teacher's current similarity threshold.
+    Returns a list of (lesson_id, faq_count, group_count, seconds).
+    """
+    if threshold is None:
+        threshold = TeacherSettings.similarity_threshold()
+
+    lesson_ids = [lesson_id] if lesson_id is not None else list(Lesson.objects.values_list('id', flat=True))
+    report = []
+    with transaction.atomic():
+        for current_lesson_id in lesson_ids:
+            # Hold the lesson like the FAQ worker does, so no message is grouped mid-rebuild
+            Lesson.objects.select_for_update().filter(id=current_lesson_id).first()
+            start = time.perf_counter()
+            faq_count, group_count = recluster_lesson(current_lesson_id, threshold)
+            report.append((current_lesson_id, faq_count, group_count, time.perf_counter() - start))
+
+    return report
+
+
+def format_report(report):
+    lines = [
+        f"lesson {lesson_id}: {faq_count} FAQs -> {group_count} groups in {seconds:.2f}s"
+        for lesson_id, faq_count, group_count, seconds in report
+    ]
+    lines.append(f"total: {sum(row[1] for row in report)} FAQs in {sum(row[3] for row in report):.2f}s")
+    return "\n".join(lines)
+
+
+def enqueue(lesson_id=None, threshold=None):
+    return FaqReclusterJob.objects.create(lesson_id=lesson_id, threshold=threshold)
+
+
+def claim_next_job():
+    # Oldest pending job marked as running, or None; rows locked by another worker are skipped
+    with transaction.atomic():
+        job = FaqReclusterJob.objects.select_for_update(skip_locked=True).filter(
+            status=FaqReclusterJob.PENDING
+        ).order_by('id').first()
+
+        if job is None:
+            return None
+
+        job.status = FaqReclusterJob.RUNNING
+        job.started_at = timezone.now()
+        job.save(update_fields=['status', 'started_at'])
+        return job
+
+
+def process_job(job):
+    try:
+        job.result = format_report(recluster(job.lesson_id, job.threshold))
+        job.status = FaqReclusterJob.DONE
+    except Exception:
+        job.result = traceback.format_exc()
+        job.status = FaqReclusterJob.FAILED
+    job.finished_at = timezone.now()
+    job.save(update_fields=['result', 'status', 'finished_at'])
+    return job.status == FaqReclusterJob.DONE
@@ -0,0 +1,109 @@
+import math
+from collections import Counter, defaultdict
+
+from django.db import transaction
+
+from api.model.Faq import Faq
+from api.model.RelatedContent import RelatedContent
+from api.services import Vocabulary
+
+
+def best_group(message_vector, message_norm, groups):
+    """
+    message_vector maps term ids to counts; groups yields
+    (related_content_id, centroid_vector, centroid_norm) in id order.
+    Returns (related_content_id, similarity) of the closest centroid,
+    or (None, -1) when there are no groups.
+    """
+    max_sim_value, best_id = -1, None
+    for group_id, centroid, centroid_norm in groups:
+        if message_norm and centroid_norm:
+            dot_product = sum(weight * centroid.get(str(term_id), 0) for term_id, weight in message_vector.items())
+            cosine_sim = dot_product / (message_norm * centroid_norm)
+        else:
+            cosine_sim = 0.0
+
+        if cosine_sim > max_sim_value:
+            max_sim_value, best_id = cosine_sim, group_id
+
+    return best_id, max_sim_value
+
+
+def find_most_similar_group(lesson_id, message_vector):
+    """
+    Returns (related_content, similarity) for the RelatedContent whose
+    centroid is closest to message_vector (a word frequency Counter),
+    or (None, -1) when the lesson has no groups yet.
+    """
+    term_vector, message_norm = Vocabulary.vectorize(message_vector)
+    # Groups without members (e.g. kept only as notification history) have nothing to match
+    groups = RelatedContent.objects.filter(lesson_id=lesson_id, member_count__gt=0).order_by('related_content_id').values_list(
+        'related_content_id', 'centroid_vector', 'centroid_norm'
+    )
+
+    group_id, similarity = best_group(dict(term_vector), message_norm, groups.iterator())
+    if group_id is None:
+        return None, similarity
+
+    return RelatedContent.objects.filter(related_content_id=group_id).first(), similarity
+
+
+def faq_added(faq):
+    _move_member(None, None, faq.related_content_id, faq.term_vector)
+
+
+def faq_removed(faq):
+    _move_member(faq.related_content_id, faq.term_vector, None, None)
+
+
+def faq_changed(faq, old_related_content_id, old_term_vector):
+    # An edited question or a regrouped FAQ moves its contribution from the old centroid to the new one
+    if old_related_content_id == faq.related_content_id and old_term_vector == faq.term_vector:
+        return
+    _move_member(old_related_content_id, old_term_vector, faq.related_content_id, faq.term_vector)
+
+
+def _move_member(old_group_id, old_term_vector, new_group_id, new_term_vector):
+    group_ids = {group_id for group_id in (old_group_id, new_group_id) if group_id is not None}
+    with transaction.atomic():
+        # Locked in id order, so two moves between the same groups cannot deadlock
+        related_contents = {
+            related_content.related_content_id: related_content
+            for related_content in RelatedContent.objects.select_for_update().filter(
+                related_content_id__in=group_ids
+            ).order_by('related_content_id')
+        }
+        if old_group_id in related_contents:
+            related_contents[old_group_id].remove_member(old_term_vector)
+        if new_group_id in related_contents:
+            related_contents[new_group_id].add_member(new_term_vector)
+        for related_content in related_contents.values():
+            related_content.save(update_fields=['centroid_vector', 'centroid_norm', 'member_count'])
+
+
+def rebuild(lesson_id=None):
+    # Recompute every centroid from the stored FAQ term vectors
+    faqs = Faq.objects.all()
+    related_contents = RelatedContent.objects.all()
+    if lesson_id is not None:
+        faqs = faqs.filter(lesson_id=lesson_id)
+        related_contents = related_contents.filter(lesson_id=lesson_id)
+
+    centroids = defaultdict(Counter)
+    member_counts = Counter()
+    for related_content_id, term_vector in faqs.values_list('related_content_id', 'term_vector').iterator():
+        for term_id, count in term_vector:
+            centroids[related_content_id][str(term_id)] += count
+        member_counts[related_content_id] += 1
+
+    related_contents = list(related_contents)
+    for related_content in related_contents:
+        centroid = centroids[related_content.related_content_id]
+        related_content.centroid_vector = dict(centroid)
+        related_content.centroid_norm = math.sqrt(sum(total ** 2 for total in centroid.values()))
+        related_content.member_count = member_counts[related_content.related_content_id]
+
+    RelatedContent.objects.bulk_update(
+        related_contents, ['centroid_vector', 'centroid_norm', 'member_count'], batch_size=1000
+    )
+    return len(related_contents)
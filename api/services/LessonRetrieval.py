@@ -0,0 +1,168 @@
+import math
+import re
+import threading
+import time
+from collections import Counter, namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from api.model.LessonContent import LessonContent
+from api.services import TextVector, TokenCounter
+
+# BM25 parameters, the usual defaults
+K1 = 1.5
+B = 0.75
+
+# Sentence ends; plain text from adjacent HTML blocks can run together ("end.Next")
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+|(?<=[.!?])(?=[A-Z])')
+
+VERSION_KEY = 'lesson_retrieval_version:{}'
+
+Chunk = namedtuple('Chunk', ['page_id', 'position', 'text', 'terms', 'length', 'tokens'])
+
+
+def chunk_text(text, max_words=None):
+    """
+    Splits text into chunks of whole sentences of up to max_words words
+    (settings.CHATBOT_CHUNK_WORDS by default). A longer sentence is cut at
+    max_words.
+    """
+    max_words = max_words or settings.CHATBOT_CHUNK_WORDS
+    chunks = []
+    current = []
+    for sentence in _SENTENCE_END.split(text):
+        words = sentence.split()
+        while len(words) > max_words:
+            if current:
+                chunks.append(" ".join(current))
+                current = []
+            chunks.append(" ".join(words[:max_words]))
+            words = words[max_words:]
+        if current and len(current) + len(words) > max_words:
+            chunks.append(" ".join(current))
+            current = []
+        current.extend(words)
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+class LessonIndex:
+    """
+    BM25 index over the chunks of every page of one lesson. Pages keep
+    their id order, so neighbouring pages are the ones before and after.
+    """
+
+    def __init__(self, lesson_id, pages):
+        self.lesson_id = lesson_id
+        self.page_ids = [page_id for page_id, _ in pages]
+        self.chunks = []
+        for page_id, plain_text in pages:
+            for position, text in enumerate(chunk_text(plain_text)):
+                terms = TextVector.word_frequencies(TextVector.tokenize(text))
+                self.chunks.append(Chunk(
+                    page_id, position, text, terms, sum(terms.values()), TokenCounter.count_tokens(text)[0]
+                ))
+
+        document_frequencies = Counter(term for chunk in self.chunks for term in chunk.terms)
+        total = len(self.chunks)
+        self.idf = {
+            term: math.log(1 + (total - frequency + 0.5) / (frequency + 0.5))
+            for term, frequency in document_frequencies.items()
+        }
+        self.average_length = sum(chunk.length for chunk in self.chunks) / total if total else 0.0
+
+    @classmethod
+    def for_lesson(cls, lesson_id):
+        pages = LessonContent.objects.filter(lesson_id=lesson_id).order_by('id').values_list('id', 'plain_text')
+        return cls(lesson_id, list(pages))
+
+    def score(self, chunk, query_terms):
+        if not self.average_length:
+            return 0.0
+        normalizer = K1 * (1 - B + B * chunk.length / self.average_length)
+        total = 0.0
+        for term in query_terms:
+            frequency = chunk.terms.get(term)
+            if frequency:
+                total += self.idf[term] * frequency * (K1 + 1) / (frequency + normalizer)
+        return total
+
+    def neighbourhood(self, page_id, neighbours):
+        if page_id not in self.page_ids:
+            return {page_id}
+        position = self.page_ids.index(page_id)
+        return set(self.page_ids[max(0, position - neighbours):position + neighbours + 1])
+
+    def select(self, page_id, question, top_k=None, token_budget=None, neighbours=None):
+        """
+        The chunks most relevant to question from the page and its
+        neighbouring pages: at most top_k of them, within token_budget
+        tokens, in reading order. Without any matching term the opening
+        chunks of the page are used instead. The budget never exceeds the
+        size of the page itself, so a short page costs no more than before.
+        """
+        top_k = settings.CHATBOT_CONTEXT_CHUNKS if top_k is None else top_k
+        token_budget = settings.CHATBOT_CONTEXT_TOKENS if token_budget is None else token_budget
+        neighbours = settings.CHATBOT_CONTEXT_NEIGHBOURS if neighbours is None else neighbours
+        token_budget = min(token_budget, sum(chunk.tokens for chunk in self.chunks if chunk.page_id == page_id))
+
+        pages = self.neighbourhood(page_id, neighbours)
+        query_terms = set(TextVector.tokenize(question))
+        # Only chunks sharing a term with the question, best score first, ties to the asked page
+        ranked = []
+        for index, chunk in enumerate(self.chunks):
+            if chunk.page_id in pages:
+                score = self.score(chunk, query_terms)
+                if score > 0:
+                    ranked.append((-score, chunk.page_id != page_id, index))
+        ranked = [index for _, _, index in sorted(ranked)]
+        if not ranked:
+            ranked = [index for index, chunk in enumerate(self.chunks) if chunk.page_id == page_id]
+
+        selected = []
+        used_tokens = 0
+        for index in ranked:
+            if len(selected) >= top_k:
+                break
+            chunk = self.chunks[index]
+            if used_tokens + chunk.tokens > token_budget and selected:
+                continue
+            selected.append(index)
+            used_tokens += chunk.tokens
+
+        return [self.chunks[index] for index in sorted(selected)]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(lesson_id):
+    # Rebuilt when another worker saved a page of the lesson (shared cache version)
+    version = cache.get(VERSION_KEY.format(lesson_id))
+    with _indexes_lock:
+        cached = _indexes.get(lesson_id)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+    index = LessonIndex.for_lesson(lesson_id)
+    with _indexes_lock:
+        _indexes[lesson_id] = (version, index)
+    return index
+
+
+def invalidate(lesson_id):
+    cache.set(VERSION_KEY.format(lesson_id), time.time_ns(), timeout=None)
+    with _indexes_lock:
+        _indexes.pop(lesson_id, None)
+
+
+def select_context(lesson_content, question):
+    # The relevant part of the lesson as prompt text, chunks of other pages marked as such
+    chunks = get_index(lesson_content.lesson_id).select(lesson_content.id, question)
+    return "\n...\n".join(
+        chunk.text if chunk.page_id == lesson_content.id else f"(from another page) {chunk.text}"
+        for chunk in chunks
+    )
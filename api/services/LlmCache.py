@@ -0,0 +1,179 @@
+import hashlib
+import json
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from api.model.LlmCachedResponse import LlmCachedResponse
+
+HITS_KEY = 'llm_cache_hits'
+MISSES_KEY = 'llm_cache_misses'
+BYTES_KEY = 'llm_cache_bytes'
+
+# Eviction frees space down to this share of LLM_CACHE_MAX_BYTES, so it does not run on every store
+EVICT_TO = 0.9
+
+
+def enabled():
+    return settings.LLM_CACHE_ENABLED and settings.LLM_CACHE_MAX_BYTES > 0
+
+
+def cache_key(model, messages, **kwargs):
+    """
+    Hash of everything that decides the completion: the model, every
+    message (system prompt, lesson text, question) and the sampling
+    parameters such as temperature and max_tokens.
+    """
+    request = json.dumps(
+        {"model": model, "messages": messages, "parameters": kwargs},
+        sort_keys=True, ensure_ascii=False, separators=(',', ':'),
+    )
+    return hashlib.sha256(request.encode()).hexdigest()
+
+
+def _expires_before():
+    # Entries created before this are past LLM_CACHE_TTL
+    return timezone.now() - timedelta(seconds=settings.LLM_CACHE_TTL)
+
+
+def lookup(key):
+    # The stored response for key when younger than LLM_CACHE_TTL seconds, otherwise None
+    entry = LlmCachedResponse.objects.filter(key=key, created_at__gte=_expires_before()).values_list(
+        'id', 'response'
+    ).first()
+    if entry is None:
+        _record(MISSES_KEY)
+        return None
+
+    LlmCachedResponse.objects.filter(id=entry[0]).update(hits=F('hits') + 1, last_used_at=timezone.now())
+    _record(HITS_KEY)
+    return entry[1]
+
+
+async def alookup(key):
+    entry = await LlmCachedResponse.objects.filter(key=key, created_at__gte=_expires_before()).values_list(
+        'id', 'response'
+    ).afirst()
+    if entry is None:
+        await _arecord(MISSES_KEY)
+        return None
+
+    await LlmCachedResponse.objects.filter(id=entry[0]).aupdate(hits=F('hits') + 1, last_used_at=timezone.now())
+    await _arecord(HITS_KEY)
+    return entry[1]
+
+
+def store(key, model, response):
+    # Replaces an expired entry with the same key; a response larger than the whole cache is not kept
+    response = json.loads(json.dumps(response))
+    size = len(json.dumps(response, ensure_ascii=False).encode())
+    if size > settings.LLM_CACHE_MAX_BYTES:
+        return
+
+    now = timezone.now()
+    previous = LlmCachedResponse.objects.filter(key=key).values_list('size', flat=True).first() or 0
+    try:
+        # Its own savepoint, so a lost race does not break a transaction the caller has open
+        with transaction.atomic():
+            LlmCachedResponse.objects.update_or_create(
+                key=key,
+                defaults={'model': model, 'response': response, 'size': size, 'hits': 0,
+                          'created_at': now, 'last_used_at': now},
+            )
+    except IntegrityError:
+        # Another worker stored the same response first
+        return
+
+    try:
+        total = cache.incr(BYTES_KEY, size - previous)
+    except ValueError:
+        # No counter yet (first store, cache restart, purge): the table already has this entry
+        total = _count_bytes()
+    if total > settings.LLM_CACHE_MAX_BYTES:
+        evict()
+
+
+astore = sync_to_async(store)
+
+
+def _count_bytes():
+    # Bytes stored, summed from the table; stores keep the shared counter up to date from there
+    total = LlmCachedResponse.objects.aggregate(total=Sum('size'))['total'] or 0
+    cache.set(BYTES_KEY, total, timeout=None)
+    return total
+
+
+def evict():
+    """
+    Removes expired entries, then the least recently used ones while the
+    cache holds more than LLM_CACHE_MAX_BYTES. Returns the number removed.
+    Stores only call it once the tracked size passes LLM_CACHE_MAX_BYTES,
+    instead of summing the table every time.
+    """
+    removed, _ = LlmCachedResponse.objects.filter(created_at__lt=_expires_before()).delete()
+
+    total = LlmCachedResponse.objects.aggregate(total=Sum('size'))['total'] or 0
+    if total > settings.LLM_CACHE_MAX_BYTES:
+        excess = total - settings.LLM_CACHE_MAX_BYTES * EVICT_TO
+        evicted = []
+        entries = LlmCachedResponse.objects.order_by('last_used_at', 'id').values_list('id', 'size')
+        for entry_id, size in entries.iterator():
+            if excess <= 0:
+                break
+            evicted.append(entry_id)
+            excess -= size
+            total -= size
+        deleted, _ = LlmCachedResponse.objects.filter(id__in=evicted).delete()
+        removed += deleted
+
+    # Resynced with the table, which also corrects any drift from concurrent stores
+    cache.set(BYTES_KEY, total, timeout=None)
+    return removed
+
+
+def purge(model=None, expired_only=False):
+    entries = LlmCachedResponse.objects.all()
+    if model:
+        entries = entries.filter(model=model)
+    if expired_only:
+        entries = entries.filter(created_at__lt=_expires_before())
+    deleted, _ = entries.delete()
+    # Summed again on the next store
+    cache.delete(BYTES_KEY)
+    return deleted
+
+
+def _record(key):
+    # Hit/miss counters live in the shared cache so the stats cover every worker
+    cache.add(key, 0, timeout=None)
+    cache.incr(key)
+
+
+async def _arecord(key):
+    await cache.aadd(key, 0, timeout=None)
+    await cache.aincr(key)
+
+
+def stats():
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    totals = LlmCachedResponse.objects.aggregate(total=Sum('size'), stored_hits=Sum('hits'))
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+        'entries': LlmCachedResponse.objects.count(),
+        'bytes': totals['total'] or 0,
+        'max_bytes': settings.LLM_CACHE_MAX_BYTES,
+        # Hits of the entries still stored, counters of evicted entries are gone
+        'entry_hits': totals['stored_hits'] or 0,
+    }
+
+
+def reset_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
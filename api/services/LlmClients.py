@@ -0,0 +1,271 @@
+import asyncio
+import contextvars
+import json
+import os
+import threading
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+
+import httpx
+import openai
+import requests
+from django.conf import settings
+from langchain_community.chat_models import ChatOpenAI
+from requests.adapters import HTTPAdapter
+
+from api.services import LlmCache, PromptBudget, RateLimiter
+
+_lock = threading.Lock()
+_session = None
+_chat_models = {}
+_limits = {}
+# Async clients and limits belong to the event loop they were created on
+_async_clients = weakref.WeakKeyDictionary()
+_async_limits = weakref.WeakKeyDictionary()
+_call_counter = contextvars.ContextVar('llm_call_counter', default=None)
+
+
+class CallCounter:
+    def __init__(self):
+        self.count = 0
+
+
+class _PooledSession(requests.Session):
+    """
+    The requests session of every openai call in the process, installed as
+    openai.requestssession. openai 0.28 keeps one session per thread and
+    every MAX_SESSION_LIFETIME_SECS (180s) closes it and asks
+    requestssession for a new one, which is this same session again. A
+    real close there would drop the pooled connections of every thread, so
+    close() does nothing; close_session() closes the pooled connections.
+    """
+
+    def request(self, *args, **kwargs):
+        # Every HTTP round trip to the LLM API, whichever client made it
+        _count_call()
+        return super().request(*args, **kwargs)
+
+    def close(self):
+        pass
+
+
+def _count_call(*args):
+    counter = _call_counter.get()
+    if counter is not None:
+        counter.count += 1
+
+
+@contextmanager
+def count_calls():
+    # Counts the LLM API calls made inside the block (by this thread or task)
+    counter = CallCounter()
+    token = _call_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _call_counter.reset(token)
+
+
+def api_key():
+    return settings.OPENAI_API_KEY or os.environ.get("OPENAI_API_KEY")
+
+
+def session():
+    """
+    Process-wide requests session with a keep-alive connection pool, used by
+    every openai call (ChatCompletion and the langchain ChatOpenAI models).
+    """
+    global _session
+    with _lock:
+        if _session is None:
+            pooled = _PooledSession()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=settings.LLM_POOL_MAXSIZE)
+            pooled.mount('https://', adapter)
+            pooled.mount('http://', adapter)
+            _session = pooled
+            openai.requestssession = pooled
+    return _session
+
+
+def close_session():
+    # Closes the pooled connections, e.g. when a worker stops. The session stays installed, since
+    # openai's per-thread references keep pointing at it, and reconnects if it is used again
+    with _lock:
+        pooled = _session
+    if pooled is not None:
+        requests.Session.close(pooled)
+
+
+def concurrency_limit(model_name):
+    # LLM_CONCURRENCY for model_name, else LLM_DEFAULT_CONCURRENCY
+    for entry in settings.LLM_CONCURRENCY:
+        name, _, limit = entry.partition('=')
+        if name.strip() == model_name:
+            return int(limit)
+    return settings.LLM_DEFAULT_CONCURRENCY
+
+
+@contextmanager
+def limit(model_name):
+    # Blocks while LLM_CONCURRENCY requests to this model are already in flight in this process
+    with _lock:
+        semaphore = _limits.get(model_name)
+        if semaphore is None:
+            semaphore = _limits[model_name] = threading.BoundedSemaphore(max(1, concurrency_limit(model_name)))
+    with semaphore:
+        yield
+
+
+def chat_model(model_name, temperature=0):
+    """
+    Shared langchain ChatOpenAI for model_name/temperature. The model holds no
+    conversation state, callers keep their own memory and chains.
+    """
+    session()
+    key = (model_name, temperature)
+    with _lock:
+        llm = _chat_models.get(key)
+        if llm is None:
+            llm = _chat_models[key] = ChatOpenAI(
+                openai_api_key=api_key(),
+                openai_api_base=settings.LLM_API_BASE,
+                model_name=model_name,
+                temperature=temperature,
+                request_timeout=settings.LLM_REQUEST_TIMEOUT,
+            )
+    return llm
+
+
+def _checked(model, messages, kwargs):
+    # Logs the prompt size and keeps max_tokens within the context window, before any request is sent
+    max_tokens = PromptBudget.check_call(model, messages, kwargs.get('max_tokens'))
+    if max_tokens is not None:
+        kwargs['max_tokens'] = max_tokens
+    return kwargs
+
+
+def chat_completion(model, messages, cache=True, rate_limit=False, **kwargs):
+    """
+    openai.ChatCompletion.create over the shared pool, within the model's
+    concurrency limit. The same request made before is answered from the
+    LLM response cache unless cache=False. With rate_limit, background
+    callers wait for a token of the model's RATE_LIMIT_MODELS bucket; only
+    a request that is actually sent takes one.
+    """
+    session()
+    kwargs = _checked(model, messages, kwargs)
+    key = LlmCache.cache_key(model, messages, **kwargs) if cache and LlmCache.enabled() else None
+    if key is not None:
+        cached = LlmCache.lookup(key)
+        if cached is not None:
+            return cached
+
+    if rate_limit:
+        RateLimiter.wait(model=model)
+    with limit(model):
+        response = openai.ChatCompletion.create(
+            model=model,
+            messages=messages,
+            api_key=api_key(),
+            api_base=settings.LLM_API_BASE,
+            request_timeout=settings.LLM_REQUEST_TIMEOUT,
+            **kwargs
+        )
+    if key is not None:
+        LlmCache.store(key, model, response)
+    return response
+
+
+async def _count_async_call(request):
+    _count_call()
+
+
+def async_client():
+    """
+    httpx.AsyncClient with a keep-alive pool for the running event loop,
+    used by the async views and the streaming chatbot.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = httpx.AsyncClient(
+            base_url=settings.LLM_API_BASE.rstrip('/') + '/',
+            headers={"Authorization": f"Bearer {api_key()}"},
+            timeout=settings.LLM_REQUEST_TIMEOUT,
+            limits=httpx.Limits(max_connections=settings.LLM_POOL_MAXSIZE,
+                                max_keepalive_connections=settings.LLM_POOL_MAXSIZE),
+            event_hooks={'request': [_count_async_call]},
+        )
+    return client
+
+
+@asynccontextmanager
+async def alimit(model_name):
+    # Async counterpart of limit(), per event loop
+    limits = _async_limits.setdefault(asyncio.get_running_loop(), {})
+    semaphore = limits.get(model_name)
+    if semaphore is None:
+        semaphore = limits[model_name] = asyncio.Semaphore(max(1, concurrency_limit(model_name)))
+    async with semaphore:
+        yield
+
+
+async def achat_completion(model, messages, cache=True, **kwargs):
+    # Same response shape as chat_completion, without holding a thread while waiting
+    kwargs = _checked(model, messages, kwargs)
+    key = LlmCache.cache_key(model, messages, **kwargs) if cache and LlmCache.enabled() else None
+    if key is not None:
+        cached = await LlmCache.alookup(key)
+        if cached is not None:
+            return cached
+
+    async with alimit(model):
+        response = await async_client().post(
+            'chat/completions', json={"model": model, "messages": messages, **kwargs}
+        )
+        response.raise_for_status()
+        result = response.json()
+    if key is not None:
+        await LlmCache.astore(key, model, result)
+    return result
+
+
+async def astream_chat(model, messages, cache=True, **kwargs):
+    """
+    Yields the answer's text as the model generates it. Leaving the loop
+    early (e.g. the client disconnected) closes the upstream request.
+    A cached answer (shared with chat_completion) comes as a single piece;
+    only a finished stream is stored.
+    """
+    kwargs = _checked(model, messages, kwargs)
+    key = LlmCache.cache_key(model, messages, **kwargs) if cache and LlmCache.enabled() else None
+    if key is not None:
+        cached = await LlmCache.alookup(key)
+        if cached is not None:
+            yield cached['choices'][0]['message']['content']
+            return
+
+    parts = []
+    finished = False
+    async with alimit(model):
+        async with async_client().stream(
+            'POST', 'chat/completions', json={"model": model, "messages": messages, "stream": True, **kwargs}
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith('data:'):
+                    continue
+                data = line[len('data:'):].strip()
+                if data == '[DONE]':
+                    finished = True
+                    break
+                delta = json.loads(data)['choices'][0].get('delta', {}).get('content')
+                if delta:
+                    parts.append(delta)
+                    yield delta
+
+    if key is not None and finished:
+        await LlmCache.astore(key, model, {
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(parts)}}],
+        })
@@ -0,0 +1,122 @@
+import hashlib
+import re
+import unicodedata
+import zlib
+from collections import Counter
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Q
+
+from api.model.Faq import Faq
+from api.model.FaqLshBucket import FaqLshBucket
+
+# 64 hash functions split into 16 bands of 4 rows: pairs with a Jaccard
+# similarity around 0.5 and above collide in at least one band
+NUM_HASHES = 64
+ROWS_PER_BAND = 4
+NUM_BANDS = NUM_HASHES // ROWS_PER_BAND
+SHINGLE_SIZE = 3
+
+# Fixed seeds so every process derives the same signatures
+_SEEDS = np.random.RandomState(20241205).randint(0, np.iinfo(np.int64).max, size=NUM_HASHES, dtype=np.int64).astype(np.uint64)
+
+# Letters and digits of any script are kept, so non-Latin questions get shingles too
+_NON_ALPHANUMERIC = re.compile(r'[\W_]+')
+
+
+def normalize(text):
+    # NFKC folds full-width and compatibility forms; ASCII text normalizes as it always did
+    return _NON_ALPHANUMERIC.sub(' ', unicodedata.normalize('NFKC', text).casefold()).strip()
+
+
+def shingles(text):
+    # Character shingles of the case-folded text with punctuation removed
+    normalized = normalize(text)
+    if len(normalized) <= SHINGLE_SIZE:
+        return {normalized} if normalized else set()
+    return {normalized[i:i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1)}
+
+
+def signature(text):
+    """
+    MinHash signature (list of NUM_HASHES ints) of the text, or [] when
+    there is nothing to hash. An empty signature never matches anything.
+    """
+    shingle_set = shingles(text)
+    if not shingle_set:
+        return []
+
+    hashes = np.fromiter((zlib.crc32(s.encode()) for s in shingle_set), dtype=np.uint64, count=len(shingle_set))
+    return _mix(hashes[None, :] ^ _SEEDS[:, None]).min(axis=1).tolist()
+
+
+def _mix(values):
+    # splitmix64 finalizer, one independent hash function per seed (wraps modulo 2**64)
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+    return values ^ (values >> np.uint64(31))
+
+
+def band_buckets(minhash_signature):
+    # One signed 64-bit bucket key per band
+    buckets = []
+    for band in range(NUM_BANDS):
+        rows = minhash_signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(repr(rows).encode(), digest_size=8).digest()
+        buckets.append(int.from_bytes(digest, 'big', signed=True))
+    return buckets
+
+
+def estimated_similarity(signature1, signature2):
+    # Fraction of equal MinHash values estimates the Jaccard similarity
+    if not signature1 or not signature2:
+        return 0.0
+    return sum(1 for a, b in zip(signature1, signature2) if a == b) / NUM_HASHES
+
+
+def find_duplicate(lesson_id, message, threshold=None):
+    """
+    Returns (faq, estimated_similarity) for the closest near-verbatim repeat
+    of message among the lesson's FAQs, or (None, 0.0) when no FAQ sharing an
+    LSH bucket reaches threshold (settings.FAQ_DUPLICATE_THRESHOLD by default).
+    """
+    threshold = settings.FAQ_DUPLICATE_THRESHOLD if threshold is None else threshold
+    message_signature = signature(message)
+    if not message_signature:
+        return None, 0.0
+
+    bucket_filter = Q()
+    for band, bucket in enumerate(band_buckets(message_signature)):
+        bucket_filter |= Q(band=band, bucket=bucket)
+
+    collisions = Counter(
+        FaqLshBucket.objects.filter(bucket_filter, lesson_id=lesson_id).values_list('faq_id', flat=True)
+    )
+    if not collisions:
+        return None, 0.0
+
+    best_faq, best_similarity = None, 0.0
+    candidates = Faq.objects.select_related('related_content').filter(id__in=collisions.keys()).order_by('id')
+    for faq in candidates:
+        similarity = estimated_similarity(message_signature, faq.minhash_signature)
+        if similarity > best_similarity:
+            best_faq, best_similarity = faq, similarity
+
+    if best_similarity < threshold:
+        return None, 0.0
+
+    return best_faq, best_similarity
+
+
+def build_buckets(faq):
+    return [
+        FaqLshBucket(lesson_id=faq.lesson_id, faq_id=faq.id, band=band, bucket=bucket)
+        for band, bucket in enumerate(band_buckets(faq.minhash_signature))
+    ] if faq.minhash_signature else []
+
+
+def index_faq(faq, created):
+    if not created:
+        FaqLshBucket.objects.filter(faq_id=faq.id).delete()
+    FaqLshBucket.objects.bulk_create(build_buckets(faq))
@@ -0,0 +1,155 @@
+import logging
+from collections import Counter, namedtuple
+
+from django.conf import settings
+
+from api.services import TextVector, TokenCounter
+
+logger = logging.getLogger(__name__)
+
+# Prompt plus completion tokens each model accepts
+CONTEXT_WINDOWS = {
+    'gpt-3.5-turbo': 16385,
+    'gpt-4o': 128000,
+    'gpt-4o-mini': 128000,
+}
+DEFAULT_CONTEXT_WINDOW = 16385
+# Tokens the chat format adds around every message, and once to prime the reply
+MESSAGE_OVERHEAD = 4
+REPLY_OVERHEAD = 3
+# Share of a prompt's budget the FAQ questions may take, the rest goes to the lesson
+QUESTION_SHARE = 0.25
+
+Prompt = namedtuple('Prompt', ['text', 'tokens', 'questions_used', 'questions_total', 'pages_used', 'pages_total'])
+
+
+class PromptTooLarge(ValueError):
+    pass
+
+
+def context_window(model):
+    return CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW)
+
+
+def prompt_budget(model):
+    # LLM_PROMPT_BUDGET ("model=tokens") or LLM_DEFAULT_PROMPT_BUDGET, never past the context window
+    budget = settings.LLM_DEFAULT_PROMPT_BUDGET
+    for entry in settings.LLM_PROMPT_BUDGET:
+        name, _, tokens = entry.partition('=')
+        if name.strip() == model:
+            budget = int(tokens)
+    return min(budget, context_window(model))
+
+
+def count_tokens(text, model=None):
+    # Tokens of text in the model's encoding (gpt-3.5-turbo's when no model is given)
+    return TokenCounter.count_tokens(text, TokenCounter.model_encoding(model))[0]
+
+
+def count_message_tokens(messages, model=None):
+    return REPLY_OVERHEAD + sum(
+        MESSAGE_OVERHEAD + count_tokens(message.get('content') or '', model) for message in messages
+    )
+
+
+def check_call(model, messages, max_tokens=None):
+    """
+    Counts the prompt tokens of a chat call and logs them. Returns
+    max_tokens lowered to what is left of the model's context window;
+    raises PromptTooLarge when the prompt alone does not fit.
+    """
+    prompt_tokens = count_message_tokens(messages, model)
+    available = context_window(model) - prompt_tokens
+    if available <= 0:
+        raise PromptTooLarge(
+            f"{model} prompt of {prompt_tokens} tokens exceeds the {context_window(model)} token context window"
+        )
+
+    if max_tokens is not None and max_tokens > available:
+        logger.warning("%s: max_tokens lowered from %d to %d to fit the context window", model, max_tokens, available)
+        max_tokens = available
+
+    logger.info("LLM call model=%s prompt_tokens=%d max_tokens=%s", model, prompt_tokens, max_tokens)
+    return max_tokens
+
+
+def dedupe_questions(questions):
+    """
+    FAQ questions with repeats folded together, most asked first (then
+    first asked). Questions count as repeats when they normalize to the
+    same terms; repeated ones are marked with how often they were asked.
+    """
+    counts = Counter()
+    firsts = {}
+    for question in questions:
+        key = tuple(sorted(TextVector.tokenize(question))) or question.strip().lower()
+        counts[key] += 1
+        firsts.setdefault(key, question.strip())
+
+    ordered = sorted(firsts, key=lambda key: -counts[key])
+    return [
+        firsts[key] if counts[key] == 1 else f"{firsts[key]} (asked {counts[key]} times)"
+        for key in ordered
+    ]
+
+
+def fit_pages(pages, budget, separator="\n", truncate=True, model=None):
+    """
+    The leading pages that fit in budget tokens of the model's encoding.
+    Later pages are left out whole; a first page that is too large on its
+    own is cut, or with truncate=False (the reply replaces the pages it was
+    given) raises PromptTooLarge.
+    """
+    kept = []
+    used = 0
+    separator_tokens = count_tokens(separator, model)
+    for page in pages:
+        tokens = count_tokens(page, model) + (separator_tokens if kept else 0)
+        if used + tokens > budget:
+            if not kept:
+                if not truncate:
+                    raise PromptTooLarge(
+                        f"the first page has {tokens} tokens and only {max(0, budget)} fit the prompt; "
+                        f"it cannot be cut because the reply replaces the whole page"
+                    )
+                kept.append(TokenCounter.truncate(page, max(0, budget), TokenCounter.model_encoding(model)))
+            break
+        kept.append(page)
+        used += tokens
+    return kept
+
+
+def build_prompt(model, template, questions, pages, max_tokens=0, system_prompt="", separator="\n", truncate=True):
+    """
+    template(questions, content) filled with as much as fits the model's
+    prompt budget (and its context window with max_tokens left for the
+    reply): deduplicated questions up to QUESTION_SHARE of the budget,
+    then whole lesson pages in order (see fit_pages for truncate).
+    """
+    budget = min(prompt_budget(model), context_window(model) - (max_tokens or 0))
+
+    unique_questions = dedupe_questions(questions)
+    kept_questions = []
+    question_tokens = 0
+    for question in unique_questions:
+        question_tokens += count_tokens(repr(question), model) + 1
+        if question_tokens > budget * QUESTION_SHARE and kept_questions:
+            break
+        kept_questions.append(question)
+
+    # Whatever the template and questions leave (a template may repeat the questions)
+    page_budget = budget - count_message_tokens(
+        [{'content': system_prompt}, {'content': template(kept_questions, "")}], model
+    )
+    kept_pages = fit_pages(pages, page_budget, separator, truncate, model)
+    text = template(kept_questions, separator.join(kept_pages))
+    prompt = Prompt(
+        text, count_tokens(text, model), len(kept_questions), len(questions), len(kept_pages), len(pages)
+    )
+
+    logger.info(
+        "%s prompt: %d tokens (budget %d), %d of %d questions (%d unique), %d of %d pages",
+        model, prompt.tokens, prompt_budget(model), prompt.questions_used, prompt.questions_total,
+        len(unique_questions), prompt.pages_used, prompt.pages_total,
+    )
+    return prompt
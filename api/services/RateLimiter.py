@@ -0,0 +1,152 @@
+import math
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+Rate = namedtuple('Rate', ['count', 'seconds'])
+Decision = namedtuple('Decision', ['allowed', 'retry_after', 'scope'])
+
+PERIODS = {'s': 1, 'sec': 1, 'second': 1, 'm': 60, 'min': 60, 'minute': 60,
+           'h': 3600, 'hour': 3600, 'd': 86400, 'day': 86400}
+SCOPES = ('user', 'lesson', 'model')
+
+ALLOWED_KEY = 'ratelimit_stats:allowed'
+LIMITED_KEY = 'ratelimit_stats:limited:{}'
+
+# The cache has no compare-and-set; this only makes the read-update atomic within one process
+_lock = threading.Lock()
+
+
+def parse_rate(rate):
+    # "20/min" -> Rate(20, 60); empty or "0/..." means no limit
+    if not rate:
+        return None
+    count, _, period = rate.partition('/')
+    if int(count) <= 0:
+        return None
+    return Rate(int(count), PERIODS[period.strip().lower()])
+
+
+def model_rate(model):
+    for entry in settings.RATE_LIMIT_MODELS:
+        name, _, rate = entry.partition('=')
+        if name.strip() == model:
+            return parse_rate(rate.strip())
+    return parse_rate(settings.RATE_LIMIT_MODEL_DEFAULT)
+
+
+def buckets(user_id, lesson_id, model):
+    # (scope, cache key, rate) of every bucket a request draws from
+    candidates = [
+        ('user', user_id, parse_rate(settings.RATE_LIMIT_USER)),
+        ('lesson', lesson_id, parse_rate(settings.RATE_LIMIT_LESSON)),
+        ('model', model, model_rate(model) if model else None),
+    ]
+    return [
+        (scope, f'ratelimit:{scope}:{subject}', rate)
+        for scope, subject, rate in candidates if subject is not None and rate is not None
+    ]
+
+
+def _decide(bucket_list, arrivals, now):
+    """
+    Token buckets kept as one "theoretical arrival time" per key (GCRA):
+    a bucket of count tokens refills one token every seconds / count.
+    Returns (decision, new arrival times to store when allowed).
+    """
+    updates = {}
+    retry_after, denied_scope = 0.0, None
+    for scope, key, rate in bucket_list:
+        interval = rate.seconds / rate.count
+        arrival = max(arrivals.get(key) or now, now) + interval
+        wait = arrival - rate.seconds - now
+        if wait > 0:
+            if wait > retry_after:
+                retry_after, denied_scope = wait, scope
+        else:
+            updates[key] = (arrival, rate.seconds)
+
+    if denied_scope is not None:
+        return Decision(False, retry_after, denied_scope), {}
+    return Decision(True, 0.0, None), updates
+
+
+def acquire(user_id, lesson_id=None, model=None):
+    """
+    Takes one token from the user's, the lesson's and the model's bucket,
+    or none when any of them is empty. Returns Decision(allowed,
+    retry_after seconds, scope of the bucket that refused).
+    """
+    if not settings.RATE_LIMIT_ENABLED:
+        return Decision(True, 0.0, None)
+
+    bucket_list = buckets(user_id, lesson_id, model)
+    with _lock:
+        now = time.time()
+        decision, updates = _decide(bucket_list, cache.get_many([key for _, key, _ in bucket_list]), now)
+        for key, (arrival, seconds) in updates.items():
+            cache.set(key, arrival, timeout=math.ceil(arrival - now) + seconds)
+
+    _record(decision)
+    return decision
+
+
+async def aacquire(user_id, lesson_id=None, model=None):
+    # acquire() for async views; no process lock, so concurrent tasks may overshoot by a request or two
+    if not settings.RATE_LIMIT_ENABLED:
+        return Decision(True, 0.0, None)
+
+    bucket_list = buckets(user_id, lesson_id, model)
+    now = time.time()
+    decision, updates = _decide(bucket_list, await cache.aget_many([key for _, key, _ in bucket_list]), now)
+    for key, (arrival, seconds) in updates.items():
+        await cache.aset(key, arrival, timeout=math.ceil(arrival - now) + seconds)
+
+    await _arecord(decision)
+    return decision
+
+
+def wait(user_id=None, lesson_id=None, model=None):
+    # acquire() for background jobs: sleeps until every bucket has a token instead of refusing
+    while True:
+        decision = acquire(user_id, lesson_id, model)
+        if decision.allowed:
+            return decision
+        time.sleep(decision.retry_after)
+
+
+def _counter_key(decision):
+    return ALLOWED_KEY if decision.allowed else LIMITED_KEY.format(decision.scope)
+
+
+def _record(decision):
+    key = _counter_key(decision)
+    cache.add(key, 0, timeout=None)
+    cache.incr(key)
+
+
+async def _arecord(decision):
+    key = _counter_key(decision)
+    await cache.aadd(key, 0, timeout=None)
+    await cache.aincr(key)
+
+
+def retry_after_header(decision):
+    # Whole seconds, at least 1
+    return str(max(1, math.ceil(decision.retry_after)))
+
+
+def stats():
+    keys = [ALLOWED_KEY] + [LIMITED_KEY.format(scope) for scope in SCOPES]
+    values = cache.get_many(keys)
+    return {
+        'allowed': values.get(ALLOWED_KEY, 0),
+        'limited': {scope: values.get(LIMITED_KEY.format(scope), 0) for scope in SCOPES},
+    }
+
+
+def reset_stats():
+    cache.delete_many([ALLOWED_KEY] + [LIMITED_KEY.format(scope) for scope in SCOPES])
@@ -0,0 +1,99 @@
+from api.controllers.static.prompts import SUGGESTION_SYSTEM_CONTENT_INSIGHTS, prompt_create_insights_abs
+from api.model.Faq import Faq
+from api.model.Lesson import Lesson
+from api.model.LessonContent import LessonContent
+from api.model.Notification import Notification
+from api.model.Suggestion import Suggestion
+from api.serializer.SuggestionSerializer import SuggestionSerializer
+from api.services import PromptBudget
+
+MODEL = "gpt-4o-mini"
+MAX_TOKENS = 4000
+TEMPERATURE = 0.7
+
+
+class InsightError(Exception):
+    pass
+
+
+class InsightRequest:
+    """
+    The suggestion of a lesson notification and what its insights are
+    written from, shared by SuggestionController.createInsight and the
+    async SuggestionInsightController.
+    """
+
+    def __init__(self, suggestion, created, lesson_contents, faq_questions):
+        self.suggestion = suggestion
+        self.created = created
+        self.lesson_contents = lesson_contents
+        self.faq_questions = faq_questions
+
+    @property
+    def needs_insights(self):
+        return self.suggestion.insights is None
+
+    def messages(self):
+        # Insights only need the lesson text, not its markup
+        prompt = PromptBudget.build_prompt(
+            MODEL, prompt_create_insights_abs, self.faq_questions,
+            [lesson_content.get_plain_text() for lesson_content in self.lesson_contents],
+            max_tokens=MAX_TOKENS, system_prompt=SUGGESTION_SYSTEM_CONTENT_INSIGHTS,
+        )
+        return [
+            {"role": "system", "content": SUGGESTION_SYSTEM_CONTENT_INSIGHTS},
+            {"role": "user", "content": prompt.text}
+        ]
+
+
+def load(lesson_id, notification_id):
+    """
+    InsightRequest for the lesson and notification, creating their
+    suggestion when there is none yet. Raises InsightError when either id
+    is missing or unknown.
+    """
+    if not lesson_id or not notification_id:
+        raise InsightError("lesson_id or notification_id is required")
+
+    # guard lesson and notification check if exists
+    if not Lesson.objects.filter(id=lesson_id).exists() or not Notification.objects.filter(notif_id=notification_id).exists():
+        raise InsightError("Lesson or Notification does not exist.")
+
+    suggestion = Suggestion.objects.filter(lesson_id=lesson_id, notification_id=notification_id).first()
+    created = suggestion is None
+    if created:
+        suggestion = Suggestion.objects.create(lesson_id=lesson_id, notification_id=notification_id)
+
+    # Questions of the FAQs grouped under this notification
+    faq_questions = list(Faq.objects.filter(
+        grouped_questions__notification_id=notification_id,
+        grouped_questions__lesson_id=lesson_id,
+    ).values_list('question', flat=True))
+
+    return InsightRequest(suggestion, created, list(LessonContent.objects.filter(lesson_id=lesson_id)), faq_questions)
+
+
+def save(insight_request, response=None):
+    """
+    Stores the insights from the LLM response (when one was needed) and
+    the lesson content they were written for, and returns the response
+    data of the insight endpoints.
+    """
+    suggestion = insight_request.suggestion
+    if response is not None:
+        suggestion.insights = response['choices'][0]['message']['content'].strip()
+
+    if not suggestion.old_content:
+        suggestion.old_content = "\n".join(lesson_content.contents for lesson_content in insight_request.lesson_contents)
+
+    suggestion.save()
+
+    # Reformat faq_questions into bullet points
+    formatted_faq_questions = '<p><i>'.join(
+        [f"&#8226; {question}" for question in insight_request.faq_questions]
+    ) + '</i></p>'
+
+    return {
+        "suggestion": SuggestionSerializer(suggestion).data,
+        "faq_questions": formatted_faq_questions
+    }
@@ -0,0 +1,351 @@
+import logging
+import select
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from api.model.Notification import Notification
+from api.model.SuggestionJob import SuggestionJob
+from api.model.WorkerHeartbeat import WorkerHeartbeat
+from api.services import LlmClients, PromptBudget, WorkerHeartbeats
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 3
+
+# PostgreSQL channel enqueue() notifies and idle workers listen on
+CHANNEL = 'suggestion_jobs'
+# Seconds a listening worker waits before checking the queue anyway, in case it missed a notification
+LISTEN_TIMEOUT = 60.0
+# Seconds between checks of the stop event while waiting
+_STOP_CHECK = 0.5
+# Tries at storing the outcome of a job
+RECORD_TRIES = 3
+
+
+def enqueue(notification_id):
+    """
+    Queues suggestion generation for a notification; a notification has at
+    most one suggestion job. A failed job is queued again with fresh attempts.
+    """
+    job, created = SuggestionJob.objects.get_or_create(notification_id=notification_id, kind=SuggestionJob.SUGGESTION)
+    if not created and job.status == SuggestionJob.FAILED:
+        requeue(job)
+    notify()
+    return job
+
+
+def enqueue_delimiters(notification_id, lesson_id, alignment):
+    """
+    Queues the LLM placement of the ambiguous delimiters of an aligned
+    suggestion (a DelimiterAlignment.Alignment). Only the spans around them
+    are sent, each with the original text on either side. A newer alignment
+    replaces the job of an older one that has not run yet.
+    """
+    job, _ = SuggestionJob.objects.update_or_create(
+        notification_id=notification_id, kind=SuggestionJob.DELIMITERS,
+        defaults={
+            'status': SuggestionJob.PENDING, 'attempts': 0, 'error': '', 'claimed_by': '',
+            'payload': {
+                'lesson_id': lesson_id,
+                'content': alignment.content,
+                'spans': [span._asdict() for span in alignment.spans],
+            },
+        },
+    )
+    notify()
+    return job
+
+
+def requeue(job):
+    job.status = SuggestionJob.PENDING
+    job.attempts = 0
+    job.save(update_fields=['status', 'attempts'])
+
+
+def enqueue_missing():
+    # Jobs for notifications that have no suggestion content and no suggestion job yet
+    notification_ids = Notification.objects.filter(
+        Q(notification__isnull=True) | Q(notification__content__isnull=True),
+    ).exclude(
+        suggestion_jobs__kind=SuggestionJob.SUGGESTION,
+    ).values_list('notif_id', flat=True).distinct()
+    jobs = SuggestionJob.objects.bulk_create(
+        [SuggestionJob(notification_id=notification_id) for notification_id in notification_ids],
+        ignore_conflicts=True,
+    )
+    if jobs:
+        notify()
+    return len(jobs)
+
+
+def notify():
+    # Wakes the idle workers; PostgreSQL delivers it once the transaction commits
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(f"NOTIFY {CHANNEL}")
+
+
+def claim_next_job(worker_name=''):
+    """
+    Marks the oldest pending job (or a running one whose lease was not
+    renewed for SUGGESTION_QUEUE_LEASE_SECONDS) as running for worker_name
+    and returns it, or None when the queue is empty. Rows locked by another
+    worker are skipped. Every claim counts as an attempt, so a job whose
+    workers keep dying fails after MAX_ATTEMPTS.
+    """
+    stale_before = timezone.now() - timedelta(seconds=settings.SUGGESTION_QUEUE_LEASE_SECONDS)
+    with transaction.atomic():
+        jobs = SuggestionJob.objects.select_for_update(skip_locked=True).filter(
+            Q(status=SuggestionJob.PENDING) |
+            Q(status=SuggestionJob.RUNNING, lease_renewed_at__lt=stale_before)
+        ).order_by('id')
+
+        while True:
+            job = jobs.first()
+            if job is None:
+                return None
+
+            if job.attempts >= MAX_ATTEMPTS:
+                job.status = SuggestionJob.FAILED
+                job.error = job.error or f"Lease expired on attempt {job.attempts}"
+                job.save(update_fields=['status', 'error'])
+                continue
+
+            now = timezone.now()
+            job.status = SuggestionJob.RUNNING
+            job.started_at = now
+            job.lease_renewed_at = now
+            job.claimed_by = worker_name
+            job.attempts += 1
+            job.save(update_fields=['status', 'started_at', 'lease_renewed_at', 'claimed_by', 'attempts'])
+            return job
+
+
+def renew_leases(worker_name):
+    # Called on every heartbeat, so a long LLM call never loses its job to another worker
+    return SuggestionJob.objects.filter(status=SuggestionJob.RUNNING, claimed_by=worker_name).update(
+        lease_renewed_at=timezone.now()
+    )
+
+
+def _claimed(job):
+    # The job as this claim left it; a worker reclaiming an expired lease takes it over and bumps attempts
+    return SuggestionJob.objects.filter(
+        pk=job.pk, status=SuggestionJob.RUNNING, claimed_by=job.claimed_by, attempts=job.attempts
+    )
+
+
+def _record(write):
+    """
+    Runs write, which stores a job's outcome, with up to RECORD_TRIES tries
+    on new connections. The outcome follows a long LLM call; losing it to a
+    dropped connection would generate the suggestion again once the lease
+    expires.
+    """
+    for attempt in range(1, RECORD_TRIES + 1):
+        try:
+            return write()
+        except DatabaseError as e:
+            if attempt == RECORD_TRIES:
+                raise
+            logger.warning("Could not record a suggestion job, trying again: %s", e)
+            connection.close()
+            time.sleep(0.1 * attempt)
+
+
+def process_job(job):
+    """
+    Generates the suggestion of the job's notification, or places the
+    delimiters of a delimiters job, and deletes the job. Returns True when done, False when it failed, or None when the lease
+    expired and another worker claimed the job meanwhile; the job is then
+    left to that worker.
+    """
+    # Imported here, the controller module pulls in the whole view layer
+    from api.controllers.SuggestionController import SuggestionController
+
+    try:
+        # The LLM call runs outside any transaction; the lease keeps other workers off the job
+        if job.kind == SuggestionJob.DELIMITERS:
+            SuggestionController().insert_ambiguous_delimiters(job.notification_id, job.payload)
+        else:
+            SuggestionController().createOrUpdateSuggestion(job.notification)
+    except Exception as e:
+        job.error = traceback.format_exc()
+        # A lesson too large for the prompt fails the same way on every attempt
+        retry = job.attempts < MAX_ATTEMPTS and not isinstance(e, PromptBudget.PromptTooLarge)
+        job.status = SuggestionJob.PENDING if retry else SuggestionJob.FAILED
+        if not _record(lambda: _claimed(job).update(error=job.error, status=job.status)):
+            return None
+        return False
+
+    deleted, _ = _record(lambda: _claimed(job).delete())
+    return True if deleted else None
+
+
+def concurrency_cap():
+    # More threads than LLM_CONCURRENCY allows for the suggestion model would only wait on its semaphore
+    from api.controllers.SuggestionController import SuggestionController
+
+    return LlmClients.concurrency_limit(SuggestionController.suggestion_model)
+
+
+class Wakeup:
+    """
+    What run_jobs waits on while the queue is empty. set() wakes it from
+    this process, e.g. when a failed job is pending again. On PostgreSQL a
+    thread LISTENs for notify() from any process, and the queue is checked
+    without a notification only every LISTEN_TIMEOUT seconds; other
+    databases are polled. Waiting also ends when stop is set.
+    """
+
+    def __init__(self, stop):
+        self.stop = stop
+        self.event = threading.Event()
+        self.closed = threading.Event()
+        self.listening = False
+        self.thread = None
+
+    def start(self):
+        if connection.vendor != 'postgresql':
+            return
+        try:
+            with connection.wrap_database_errors:
+                listener = connection.get_new_connection(connection.get_connection_params())
+                listener.autocommit = True
+                with listener.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CHANNEL}")
+        except DatabaseError as e:
+            logger.warning("Could not listen for suggestion jobs, polling instead: %s", e)
+            return
+        self.listening = True
+        self.thread = threading.Thread(target=self.listen, args=(listener,), name="suggestion-listen", daemon=True)
+        self.thread.start()
+
+    def listen(self, listener):
+        try:
+            while not self.closed.is_set():
+                if select.select([listener], [], [], _STOP_CHECK)[0]:
+                    listener.poll()
+                    if listener.notifies:
+                        listener.notifies.clear()
+                        self.event.set()
+        except Exception as e:
+            logger.warning("Stopped listening for suggestion jobs, polling instead: %s", e)
+            self.listening = False
+            self.event.set()
+        finally:
+            listener.close()
+
+    def set(self):
+        self.event.set()
+
+    def idle_timeout(self, poll_interval):
+        return LISTEN_TIMEOUT if self.listening else poll_interval
+
+    def wait(self, timeout):
+        # Until woken, stopped, or timeout seconds have passed
+        deadline = time.monotonic() + timeout
+        while not self.stop.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self.event.wait(min(remaining, _STOP_CHECK)):
+                break
+        self.event.clear()
+
+    def close(self):
+        self.closed.set()
+        if self.thread is not None:
+            self.thread.join()
+
+
+def run_jobs(worker_name, concurrency, stop, poll_interval=2.0, burst=False, on_finished=None):
+    """
+    Claims jobs for worker_name while fewer than concurrency are in
+    progress and runs them on a thread pool of that size, until stop (a
+    threading.Event) is set, or with burst until the queue is empty. Only
+    this thread claims, so no job is leased while it waits for a pool
+    thread. An empty queue is waited on with a Wakeup. on_finished(job,
+    succeeded) is called from the pool thread. Returns once the jobs in
+    progress have finished.
+    """
+    slots = threading.BoundedSemaphore(concurrency)
+    in_progress = [0]
+    in_progress_lock = threading.Lock()
+    wakeup = Wakeup(stop)
+
+    def run(job):
+        try:
+            try:
+                succeeded = process_job(job)
+            except DatabaseError:
+                # The job stays leased to this worker and is claimed again once the lease expires
+                logger.exception("Could not record suggestion job %s", job.id)
+                succeeded = None
+            if succeeded is False:
+                # The job may be pending again
+                wakeup.set()
+            if on_finished is not None:
+                on_finished(job, succeeded)
+        finally:
+            # Pool threads outlive the job, do not keep a connection idle between jobs
+            connection.close()
+            with in_progress_lock:
+                in_progress[0] -= 1
+            slots.release()
+
+    wakeup.start()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='suggestion-job') as executor:
+            while not stop.is_set():
+                if not slots.acquire(timeout=_STOP_CHECK):
+                    continue
+
+                try:
+                    job = claim_next_job(worker_name)
+                except DatabaseError as e:
+                    # A dropped connection or a lock timeout, try again with a new connection
+                    logger.warning("Could not claim a suggestion job: %s", e)
+                    slots.release()
+                    connection.close()
+                    stop.wait(poll_interval)
+                    continue
+
+                if job is None:
+                    slots.release()
+                    with in_progress_lock:
+                        idle = in_progress[0] == 0
+                    # A failed job in progress may come back as pending, burst mode waits for it
+                    if burst and idle:
+                        break
+                    wakeup.wait(0.1 if burst else wakeup.idle_timeout(poll_interval))
+                    continue
+
+                with in_progress_lock:
+                    in_progress[0] += 1
+                executor.submit(run, job)
+    finally:
+        wakeup.close()
+        connection.close()
+
+
+def queue_status():
+    counts = SuggestionJob.objects.aggregate(
+        pending=Count('id', filter=Q(status=SuggestionJob.PENDING)),
+        running=Count('id', filter=Q(status=SuggestionJob.RUNNING)),
+        failed=Count('id', filter=Q(status=SuggestionJob.FAILED)),
+        oldest_pending=Min('created_at', filter=Q(status=SuggestionJob.PENDING)),
+    )
+    oldest_pending = counts.pop('oldest_pending')
+    counts['lag_seconds'] = (timezone.now() - oldest_pending).total_seconds() if oldest_pending else 0.0
+    # Jobs only move while at least one `run_suggestion_worker` is alive
+    counts['workers'] = WorkerHeartbeats.alive(
+        WorkerHeartbeat.SUGGESTION, settings.SUGGESTION_QUEUE_LEASE_SECONDS
+    ).count()
+    return counts
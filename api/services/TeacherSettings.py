@@ -0,0 +1,63 @@
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from api.model.Teacher import Teacher
+
+# Every setting lookup in the app targets the single teacher profile
+TEACHER_ID = 1
+VERSION_KEY = 'teacher_settings_version'
+
+TeacherSettingsSnapshot = namedtuple('TeacherSettingsSnapshot', ['threshold', 'notification_threshold', 'suggestion'])
+
+_local = {'version': None, 'checked_at': 0.0, 'snapshot': None}
+_lock = threading.Lock()
+
+
+def get():
+    """
+    Returns the teacher's threshold, notification_threshold and suggestion
+    flag, or None when there is no teacher profile. Values are kept in
+    process memory; the shared cache version is re-checked at most every
+    TEACHER_SETTINGS_CHECK_SECONDS to pick up saves from other workers.
+    """
+    now = time.monotonic()
+    with _lock:
+        if _local['version'] is not None and now - _local['checked_at'] < settings.TEACHER_SETTINGS_CHECK_SECONDS:
+            return _local['snapshot']
+
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = time.time_ns()
+        cache.add(VERSION_KEY, version, timeout=None)
+        version = cache.get(VERSION_KEY, version)
+
+    with _lock:
+        if version == _local['version']:
+            _local['checked_at'] = now
+            return _local['snapshot']
+
+    teacher = Teacher.objects.filter(id=TEACHER_ID).values_list(
+        'threshold', 'notification_threshold', 'suggestion'
+    ).first()
+    snapshot = TeacherSettingsSnapshot(*teacher) if teacher else None
+
+    with _lock:
+        _local.update(version=version, checked_at=now, snapshot=snapshot)
+    return snapshot
+
+
+def invalidate():
+    # New version for every worker, and drop this process's copy right away
+    cache.set(VERSION_KEY, time.time_ns(), timeout=None)
+    with _lock:
+        _local.update(version=None, checked_at=0.0, snapshot=None)
+
+
+def similarity_threshold():
+    # FAQ grouping caps the teacher's threshold: anything above 0.4 is treated as 0.3
+    threshold = get().threshold
+    return 0.3 if threshold > 0.4 else threshold
@@ -0,0 +1,107 @@
+import math
+import re
+import sys
+from collections import Counter
+
+from django.conf import settings
+
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below between
+both but by can could did do does doing down during each few for from further had has have having he her
+here hers herself him himself his how i if in into is it its itself just me more most my myself no nor not
+now of off on once only or other our ours ourselves out over own same she should so some such than that
+the their theirs them themselves then there these they this those through to too under until up very was
+we were what when where which while who whom why will with would you your yours yourself yourselves
+""".split())
+
+# Longest suffix first; a suffix is only removed when at least 3 characters remain
+_SUFFIXES = (
+    ('ational', 'ate'), ('ization', 'ize'), ('fulness', 'ful'), ('iveness', 'ive'),
+    ('ations', 'ate'), ('ation', 'ate'), ('ments', ''), ('ment', ''), ('ingly', ''),
+    ('edly', ''), ('sses', 'ss'), ('ies', 'y'), ('ing', ''), ('ers', ''), ('er', ''),
+    ('ed', ''), ('ly', ''), ('ss', 'ss'), ('s', ''),
+)
+_MIN_STEM_LENGTH = 3
+_PUNCTUATION = re.compile(r"[^\w\s]+")
+
+
+class Pipeline:
+    """
+    Precompiled text normalization shared by the online FAQ matcher and the
+    offline rebuilds. steps is any of 'lowercase', 'punctuation',
+    'stopwords' and 'stem', always applied in that order.
+    """
+
+    def __init__(self, steps):
+        self.steps = frozenset(steps)
+        self.lowercase = 'lowercase' in self.steps
+        self.punctuation = 'punctuation' in self.steps
+        self.stopwords = STOPWORDS if 'stopwords' in self.steps else frozenset()
+        self.stem = 'stem' in self.steps
+        self._stems = {}
+
+    def tokenize(self, text):
+        if self.lowercase:
+            text = text.lower()
+        if self.punctuation:
+            text = _PUNCTUATION.sub(' ', text)
+
+        tokens = []
+        for word in text.split():
+            if word in self.stopwords:
+                continue
+            tokens.append(self.stem_word(word) if self.stem else sys.intern(word))
+        return tokens
+
+    def stem_word(self, word):
+        stem = self._stems.get(word)
+        if stem is None:
+            stem = word
+            for suffix, replacement in _SUFFIXES:
+                if word.endswith(suffix) and len(word) - len(suffix) + len(replacement) >= _MIN_STEM_LENGTH:
+                    stem = word[:-len(suffix)] + replacement
+                    break
+            # Interned so every vector and posting list shares one string per term
+            stem = sys.intern(stem)
+            self._stems[word] = stem
+        return stem
+
+
+_pipeline = None
+
+
+def get_pipeline():
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = Pipeline(settings.FAQ_TOKENIZER_STEPS)
+    return _pipeline
+
+
+def tokenize(text):
+    # Normalize the text into terms with the configured pipeline
+    return get_pipeline().tokenize(text)
+
+
+def word_frequencies(words):
+    # Count the frequency of each word
+    return Counter(words)
+
+
+def vector_norm(vector):
+    # Magnitude (L2 norm) of a bag-of-words vector
+    return math.sqrt(sum(val ** 2 for val in vector.values()))
+
+
+def cosine_similarity(vec1, vec2):
+    # Compute the dot product
+    dot_product = sum(vec1[word] * vec2.get(word, 0) for word in vec1)
+
+    # Compute the magnitude of each vector
+    magnitude_vec1 = vector_norm(vec1)
+    magnitude_vec2 = vector_norm(vec2)
+
+    if not magnitude_vec1 or not magnitude_vec2:
+        return 0.0
+
+    # Compute cosine similarity
+    return dot_product / (magnitude_vec1 * magnitude_vec2)
@@ -0,0 +1,62 @@
+import logging
+import threading
+
+import tiktoken
+from tiktoken.model import encoding_name_for_model
+
+logger = logging.getLogger(__name__)
+
+# Encoding of gpt-3.5-turbo, the chatbot model, and of models tiktoken does not know
+ENCODING = 'cl100k_base'
+# Recorded instead of an encoding name when the count is only estimated
+ESTIMATE = 'estimate'
+
+_lock = threading.Lock()
+_encodings = {}
+
+
+def get_encoding(name=ENCODING):
+    """
+    The tiktoken encoding, or None when it cannot be loaded (tiktoken
+    downloads it on first use); the failure is remembered per process.
+    """
+    with _lock:
+        if name not in _encodings:
+            try:
+                _encodings[name] = tiktoken.get_encoding(name)
+            except Exception:
+                logger.warning("Could not load the %s tiktoken encoding, estimating token counts", name, exc_info=True)
+                _encodings[name] = None
+        return _encodings[name]
+
+
+def model_encoding(model=None):
+    # The encoding name tiktoken.encoding_for_model would load (o200k_base for gpt-4o), else ENCODING
+    if not model:
+        return ENCODING
+    try:
+        return encoding_name_for_model(model)
+    except KeyError:
+        return ENCODING
+
+
+def estimate_tokens(text):
+    # About four characters per token for English text
+    return (len(text) + 3) // 4
+
+
+def count_tokens(text, name=ENCODING):
+    # Returns (token_count, encoding used or ESTIMATE)
+    encoding = get_encoding(name)
+    if encoding is None:
+        return estimate_tokens(text), ESTIMATE
+    return len(encoding.encode(text, disallowed_special=())), name
+
+
+def truncate(text, max_tokens, name=ENCODING):
+    # The longest prefix of text within max_tokens tokens
+    encoding = get_encoding(name)
+    if encoding is None:
+        return text[:max(0, max_tokens) * 4]
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max(0, max_tokens)])
@@ -0,0 +1,53 @@
+import threading
+
+from django.db import transaction
+
+from api.model.Term import Term
+from api.services import TextVector
+
+# Term ids never change once assigned, so they can be cached for the life of the process
+_term_ids = {}
+_term_ids_lock = threading.Lock()
+
+
+def term_ids(terms, create=False):
+    """
+    Returns {term: id} for the given terms. Unknown terms are inserted when
+    create is True, otherwise they are left out of the result.
+    """
+    terms = set(terms)
+    with _term_ids_lock:
+        found = {term: _term_ids[term] for term in terms if term in _term_ids}
+
+    missing = terms - found.keys()
+    if not missing:
+        return found
+
+    if create:
+        Term.objects.bulk_create([Term(text=term) for term in missing], ignore_conflicts=True)
+
+    loaded = dict(Term.objects.filter(text__in=missing).values_list('text', 'id'))
+    # Ids inserted by a transaction that rolls back would point at missing or reused rows
+    transaction.on_commit(lambda: _remember(loaded))
+
+    found.update(loaded)
+    return found
+
+
+def _remember(ids):
+    with _term_ids_lock:
+        _term_ids.update(ids)
+
+
+def vectorize(word_counts, create=False):
+    """
+    Converts a word frequency Counter into ([[term_id, count], ...], norm).
+    The norm always covers every word, including ones missing from the vocabulary.
+    """
+    ids = term_ids(word_counts.keys(), create=create)
+    term_vector = sorted([ids[term], count] for term, count in word_counts.items() if term in ids)
+    return term_vector, TextVector.vector_norm(word_counts)
+
+
+def vectorize_text(text, create=False):
+    return vectorize(TextVector.word_frequencies(TextVector.tokenize(text)), create=create)
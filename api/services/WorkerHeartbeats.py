@@ -0,0 +1,61 @@
+import os
+import socket
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from api.model.WorkerHeartbeat import WorkerHeartbeat
+
+# Rows of workers gone this long are removed when a new worker of the kind starts
+PRUNE_AFTER = timedelta(days=1)
+
+# Cache backends private to one process, the workers would not see the web's versions and buckets
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def shared_cache():
+    return settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHES
+
+
+def register(kind, concurrency):
+    hostname = socket.gethostname()
+    name = f"{hostname}:{os.getpid()}"
+    now = timezone.now()
+    WorkerHeartbeat.objects.filter(kind=kind, last_heartbeat__lt=now - PRUNE_AFTER).delete()
+    worker, _ = WorkerHeartbeat.objects.update_or_create(
+        name=name,
+        defaults={
+            'kind': kind, 'hostname': hostname, 'pid': os.getpid(), 'concurrency': concurrency,
+            'started_at': now, 'last_heartbeat': now, 'stopped_at': None,
+            'jobs_succeeded': 0, 'jobs_failed': 0,
+        },
+    )
+    return worker
+
+
+def beat(worker, succeeded=0, failed=0):
+    # Adds the jobs finished since the last beat to the worker's totals
+    WorkerHeartbeat.objects.filter(id=worker.id).update(
+        last_heartbeat=timezone.now(),
+        jobs_succeeded=F('jobs_succeeded') + succeeded,
+        jobs_failed=F('jobs_failed') + failed,
+    )
+
+
+def stop(worker, succeeded=0, failed=0):
+    beat(worker, succeeded, failed)
+    WorkerHeartbeat.objects.filter(id=worker.id).update(stopped_at=timezone.now())
+
+
+def alive(kind, within_seconds):
+    # Workers that have not stopped and beat within the last within_seconds seconds
+    return WorkerHeartbeat.objects.filter(
+        kind=kind,
+        stopped_at__isnull=True,
+        last_heartbeat__gte=timezone.now() - timedelta(seconds=within_seconds),
+    )
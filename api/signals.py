@@ -0,0 +1,78 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.db.models import F
+from django.dispatch import receiver
+
+from api.model.Faq import Faq
+from api.model.GroupedQuestions import GroupedQuestions
+from api.model.LessonContent import LessonContent
+from api.model.Notification import Notification
+from api.model.Teacher import Teacher
+from api.services import (
+    AnswerCache, FaqIndex, GroupCentroids, LessonRetrieval, NearDuplicates, SuggestionQueue, TeacherSettings,
+    Vocabulary,
+)
+
+
+# Faq fields whose change moves the FAQ's contribution to the group centroids
+CENTROID_FIELDS = {'question', 'related_content', 'related_content_id', 'term_vector'}
+
+
+# Store the question's term vector and MinHash signature with the row so
+# matching never re-tokenizes it
+@receiver(pre_save, sender=Faq)
+def faq_pre_save(sender, instance, update_fields=None, **kwargs):
+    # The group and vector the saved row contributes to its centroid, moved on update in faq_post_save
+    if not instance._state.adding and (update_fields is None or CENTROID_FIELDS & set(update_fields)):
+        instance._centroid_before = Faq.objects.filter(pk=instance.pk).values_list(
+            'related_content_id', 'term_vector'
+        ).first()
+    if update_fields is None or 'question' in update_fields:
+        instance.term_vector, instance.vector_norm = Vocabulary.vectorize_text(instance.question, create=True)
+        instance.minhash_signature = NearDuplicates.signature(instance.question)
+
+
+# Keep the in-process FAQ indexes and the group centroids in step with the Faq table
+@receiver(post_save, sender=Faq)
+def faq_post_save(sender, instance, created=False, update_fields=None, **kwargs):
+    FaqIndex.faq_saved(instance)
+    if created:
+        GroupCentroids.faq_added(instance)
+    elif getattr(instance, '_centroid_before', None) is not None:
+        GroupCentroids.faq_changed(instance, *instance._centroid_before)
+        instance._centroid_before = None
+    if created or update_fields is None or 'question' in update_fields:
+        NearDuplicates.index_faq(instance, created)
+
+
+@receiver(post_delete, sender=Faq)
+def faq_post_delete(sender, instance, **kwargs):
+    FaqIndex.faq_deleted(instance)
+    GroupCentroids.faq_removed(instance)
+    if instance.grouped_questions_id is not None:
+        GroupedQuestions.objects.filter(pk=instance.grouped_questions_id).update(faq_count=F('faq_count') - 1)
+
+
+# Teacher settings are cached per process, tell every worker to reload them once the
+# change is visible: a reload before the commit would keep the old values under the new version
+@receiver(post_save, sender=Teacher)
+@receiver(post_delete, sender=Teacher)
+def teacher_changed(sender, instance, **kwargs):
+    transaction.on_commit(TeacherSettings.invalidate)
+
+
+# Cached chatbot answers and the lesson's chunk index are stale once a page change commits;
+# a rebuild before that would index the old text under the new version
+@receiver(post_save, sender=LessonContent)
+@receiver(post_delete, sender=LessonContent)
+def lesson_content_changed(sender, instance, **kwargs):
+    lesson_id = instance.lesson_id
+    transaction.on_commit(lambda: AnswerCache.invalidate(lesson_id))
+    transaction.on_commit(lambda: LessonRetrieval.invalidate(lesson_id))
+
+
+# Every new notification gets its suggestion generated by the queue, in the same transaction as the notification
+@receiver(post_save, sender=Notification)
+def notification_post_save(sender, instance, created=False, **kwargs):
+    if created:
+        SuggestionQueue.enqueue(instance.notif_id)
@@ -1,3 +1,1408 @@
-from django.test import TestCase
+import asyncio
+import importlib
+import io
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import suppress
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import openai
+import requests
+from asgiref.sync import async_to_sync
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.controllers.AnswerCacheController import AnswerCacheController
+from api.controllers.ChatBotAsyncController import ChatBotAsyncController
+from api.controllers.ChatBotController import ChatBotController
+from api.controllers.ChatBotStreamController import ChatBotStreamController, sse
+from api.controllers.FaqClassificationJobController import FaqClassificationJobController
+from api.controllers.LlmCacheController import LlmCacheController
+from api.controllers.RateLimitController import RateLimitController
+from api.controllers.RelatedContentController import RelatedContentController
+from api.controllers.SuggestionController import SuggestionController
+from api.controllers.SuggestionInsightController import SuggestionInsightController
+from api.controllers.SuggestionJobController import SuggestionJobController
+from api.model.Faq import Faq
+from api.model.FaqClassificationJob import FaqClassificationJob
+from api.model.FaqLshBucket import FaqLshBucket
+from api.model.GroupedQuestions import GroupedQuestions
+from api.model.Lesson import Lesson
+from api.model.LessonContent import LessonContent
+from api.model.LlmCachedResponse import LlmCachedResponse
+from api.model.Notification import Notification
+from api.model.Query import Query
+from api.model.RelatedContent import RelatedContent
+from api.model.SubQuery import SubQuery
+from api.model.Suggestion import Suggestion
+from api.model.SuggestionJob import SuggestionJob
+from api.model.Teacher import Teacher
+from api.model.WorkerHeartbeat import WorkerHeartbeat
+from api.models import CustomUser
+from api.serializer.QuerySerializer import QuerySerializer
+from api.services import (
+    AnswerCache, DelimiterAlignment, FaqIndex, FaqMatrix, FaqQueue, FaqReclustering, LlmCache, LlmClients,
+    NearDuplicates, PromptBudget, SuggestionQueue, TeacherSettings, TextVector, TokenCounter, Vocabulary,
+    WorkerHeartbeats,
+)
+
+
+def create_lesson(questions=()):
+    lesson = Lesson.objects.create(lessonNumber=1, title="Polynomials", subtitle="Basics")
+    related_content = RelatedContent.objects.create(lesson=lesson, general_context="polynomials")
+    for question in questions:
+        Faq.objects.create(lesson=lesson, related_content=related_content, question=question)
+    return lesson, related_content
+
+
+class FaqIndexTests(TestCase):
+    def setUp(self):
+        # Every test rolls back, so nothing cached per process may outlive it
+        cache.clear()
+        FaqIndex._indexes.clear()
+        Vocabulary._term_ids.clear()
+
+    def test_picks_up_faqs_committed_by_another_process(self):
+        lesson, related_content = create_lesson(["what is a polynomial"])
+        FaqIndex.get_index(lesson.id)
+
+        # Another worker commits a FAQ with a lower id than one already indexed, then bumps the version
+        other = Faq(
+            id=Faq.objects.get().id - 1, lesson=lesson, related_content=related_content,
+            question="how do roots of a cubic work",
+        )
+        other.term_vector, other.vector_norm = Vocabulary.vectorize_text(other.question, create=True)
+        Faq.objects.bulk_create([other])
+        cache.add(FaqIndex.LESSON_VERSION_KEY.format(lesson.id), 0)
+        cache.incr(FaqIndex.LESSON_VERSION_KEY.format(lesson.id))
+
+        faq, similarity = FaqIndex.find_most_similar_faq(
+            lesson.id, TextVector.word_frequencies(TextVector.tokenize("roots of a cubic"))
+        )
+        self.assertEqual(faq.question, other.question)
+        self.assertGreater(similarity, 0.5)
+
+    def test_own_changes_keep_the_index_current(self):
+        lesson, related_content = create_lesson(["what is a polynomial"])
+        index = FaqIndex.get_index(lesson.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            faq = Faq.objects.create(lesson=lesson, related_content=related_content, question="what is a root")
+
+        self.assertIn(faq.id, index.norms)
+        # Only the shared version is read, the FAQs are not loaded again
+        with CaptureQueriesContext(connection) as queries:
+            index.sync()
+        self.assertFalse([query for query in queries if 'api_faq' in query['sql']])
+
+    def test_common_terms_stop_early_and_match_like_the_full_scan(self):
+        faqs = dict(enumerate([
+            "polynomial degree", "polynomial degree degree", "polynomial", "root factor",
+            "polynomial root factor theorem", "degree degree degree", "polynomial polynomial degree root", "degree root",
+        ], start=1))
+        term_ids = {}
+
+        def vectorize(text):
+            counts = TextVector.word_frequencies(TextVector.tokenize(text))
+            term_vector = sorted((term_ids.setdefault(term, len(term_ids) + 1), count) for term, count in counts.items())
+            return term_vector, counts
+
+        def add(faq_id, question):
+            faqs[faq_id] = question
+            term_vector, counts = vectorize(question)
+            index.add(faq_id, term_vector, TextVector.vector_norm(counts))
+
+        def assert_matches_full_scan(message):
+            term_vector, counts = vectorize(message)
+            best_id, best_sim = None, -1
+            for faq_id, question in faqs.items():
+                similarity = TextVector.cosine_similarity(counts, vectorize(question)[1])
+                if similarity > best_sim:
+                    best_id, best_sim = faq_id, similarity
+            with self.subTest(message=message, faqs=len(faqs)):
+                matched_id, matched_sim = index.best_match(dict(term_vector), TextVector.vector_norm(counts))
+                self.assertEqual(matched_id, best_id)
+                self.assertAlmostEqual(matched_sim, best_sim)
+
+        index = FaqIndex.LessonFaqIndex(lesson_id=None)
+        for faq_id, question in list(faqs.items()):
+            add(faq_id, question)
+
+        # Every term counts as common, so its impacts are built and then kept current by add() and remove()
+        messages = ["polynomial degree", "degree", "polynomial", "root factor", "degree degree polynomial"]
+        with mock.patch.object(FaqIndex, 'COMMON_TERM_POSTINGS', 0):
+            for message in messages:
+                assert_matches_full_scan(message)
+
+            index.remove(2)
+            del faqs[2]
+            add(9, "degree polynomial degree")
+            for message in messages:
+                assert_matches_full_scan(message)
+
+
+class FaqMatrixTests(TestCase):
+    QUESTIONS = [
+        "what is a polynomial",
+        "what is the degree of a polynomial",
+        "how do I find the roots of a polynomial",
+        "what is a root",
+        "how do I factor a quadratic",
+        "why does the leading coefficient matter",
+        "what is the degree of a constant",
+    ]
+    MESSAGES = [
+        "what is a polynomial",
+        "degree of polynomial",
+        "how to find roots",
+        "factoring quadratics",
+        "leading coefficient",
+        "what is photosynthesis",
+        "",
+        "root root root of a polynomial polynomial",
+    ]
+
+    def setUp(self):
+        Vocabulary._term_ids.clear()
+
+    @staticmethod
+    def brute_force(lesson_id, message):
+        # The pure-Python scan process_message_and_add_to_faq used before the index
+        message_vector = TextVector.word_frequencies(TextVector.tokenize(message))
+        max_sim_value, best_id = -1, None
+        for faq in Faq.objects.filter(lesson_id=lesson_id).order_by('id'):
+            faq_vector = TextVector.word_frequencies(TextVector.tokenize(faq.question))
+            cosine_sim = TextVector.cosine_similarity(message_vector, faq_vector)
+            if cosine_sim > max_sim_value:
+                max_sim_value, best_id = cosine_sim, faq.id
+        return best_id, max_sim_value
+
+    def test_matches_the_brute_force_scorer(self):
+        lesson, _ = create_lesson(self.QUESTIONS)
+
+        batched = FaqMatrix.match_messages(lesson.id, self.MESSAGES)
+
+        for message, (faq_id, similarity) in zip(self.MESSAGES, batched):
+            expected_id, expected_similarity = self.brute_force(lesson.id, message)
+            with self.subTest(message=message):
+                self.assertEqual(faq_id, expected_id)
+                self.assertAlmostEqual(similarity, expected_similarity)
+
+    def test_lesson_without_faqs(self):
+        lesson, _ = create_lesson()
+        self.assertEqual(FaqMatrix.match_messages(lesson.id, ["what is a polynomial"]), [(None, -1)])
+
+
+class FaqCounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        FaqIndex._indexes.clear()
+        Vocabulary._term_ids.clear()
+        TeacherSettings.invalidate()
+        user = CustomUser.objects.create(username="teacher", email="teacher@example.com")
+        Teacher.objects.create(id=TeacherSettings.TEACHER_ID, user=user, threshold=0.3, notification_threshold=5)
+
+    def test_new_group_counts_its_first_faq(self):
+        lesson, _ = create_lesson()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            RelatedContentController.process_message_and_add_to_faq(lesson.id, "what is a polynomial")
+        RelatedContentController.process_message_and_add_to_faq(lesson.id, "what is a polynomial exactly")
+
+        group = GroupedQuestions.objects.get()
+        self.assertEqual(group.faq_count, 2)
+        group.faqs.first().delete()
+        group.refresh_from_db()
+        self.assertEqual(group.faq_count, 1)
+
+
+class GroupCentroidsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        FaqIndex._indexes.clear()
+        Vocabulary._term_ids.clear()
+
+    def assertCentroidsMatchMembers(self, *related_contents):
+        # The stored centroid is the sum of the member vectors, the mean times member_count
+        for related_content in related_contents:
+            related_content.refresh_from_db()
+            expected = {}
+            members = Faq.objects.filter(related_content=related_content)
+            for term_id, count in (pair for faq in members for pair in faq.term_vector):
+                expected[str(term_id)] = expected.get(str(term_id), 0) + count
+            self.assertEqual(related_content.centroid_vector, expected)
+            self.assertEqual(related_content.member_count, members.count())
+            self.assertAlmostEqual(related_content.centroid_norm, math.sqrt(sum(v ** 2 for v in expected.values())))
+
+    def test_centroids_follow_creates_edits_regroups_and_deletes(self):
+        lesson, first = create_lesson(["what is a polynomial", "what is the degree of a polynomial"])
+        second = RelatedContent.objects.create(lesson=lesson, general_context="roots")
+        root = Faq.objects.create(lesson=lesson, related_content=second, question="how do I find a root")
+        self.assertCentroidsMatchMembers(first, second)
+
+        # Edit the question
+        faq = Faq.objects.filter(related_content=first).first()
+        faq.question = "what is a quadratic polynomial"
+        faq.save()
+        self.assertCentroidsMatchMembers(first, second)
+
+        # Regroup, as FaqController does with a new related_content
+        faq.related_content = second
+        faq.save(update_fields=['related_content'])
+        self.assertCentroidsMatchMembers(first, second)
+
+        # Edit and regroup in one save
+        root.question = "what are the roots of a cubic"
+        root.related_content = first
+        root.save()
+        self.assertCentroidsMatchMembers(first, second)
+
+        faq.delete()
+        root.delete()
+        self.assertCentroidsMatchMembers(first, second)
+        second.refresh_from_db()
+        self.assertEqual((second.centroid_vector, second.member_count, second.centroid_norm), ({}, 0, 0.0))
+
+    def test_unrelated_saves_leave_the_centroid_alone(self):
+        lesson, related_content = create_lesson(["what is a polynomial"])
+        faq = Faq.objects.get()
+
+        with CaptureQueriesContext(connection) as queries:
+            faq.save(update_fields=['grouped_questions'])
+        self.assertFalse([query for query in queries if 'api_relatedcontent' in query['sql']])
+        self.assertCentroidsMatchMembers(related_content)
+
+
+class NearDuplicatesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        FaqIndex._indexes.clear()
+        Vocabulary._term_ids.clear()
+
+    def test_finds_near_verbatim_repeats_through_the_buckets(self):
+        lesson, _ = create_lesson(["What is the degree of a polynomial?", "How do I factor a quadratic?"])
+
+        faq, similarity = NearDuplicates.find_duplicate(lesson.id, "what is the degree of a polynomial")
+        self.assertEqual(faq.question, "What is the degree of a polynomial?")
+        self.assertGreaterEqual(similarity, 0.8)
+        self.assertEqual(NearDuplicates.find_duplicate(lesson.id, "why do cubic roots repeat"), (None, 0.0))
+
+    def test_edited_questions_are_bucketed_again(self):
+        lesson, _ = create_lesson(["What is the degree of a polynomial?"])
+        faq = Faq.objects.get()
+        faq.question = "How do I factor a quadratic?"
+        faq.save()
+
+        self.assertEqual(NearDuplicates.find_duplicate(lesson.id, "What is the degree of a polynomial?"), (None, 0.0))
+        self.assertEqual(NearDuplicates.find_duplicate(lesson.id, "how do i factor a quadratic")[0], faq)
+        self.assertEqual(FaqLshBucket.objects.filter(faq=faq).count(), NearDuplicates.NUM_BANDS)
+
+    def test_non_latin_questions_have_their_own_signatures(self):
+        lesson, _ = create_lesson(["多項式の次数とは何ですか？", "Что такое корень многочлена?"])
+
+        self.assertEqual(len(NearDuplicates.signature("多項式の次数とは何ですか")), NearDuplicates.NUM_HASHES)
+        self.assertEqual(NearDuplicates.find_duplicate(lesson.id, "多項式の次数とは何ですか")[0].question, "多項式の次数とは何ですか？")
+        self.assertEqual(NearDuplicates.find_duplicate(lesson.id, "что такое корень многочлена")[0].question, "Что такое корень многочлена?")
+        self.assertEqual(NearDuplicates.find_duplicate(lesson.id, "二次方程式の解き方"), (None, 0.0))
+
+    def test_an_empty_signature_is_never_a_duplicate(self):
+        lesson, _ = create_lesson(["???", "!!!"])
+
+        self.assertEqual(NearDuplicates.signature("?!"), [])
+        self.assertFalse(FaqLshBucket.objects.exists())
+        self.assertEqual(NearDuplicates.find_duplicate(lesson.id, "???"), (None, 0.0))
+
+
+class FaqQueueTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        FaqIndex._indexes.clear()
+        Vocabulary._term_ids.clear()
+        TeacherSettings.invalidate()
+        user = CustomUser.objects.create(username="teacher", email="teacher@example.com")
+        Teacher.objects.create(id=TeacherSettings.TEACHER_ID, user=user, threshold=0.3, notification_threshold=5)
+        self.lesson, _ = create_lesson()
+
+    def expire_lease(self, job):
+        FaqClassificationJob.objects.filter(pk=job.pk).update(
+            started_at=timezone.now() - timedelta(seconds=settings.FAQ_QUEUE_LEASE_SECONDS + 1)
+        )
+
+    def test_a_claimed_job_becomes_a_faq(self):
+        FaqQueue.enqueue(self.lesson.id, "what is a polynomial")
+
+        job = FaqQueue.claim_next_job()
+        self.assertEqual((job.status, job.attempts), (FaqClassificationJob.RUNNING, 1))
+        self.assertIsNone(FaqQueue.claim_next_job())
+
+        self.assertTrue(FaqQueue.process_job(job))
+        self.assertFalse(FaqClassificationJob.objects.exists())
+        self.assertEqual(list(Faq.objects.values_list('question', flat=True)), ["what is a polynomial"])
+
+    def test_failed_jobs_are_retried_up_to_max_attempts(self):
+        FaqQueue.enqueue(self.lesson.id, "what is a polynomial")
+
+        with mock.patch(
+            'api.controllers.RelatedContentController.RelatedContentController.process_message_and_add_to_faq',
+            side_effect=RuntimeError("database went away"),
+        ):
+            for attempt in range(1, FaqQueue.MAX_ATTEMPTS + 1):
+                job = FaqQueue.claim_next_job()
+                self.assertEqual(job.attempts, attempt)
+                self.assertFalse(FaqQueue.process_job(job))
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, FaqClassificationJob.FAILED)
+        self.assertIn("database went away", job.error)
+        self.assertIsNone(FaqQueue.claim_next_job())
+
+    def test_expired_leases_are_claimed_again_and_count_as_attempts(self):
+        FaqQueue.enqueue(self.lesson.id, "what is a polynomial")
+
+        for attempt in range(1, FaqQueue.MAX_ATTEMPTS + 1):
+            job = FaqQueue.claim_next_job()
+            self.assertEqual(job.attempts, attempt)
+            self.expire_lease(job)
+
+        # A job whose workers keep dying fails instead of being claimed forever
+        self.assertIsNone(FaqQueue.claim_next_job())
+        job.refresh_from_db()
+        self.assertEqual(job.status, FaqClassificationJob.FAILED)
+
+    def test_a_reclaimed_job_is_left_to_its_new_worker(self):
+        FaqQueue.enqueue(self.lesson.id, "what is a polynomial")
+        stale = FaqQueue.claim_next_job()
+        self.expire_lease(stale)
+        current = FaqQueue.claim_next_job()
+
+        self.assertIsNone(FaqQueue.process_job(stale))
+        self.assertFalse(Faq.objects.exists())
+        self.assertTrue(FaqQueue.process_job(current))
+        self.assertEqual(Faq.objects.count(), 1)
+
+    def test_queue_status_requires_sign_in(self):
+        request = APIRequestFactory().get("/")
+        view = FaqClassificationJobController.as_view({'get': 'getQueueStatus'})
+        self.assertIn(view(request).status_code, (401, 403))
+
+        request = APIRequestFactory().get("/")
+        force_authenticate(request, user=CustomUser.objects.get())
+        self.assertEqual(view(request).data['pending'], 0)
+
+
+CREATE_SUGGESTION = 'api.controllers.SuggestionController.SuggestionController.createOrUpdateSuggestion'
+
+
+class SuggestionQueueTests(TestCase):
+    def setUp(self):
+        self.lesson, _ = create_lesson()
+        self.notification = Notification.objects.create(lesson=self.lesson, message="FAQs")
+
+    def expire_lease(self, job):
+        SuggestionJob.objects.filter(pk=job.pk).update(
+            lease_renewed_at=timezone.now() - timedelta(seconds=settings.SUGGESTION_QUEUE_LEASE_SECONDS + 1)
+        )
+
+    def test_a_new_notification_is_queued_and_claimed_once(self):
+        job = SuggestionQueue.claim_next_job("worker-1")
+        self.assertEqual((job.notification_id, job.status, job.claimed_by, job.attempts),
+                         (self.notification.notif_id, SuggestionJob.RUNNING, "worker-1", 1))
+        self.assertIsNone(SuggestionQueue.claim_next_job("worker-2"))
+
+        with mock.patch(CREATE_SUGGESTION) as create:
+            self.assertTrue(SuggestionQueue.process_job(job))
+        create.assert_called_once_with(self.notification)
+        self.assertFalse(SuggestionJob.objects.exists())
+
+    def test_failed_jobs_are_retried_up_to_max_attempts(self):
+        with mock.patch(CREATE_SUGGESTION, side_effect=RuntimeError("LLM went away")):
+            for attempt in range(1, SuggestionQueue.MAX_ATTEMPTS + 1):
+                job = SuggestionQueue.claim_next_job("worker-1")
+                self.assertEqual(job.attempts, attempt)
+                self.assertFalse(SuggestionQueue.process_job(job))
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, SuggestionJob.FAILED)
+        self.assertIn("LLM went away", job.error)
+        self.assertIsNone(SuggestionQueue.claim_next_job("worker-1"))
+
+    def test_expired_leases_are_claimed_again_and_count_as_attempts(self):
+        for attempt in range(1, SuggestionQueue.MAX_ATTEMPTS + 1):
+            job = SuggestionQueue.claim_next_job(f"worker-{attempt}")
+            self.assertEqual(job.attempts, attempt)
+            self.expire_lease(job)
+
+        # A job whose workers keep dying fails instead of being claimed forever
+        self.assertIsNone(SuggestionQueue.claim_next_job("worker-4"))
+        job.refresh_from_db()
+        self.assertEqual(job.status, SuggestionJob.FAILED)
+
+    def test_a_reclaimed_job_is_left_to_its_new_worker(self):
+        stale = SuggestionQueue.claim_next_job("worker-1")
+        self.expire_lease(stale)
+        current = SuggestionQueue.claim_next_job("worker-2")
+
+        with mock.patch(CREATE_SUGGESTION, side_effect=RuntimeError("timed out")):
+            self.assertIsNone(SuggestionQueue.process_job(stale))
+        with mock.patch(CREATE_SUGGESTION):
+            self.assertIsNone(SuggestionQueue.process_job(stale))
+            job = SuggestionJob.objects.get()
+            self.assertEqual((job.status, job.claimed_by, job.error), (SuggestionJob.RUNNING, "worker-2", ""))
+            self.assertTrue(SuggestionQueue.process_job(current))
+        self.assertFalse(SuggestionJob.objects.exists())
+
+    def test_renewed_leases_are_not_reclaimed(self):
+        job = SuggestionQueue.claim_next_job("worker-1")
+        self.expire_lease(job)
+        self.assertEqual(SuggestionQueue.renew_leases("worker-1"), 1)
+        self.assertIsNone(SuggestionQueue.claim_next_job("worker-2"))
+
+    def test_wakeup_ends_the_wait_early(self):
+        stop = threading.Event()
+        wakeup = SuggestionQueue.Wakeup(stop)
+
+        threading.Timer(0.05, wakeup.set).start()
+        started = time.monotonic()
+        wakeup.wait(10)
+        self.assertLess(time.monotonic() - started, 5)
+
+        threading.Timer(0.05, stop.set).start()
+        started = time.monotonic()
+        wakeup.wait(10)
+        self.assertLess(time.monotonic() - started, 5)
+
+    def test_queue_status_requires_sign_in(self):
+        view = SuggestionJobController.as_view({'get': 'getQueueStatus'})
+        self.assertIn(view(APIRequestFactory().get("/")).status_code, (401, 403))
+
+        request = APIRequestFactory().get("/")
+        force_authenticate(request, user=CustomUser.objects.create(username="student", email="student@example.com"))
+        self.assertEqual(view(request).data['pending'], 1)
+
+    def test_only_teachers_queue_every_notification(self):
+        view = SuggestionController.as_view({'post': 'startBackgroundCreation'})
+        student = CustomUser.objects.create(username="student", email="student@example.com")
+        teacher = CustomUser.objects.create(username="teacher", email="teacher@example.com")
+        teacher.groups.add(Group.objects.create(name='Teacher'))
+
+        for user, status_code in [(None, 403), (student, 403), (teacher, 200)]:
+            request = APIRequestFactory().post("/")
+            if user is not None:
+                force_authenticate(request, user=user)
+            self.assertEqual(view(request).status_code, status_code)
+
+
+class SuggestionWorkerTests(TransactionTestCase):
+    # Jobs run on pool threads with their own connections, which only see committed rows
+
+    def setUp(self):
+        self.lesson, _ = create_lesson()
+        self.notifications = [Notification.objects.create(lesson=self.lesson, message=f"FAQs {i}") for i in range(3)]
+        # The command installs SIGTERM and SIGINT handlers, keep the test runner's
+        patcher = mock.patch('signal.signal')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_worker(self, *args):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('run_suggestion_worker', '--burst', *args, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_burst_worker_drains_the_queue_and_records_its_heartbeat(self):
+        with mock.patch(CREATE_SUGGESTION) as create:
+            stdout, _ = self.run_worker('--concurrency', '2')
+
+        self.assertEqual(create.call_count, 3)
+        self.assertFalse(SuggestionJob.objects.exists())
+        worker = WorkerHeartbeat.objects.get()
+        self.assertEqual((worker.kind, worker.concurrency, worker.jobs_succeeded, worker.jobs_failed),
+                         (WorkerHeartbeat.SUGGESTION, 2, 3, 0))
+        self.assertIsNotNone(worker.stopped_at)
+        self.assertIn(f"Suggestion worker {worker.name} stopped", stdout)
+        self.assertFalse(WorkerHeartbeats.alive(WorkerHeartbeat.SUGGESTION, 60).exists())
+
+    def test_failed_jobs_are_retried_then_counted(self):
+        with mock.patch(CREATE_SUGGESTION, side_effect=RuntimeError("LLM went away")) as create:
+            _, stderr = self.run_worker('--concurrency', '1')
+
+        self.assertEqual(create.call_count, 3 * SuggestionQueue.MAX_ATTEMPTS)
+        self.assertEqual(SuggestionJob.objects.filter(status=SuggestionJob.FAILED).count(), 3)
+        self.assertEqual(WorkerHeartbeat.objects.get().jobs_failed, 3 * SuggestionQueue.MAX_ATTEMPTS)
+        self.assertIn("failed (attempt 3)", stderr)
+
+    @override_settings(LLM_CONCURRENCY=["gpt-4o=1"])
+    def test_concurrency_is_capped_by_the_models_limit(self):
+        with mock.patch(CREATE_SUGGESTION):
+            stdout, _ = self.run_worker('--concurrency', '8')
+
+        self.assertIn("Concurrency lowered from 8", stdout)
+        self.assertEqual(WorkerHeartbeat.objects.get().concurrency, 1)
+
+    def test_jobs_run_in_parallel_up_to_the_pool_size(self):
+        for i in range(3, 6):
+            Notification.objects.create(lesson=self.lesson, message=f"FAQs {i}")
+        running = [0, 0]
+        running_lock = threading.Lock()
+        finished = []
+
+        def slow(notification):
+            with running_lock:
+                running[0] += 1
+                running[1] = max(running)
+            time.sleep(0.1)
+            with running_lock:
+                running[0] -= 1
+
+        with mock.patch(CREATE_SUGGESTION, side_effect=slow):
+            SuggestionQueue.run_jobs(
+                "worker-1", 2, threading.Event(), burst=True, on_finished=lambda job, succeeded: finished.append(succeeded)
+            )
+
+        self.assertEqual(finished, [True] * 6)
+        # [in progress, most at once]
+        self.assertEqual(running, [0, 2])
+        self.assertFalse(SuggestionJob.objects.exists())
+
+    def test_heartbeats_renew_the_leases_of_running_jobs(self):
+        def slow(notification):
+            time.sleep(0.3)
+
+        renew_leases = SuggestionQueue.renew_leases
+        renewed = []
+
+        with mock.patch(CREATE_SUGGESTION, side_effect=slow), mock.patch(
+            'api.services.SuggestionQueue.renew_leases', side_effect=lambda name: renewed.append(renew_leases(name))
+        ):
+            self.run_worker('--concurrency', '3', '--heartbeat-interval', '0.05')
+
+        # Leases of the three jobs in progress were renewed while the LLM was called
+        self.assertEqual(max(renewed), 3)
+        self.assertEqual(WorkerHeartbeat.objects.get().jobs_succeeded, 3)
+
+
+class TextVectorTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        FaqIndex._indexes.clear()
+        Vocabulary._term_ids.clear()
+
+    def test_each_step_applies_on_its_own(self):
+        text = "Factoring the Polynomials, quickly!"
+        self.assertEqual(TextVector.Pipeline([]).tokenize(text), ["Factoring", "the", "Polynomials,", "quickly!"])
+        self.assertEqual(TextVector.Pipeline(['lowercase']).tokenize(text), ["factoring", "the", "polynomials,", "quickly!"])
+        self.assertEqual(
+            TextVector.Pipeline(['lowercase', 'punctuation']).tokenize(text), ["factoring", "the", "polynomials", "quickly"]
+        )
+        self.assertEqual(
+            TextVector.Pipeline(['lowercase', 'punctuation', 'stopwords']).tokenize(text),
+            ["factoring", "polynomials", "quickly"],
+        )
+        self.assertEqual(
+            TextVector.Pipeline(['lowercase', 'punctuation', 'stopwords', 'stem']).tokenize(text),
+            ["factor", "polynomial", "quick"],
+        )
+
+    def test_stems_keep_three_characters(self):
+        pipeline = TextVector.Pipeline(['stem'])
+        self.assertEqual(pipeline.tokenize("relational studies sing"), ["relate", "study", "sing"])
+
+    def test_paraphrases_share_terms(self):
+        first = TextVector.word_frequencies(TextVector.tokenize("How do I factor polynomials?"))
+        second = TextVector.word_frequencies(TextVector.tokenize("factoring a polynomial"))
+        self.assertAlmostEqual(TextVector.cosine_similarity(first, second), 1.0)
+
+    def test_migration_retokenizes_with_the_default_steps_and_resets_empty_groups(self):
+        migration = importlib.import_module('api.migrations.0024_retokenize_faq_vectors')
+        self.assertEqual(migration.STEPS, frozenset(settings.FAQ_TOKENIZER_STEPS))
+
+        lesson, related_content = create_lesson(["How do I factor polynomials?"])
+        empty = RelatedContent.objects.create(
+            lesson=lesson, centroid_vector={"1": 3}, centroid_norm=3.0, member_count=2
+        )
+        Faq.objects.update(term_vector=[], vector_norm=0.0)
+        RelatedContent.objects.filter(pk=related_content.pk).update(centroid_vector={}, centroid_norm=0.0)
+
+        with override_settings(FAQ_TOKENIZER_STEPS=['lowercase']):
+            migration.retokenize_faq_vectors(django_apps, None)
+
+        faq = Faq.objects.get()
+        self.assertEqual(faq.term_vector, [list(pair) for pair in Vocabulary.vectorize_text(faq.question)[0]])
+        related_content.refresh_from_db()
+        empty.refresh_from_db()
+        self.assertEqual(related_content.centroid_vector, {str(term_id): count for term_id, count in faq.term_vector})
+        self.assertEqual((empty.centroid_vector, empty.centroid_norm, empty.member_count), ({}, 0.0, 0))
+
+
+class FaqReclusteringTests(TestCase):
+    MESSAGES = [
+        "what is a polynomial",
+        "What is it?",
+        "what is the degree of a polynomial",
+        "how do I factor a quadratic",
+        "what is it!!",
+        "why is it so",
+        "factoring a quadratic polynomial",
+        "What is the degree of a polynomial??",
+    ]
+
+    def setUp(self):
+        cache.clear()
+        FaqIndex._indexes.clear()
+        Vocabulary._term_ids.clear()
+        TeacherSettings.invalidate()
+        user = CustomUser.objects.create(username="teacher", email="teacher@example.com")
+        Teacher.objects.create(id=TeacherSettings.TEACHER_ID, user=user, threshold=0.3, notification_threshold=50)
+        self.lesson = Lesson.objects.create(lessonNumber=1, title="Polynomials", subtitle="Basics")
+
+    def groups(self):
+        groups = defaultdict(set)
+        for question, related_content_id in Faq.objects.filter(lesson=self.lesson).values_list('question', 'related_content_id'):
+            groups[related_content_id].add(question)
+        return sorted(sorted(questions) for questions in groups.values())
+
+    def test_regroups_the_way_online_matching_did(self):
+        for message in self.MESSAGES:
+            with self.captureOnCommitCallbacks(execute=True):
+                RelatedContentController.process_message_and_add_to_faq(self.lesson.id, message)
+        online = self.groups()
+        # "what is it!!" has no terms left after stopwords, only the duplicate check groups it
+        self.assertIn(["What is it?", "what is it!!"], online)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            FaqReclustering.recluster(self.lesson.id, threshold=TeacherSettings.similarity_threshold())
+
+        self.assertEqual(self.groups(), online)
+        for related_content in RelatedContent.objects.filter(lesson=self.lesson, member_count__gt=0):
+            members = Faq.objects.filter(related_content=related_content)
+            self.assertEqual(related_content.member_count, members.count())
+            self.assertEqual(GroupedQuestions.objects.get(related_content=related_content).faq_count, members.count())
+
+    def test_moves_reach_the_faq_index_of_every_process(self):
+        for message in self.MESSAGES:
+            with self.captureOnCommitCallbacks(execute=True):
+                RelatedContentController.process_message_and_add_to_faq(self.lesson.id, message)
+        version_key = FaqIndex.LESSON_VERSION_KEY.format(self.lesson.id)
+        version = cache.get(version_key)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            FaqReclustering.recluster(self.lesson.id, threshold=0.3)
+
+        self.assertEqual(cache.get(version_key), version + 1)
+        self.assertEqual(FaqIndex.get_index(self.lesson.id).version, version + 1)
+        faq, _ = FaqIndex.find_most_similar_faq(
+            self.lesson.id, TextVector.word_frequencies(TextVector.tokenize("degree of a polynomial"))
+        )
+        self.assertEqual(faq.related_content, Faq.objects.get(question="what is the degree of a polynomial").related_content)
+
+
+class TeacherSettingsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        TeacherSettings.invalidate()
+        user = CustomUser.objects.create(username="teacher", email="teacher@example.com")
+        self.teacher = Teacher.objects.create(id=TeacherSettings.TEACHER_ID, user=user, threshold=0.35)
+
+    def test_warm_lookups_do_not_query(self):
+        self.assertEqual(TeacherSettings.similarity_threshold(), 0.35)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(TeacherSettings.similarity_threshold(), 0.35)
+
+    def test_saves_apply_once_committed(self):
+        TeacherSettings.similarity_threshold()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.teacher.threshold = 0.25
+            self.teacher.save()
+            self.assertEqual(TeacherSettings.similarity_threshold(), 0.35)
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(TeacherSettings.similarity_threshold(), 0.25)
+
+    @override_settings(TEACHER_SETTINGS_CHECK_SECONDS=0)
+    def test_saves_of_another_process_apply_through_the_shared_cache(self):
+        TeacherSettings.similarity_threshold()
+
+        # Another process saves the row and bumps the version; only the shared cache tells this one
+        Teacher.objects.filter(id=TeacherSettings.TEACHER_ID).update(threshold=0.2)
+        self.assertEqual(TeacherSettings.similarity_threshold(), 0.35)
+        cache.set(TeacherSettings.VERSION_KEY, cache.get(TeacherSettings.VERSION_KEY) + 1, timeout=None)
+        self.assertEqual(TeacherSettings.similarity_threshold(), 0.2)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_workers_refuse_a_process_local_cache(self):
+        for command in ('run_faq_worker', 'run_suggestion_worker'):
+            with self.assertRaises(CommandError):
+                call_command(command, stdout=io.StringIO())
+
+
+def llm_answer(content):
+    return {'choices': [{'message': {'content': content}}]}
+
+
+def openai_response(content):
+    # What the API sends back for a chat completion, as openai 0.28 reads it off the session
+    response = requests.Response()
+    response.status_code = 200
+    response.headers['Content-Type'] = 'application/json'
+    response._content = json.dumps({
+        "object": "chat.completion",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+    }).encode()
+    return response
+
+
+def clear_answer_cache():
+    cache.clear()
+    AnswerCache._entries.clear()
+    AnswerCache._lessons.clear()
+
+
+class ChatFlowTests(TestCase):
+    def setUp(self):
+        clear_answer_cache()
+        self.user = CustomUser.objects.create(username="student", email="student@example.com")
+        self.other_user = CustomUser.objects.create(username="other", email="other@example.com")
+        self.lesson, _ = create_lesson()
+        self.page = LessonContent.objects.create(lesson=self.lesson, contents="<p>A polynomial is a sum of terms.</p>")
+
+    def post(self, view, message, user=None):
+        request = APIRequestFactory().post("/", {"message": message}, format='json')
+        force_authenticate(request, user=user or self.user)
+        return view(request, lesson_id=self.lesson.id, lesson_content_id=self.page.id)
+
+    def test_sync_and_async_views_share_the_answer_cache(self):
+        sync_view = ChatBotController.as_view({'post': 'chatbot_response'})
+
+        with mock.patch('api.services.LlmClients.chat_completion', return_value=llm_answer("A sum of terms.")) as llm:
+            first = self.post(sync_view, "what is a polynomial")
+            second = async_to_sync(self.post)(ChatBotAsyncController.as_view(), "What is a polynomial?", self.other_user)
+
+        self.assertEqual(llm.call_count, 1)
+        self.assertEqual((first['X-Answer-Cache'], second['X-Answer-Cache']), ('miss', 'hit'))
+        self.assertEqual(json.loads(second.content), {"response": "A sum of terms."})
+        self.assertEqual(SubQuery.objects.filter(query__lesson=self.lesson).count(), 2)
+
+    def test_earlier_turns_are_part_of_the_key(self):
+        view = ChatBotController.as_view({'post': 'chatbot_response'})
+
+        with mock.patch('api.services.LlmClients.chat_completion', return_value=llm_answer("A sum of terms.")) as llm:
+            self.post(view, "what is a polynomial")
+            repeated = self.post(view, "what is a polynomial")
+
+        self.assertEqual(llm.call_count, 2)
+        self.assertEqual(repeated['X-Answer-Cache'], 'miss')
+
+    def test_turn_and_faq_job_are_saved_together(self):
+        view = ChatBotController.as_view({'post': 'chatbot_response'})
+
+        with mock.patch('api.services.LlmClients.chat_completion', return_value=llm_answer("A sum of terms.")), \
+                mock.patch('api.services.FaqQueue.enqueue', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.post(view, "what is a polynomial")
+
+        self.assertFalse(SubQuery.objects.exists())
+
+    def test_async_view_sends_the_recent_turns(self):
+        with mock.patch('api.services.LlmClients.achat_completion', return_value=llm_answer("A sum of terms.")) as llm:
+            async_to_sync(self.post)(ChatBotAsyncController.as_view(), "what is a polynomial")
+            async_to_sync(self.post)(ChatBotAsyncController.as_view(), "and its degree")
+
+        messages = llm.call_args.args[1]
+        self.assertEqual([messages[2]['content'], messages[3]['content']], ["what is a polynomial", "A sum of terms."])
+        self.assertEqual(FaqClassificationJob.objects.filter(lesson=self.lesson).count(), 2)
+
+    def stream(self, consume):
+        # Runs the streaming view and hands its events to consume, on one event loop
+        async def run():
+            response = await self.post(ChatBotStreamController.as_view(), "what is a polynomial")
+            return await consume(response.streaming_content)
+        return async_to_sync(run)()
+
+    def test_stream_sends_the_tokens_then_saves_the_answer(self):
+        async def upstream(model, messages, **kwargs):
+            for delta in ["A sum ", "of terms."]:
+                yield delta
+
+        async def consume(events):
+            return [event async for event in events]
+
+        with mock.patch('api.services.LlmClients.astream_chat', upstream):
+            events = self.stream(consume)
+
+        self.assertEqual(events, [
+            sse("token", {"content": "A sum "}).encode(),
+            sse("token", {"content": "of terms."}).encode(),
+            sse("done", {"response": "A sum of terms."}).encode(),
+        ])
+        self.assertEqual(list(SubQuery.objects.values_list('response', flat=True)), ["A sum of terms."])
+
+    def test_client_disconnect_closes_the_upstream_request(self):
+        closed = []
+
+        async def upstream(model, messages, **kwargs):
+            try:
+                yield "A sum "
+                await asyncio.Event().wait()
+            finally:
+                closed.append(True)
+
+        async def consume(events):
+            received = []
+            first = asyncio.Event()
+
+            async def read():
+                async for event in events:
+                    received.append(event)
+                    first.set()
+
+            task = asyncio.create_task(read())
+            await first.wait()
+            # What the ASGI handler does when the client goes away
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+            return received
+
+        with mock.patch('api.services.LlmClients.astream_chat', upstream):
+            events = self.stream(consume)
+
+        self.assertEqual(events, [sse("token", {"content": "A sum "}).encode()])
+        self.assertEqual(closed, [True])
+        self.assertFalse(SubQuery.objects.exists())
+
+    def test_unknown_page(self):
+        self.page.id += 1000
+        response = self.post(ChatBotController.as_view({'post': 'chatbot_response'}), "what is a polynomial")
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(CHATBOT_HISTORY_MESSAGES=4)
+class ConversationTurnsTests(TestCase):
+    def setUp(self):
+        clear_answer_cache()
+        self.user = CustomUser.objects.create(username="student", email="student@example.com")
+        self.lesson, _ = create_lesson()
+        self.page = LessonContent.objects.create(lesson=self.lesson, contents="<p>A polynomial is a sum of terms.</p>")
+        self.query = Query.objects.create(lesson=self.lesson, user=self.user)
+        start = timezone.now() - timedelta(minutes=1)
+        for i in range(10):
+            SubQuery.objects.create(
+                query=self.query, question=f"question {i}", response=f"answer {i}", created_at=start + timedelta(seconds=i)
+            )
+
+    def test_a_message_appends_one_turn(self):
+        request = APIRequestFactory().post("/", {"message": "question 10"}, format='json')
+        force_authenticate(request, user=self.user)
+        view = ChatBotController.as_view({'post': 'chatbot_response'})
+
+        with mock.patch('api.services.LlmClients.chat_completion', return_value=llm_answer("answer 10")), \
+                CaptureQueriesContext(connection) as queries:
+            view(request, lesson_id=self.lesson.id, lesson_content_id=self.page.id)
+
+        writes = [query['sql'] for query in queries if not query['sql'].startswith(('SELECT', 'SAVEPOINT', 'RELEASE'))]
+        self.assertEqual(len([sql for sql in writes if 'api_subquery' in sql]), 1)
+        self.assertFalse([sql for sql in writes if 'api_query' in sql and 'api_subquery' not in sql])
+        self.assertEqual(
+            list(self.query.turns.values_list('question', flat=True)), [f"question {i}" for i in range(11)]
+        )
+
+    def test_context_reads_only_the_recent_turns(self):
+        with CaptureQueriesContext(connection) as queries:
+            context = json.loads(QuerySerializer().get_context(self.query))
+
+        self.assertEqual([message['content'] for message in context], ["question 8", "answer 8", "question 9", "answer 9"])
+        self.assertEqual(len(queries), 1)
+        self.assertIn("LIMIT 2", queries[0]['sql'])
+
+
+@override_settings(LLM_CACHE_ENABLED=False, OPENAI_API_KEY="test-key", CHATBOT_PROMPT_MODE='direct')
+class ChatbotPromptTests(TestCase):
+    def setUp(self):
+        clear_answer_cache()
+        user = CustomUser.objects.create(username="student", email="student@example.com")
+        self.client.force_login(user)
+        self.lesson, _ = create_lesson()
+        self.page = LessonContent.objects.create(lesson=self.lesson, contents="<p>A polynomial is a sum of terms.</p>")
+
+    def test_each_message_is_one_llm_call_with_the_recent_turns(self):
+        sent = []
+
+        def send(session, method, url, **kwargs):
+            sent.append(json.loads(kwargs['data']))
+            return openai_response(f"Answer {len(sent)}")
+
+        url = f"/api/lessons/{self.lesson.id}/pages/{self.page.id}/chatbot/"
+        with mock.patch.object(requests.Session, 'request', autospec=True, side_effect=send):
+            for message in ["what is a polynomial", "and what is its degree"]:
+                response = self.client.post(url, {"message": message}, content_type='application/json')
+                self.assertEqual(response.status_code, 200)
+                # Counted by LlmCallCountMiddleware: no summarization round trip before the answer
+                self.assertEqual(response['X-LLM-Calls'], "1")
+
+        self.assertEqual(len(sent), 2)
+        messages = sent[1]['messages']
+        self.assertEqual([message['role'] for message in messages], ['system', 'assistant', 'user', 'assistant', 'user'])
+        self.assertIn("A polynomial is a sum of terms.", messages[0]['content'])
+        self.assertEqual([messages[2]['content'], messages[3]['content']], ["what is a polynomial", "Answer 1"])
+        self.assertIn("and what is its degree", messages[4]['content'])
+
+
+class AnswerCacheTests(TestCase):
+    def setUp(self):
+        clear_answer_cache()
+        self.lesson, _ = create_lesson()
+        self.page = LessonContent.objects.create(lesson=self.lesson, contents="<p>Polymorphism</p>")
+
+    def test_negation_and_word_order_are_kept(self):
+        AnswerCache.store(self.page, "Is polymorphism a form of inheritance?", "context", [], "Yes.")
+
+        self.assertEqual(AnswerCache.lookup(self.page, "is polymorphism a form of  inheritance", "context", []), "Yes.")
+        self.assertIsNone(AnswerCache.lookup(self.page, "Is polymorphism not a form of inheritance?", "context", []))
+        self.assertIsNone(AnswerCache.lookup(self.page, "Is inheritance a form of polymorphism?", "context", []))
+
+    def test_paraphrases_miss_and_steps_are_configurable(self):
+        AnswerCache.store(self.page, "What are polynomials?", "context", [], "Sums of terms.")
+
+        self.assertIsNone(AnswerCache.lookup(self.page, "What is a polynomial?", "context", []))
+        self.assertIsNone(AnswerCache.lookup(self.page, "what are the polynomials", "context", []))
+        with self.settings(CHATBOT_ANSWER_CACHE_STEPS=['lowercase', 'punctuation', 'stem']):
+            AnswerCache.store(self.page, "What are polynomials?", "context", [], "Sums of terms.")
+            self.assertEqual(AnswerCache.lookup(self.page, "what are polynomial", "context", []), "Sums of terms.")
+
+    def test_prompt_context_is_part_of_the_key(self):
+        history = [{"role": "user", "content": "what is a class"}, {"role": "assistant", "content": "A type."}]
+        AnswerCache.store(self.page, "and an object?", "context", history, "An instance.")
+
+        self.assertEqual(AnswerCache.lookup(self.page, "and an object?", "context", history), "An instance.")
+        self.assertIsNone(AnswerCache.lookup(self.page, "and an object?", "context", []))
+        self.assertIsNone(AnswerCache.lookup(self.page, "and an object?", "other context", history))
+
+    def test_a_change_to_any_page_of_the_lesson_drops_its_answers(self):
+        AnswerCache.store(self.page, "what is polymorphism", "context", [], "Many forms.")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            LessonContent.objects.create(lesson=self.lesson, contents="<p>The next page</p>")
+
+        self.assertIsNone(AnswerCache.lookup(self.page, "what is polymorphism", "context", []))
+
+    def test_page_changes_apply_once_committed(self):
+        AnswerCache.store(self.page, "what is polymorphism", "context", [], "Many forms.")
+
+        with mock.patch('api.services.LessonRetrieval.invalidate') as invalidate:
+            with self.captureOnCommitCallbacks() as callbacks:
+                self.page.contents = "<p>Polymorphism, revised</p>"
+                self.page.save()
+                self.assertEqual(AnswerCache.lookup(self.page, "what is polymorphism", "context", []), "Many forms.")
+                invalidate.assert_not_called()
+
+            for callback in callbacks:
+                callback()
+
+        invalidate.assert_called_once_with(self.lesson.id)
+        self.assertIsNone(AnswerCache.lookup(self.page, "what is polymorphism", "context", []))
+
+
+class SuggestionInsightsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create(username="teacher", email="teacher@example.com", role='teacher')
+        self.lesson, _ = create_lesson()
+        LessonContent.objects.create(lesson=self.lesson, contents="<p>A polynomial is a sum of terms.</p>")
+        self.notification = Notification.objects.create(lesson=self.lesson, message="FAQs")
+
+    def post(self, view):
+        data = {"lesson_id": self.lesson.id, "notification_id": self.notification.notif_id}
+        request = APIRequestFactory().post("/", data, format='json')
+        force_authenticate(request, user=self.user)
+        return view(request)
+
+    def test_sync_and_async_views_share_the_insights(self):
+        with mock.patch('api.services.LlmClients.chat_completion', return_value=llm_answer(" Insights ")) as llm:
+            created = self.post(SuggestionController.as_view({'post': 'createInsight'}))
+            fetched = async_to_sync(self.post)(SuggestionInsightController.as_view())
+
+        self.assertEqual(llm.call_count, 1)
+        self.assertEqual((created.status_code, fetched.status_code), (201, 200))
+        self.assertEqual(json.loads(fetched.content)["suggestion"]["insights"], "Insights")
+
+    def test_unknown_notification(self):
+        self.notification.notif_id += 1000
+        response = self.post(SuggestionController.as_view({'post': 'createInsight'}))
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(LLM_CACHE_ENABLED=False, OPENAI_API_KEY="test-key")
+class LlmClientsTests(TestCase):
+    def setUp(self):
+        self.addCleanup(LlmClients.close_session)
+
+    def test_every_thread_sends_through_the_one_pooled_session(self):
+        senders = []
+
+        def send(session, method, url, **kwargs):
+            # tiktoken may try to download its encoding through requests too
+            if url.endswith('/chat/completions'):
+                senders.append(session)
+            return openai_response("A sum of terms.")
+
+        with mock.patch.object(requests.Session, 'request', autospec=True, side_effect=send):
+            with LlmClients.count_calls() as calls:
+                answer = LlmClients.chat_completion("gpt-3.5-turbo", [{"role": "user", "content": "what is a polynomial"}])
+            threads = [
+                threading.Thread(target=LlmClients.chat_completion, args=("gpt-3.5-turbo", [{"role": "user", "content": "hi"}]))
+                for _ in range(4)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(answer['choices'][0]['message']['content'], "A sum of terms.")
+        self.assertEqual(calls.count, 1)
+        self.assertEqual(len(senders), 5)
+        self.assertTrue(all(sender is LlmClients.session() for sender in senders))
+        self.assertIs(openai.requestssession, LlmClients.session())
+
+    def test_only_close_session_closes_the_pool(self):
+        pooled = LlmClients.session()
+
+        with mock.patch.object(HTTPAdapter, 'close') as close:
+            # What openai does to its per-thread session every few minutes
+            pooled.close()
+            close.assert_not_called()
+            LlmClients.close_session()
+            close.assert_called()
+
+        self.assertIs(LlmClients.session(), pooled)
+
+    @override_settings(LLM_CACHE_ENABLED=True)
+    def test_only_requests_sent_to_the_model_take_a_rate_limit_token(self):
+        cache.clear()
+        messages = [{"role": "user", "content": "what is a polynomial"}]
+
+        with mock.patch.object(requests.Session, 'request', autospec=True, return_value=openai_response("A sum of terms.")), \
+                mock.patch('api.services.RateLimiter.wait') as wait:
+            for _ in range(2):
+                answer = LlmClients.chat_completion("gpt-4o", messages, rate_limit=True)
+
+        self.assertEqual(answer['choices'][0]['message']['content'], "A sum of terms.")
+        wait.assert_called_once_with(model="gpt-4o")
+
+    @override_settings(LLM_CONCURRENCY=["stub-model=2"])
+    def test_requests_per_model_are_capped(self):
+        LlmClients._limits.clear()
+        self.addCleanup(LlmClients._limits.clear)
+        active, peak = [0], [0]
+        lock = threading.Lock()
+
+        def call():
+            with LlmClients.limit("stub-model"):
+                with lock:
+                    active[0] += 1
+                    peak[0] = max(peak[0], active[0])
+                time.sleep(0.02)
+                with lock:
+                    active[0] -= 1
+
+        threads = [threading.Thread(target=call) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(peak[0], 2)
+
+    def test_prompts_are_counted_in_the_model_encoding(self):
+        self.assertEqual(TokenCounter.model_encoding("gpt-4o"), "o200k_base")
+        self.assertEqual(TokenCounter.model_encoding("gpt-4o-mini"), "o200k_base")
+        self.assertEqual(TokenCounter.model_encoding("gpt-3.5-turbo"), "cl100k_base")
+        self.assertEqual(TokenCounter.model_encoding("local-stub"), TokenCounter.ENCODING)
+
+        with mock.patch('api.services.TokenCounter.get_encoding', return_value=None) as get_encoding:
+            PromptBudget.check_call("gpt-4o", [{"role": "user", "content": "what is a polynomial"}])
+        get_encoding.assert_called_with("o200k_base")
+
+
+class RefreshLessonTextTests(TestCase):
+    def test_estimated_only_invalidates_the_refreshed_lessons(self):
+        lesson, _ = create_lesson()
+        for contents in ["<p>First page</p>", "<p>Second page</p>"]:
+            page = LessonContent.objects.create(lesson=lesson, contents=contents)
+            LessonContent.objects.filter(id=page.id).update(token_encoding=TokenCounter.ESTIMATE)
+
+        # The encoding loads this time, so the pages stop matching the estimate filter
+        encoding = mock.Mock(encode=lambda text, disallowed_special=(): text.split())
+        with mock.patch('api.services.TokenCounter.get_encoding', return_value=encoding), \
+                mock.patch('api.services.LessonRetrieval.invalidate') as invalidate:
+            call_command('refresh_lesson_text', '--estimated-only', stdout=io.StringIO())
+
+        invalidate.assert_called_once_with(lesson.id)
+
+
+class PromptBudgetTests(TestCase):
+    def setUp(self):
+        # Four characters per token, whatever tiktoken can load here
+        patcher = mock.patch('api.services.TokenCounter.get_encoding', return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_trailing_pages_are_left_out_whole(self):
+        self.assertEqual(PromptBudget.fit_pages(["a" * 40, "b" * 40, "c" * 40], 21), ["a" * 40, "b" * 40])
+
+    def test_a_first_page_over_budget_is_cut_for_read_only_prompts(self):
+        self.assertEqual(PromptBudget.fit_pages(["a" * 400, "b" * 40], 10), ["a" * 40])
+
+    def test_a_first_page_the_reply_replaces_is_never_cut(self):
+        with self.assertRaises(PromptBudget.PromptTooLarge):
+            PromptBudget.fit_pages(["a" * 400, "b" * 40], 10, truncate=False)
+
+    def test_suggestion_job_for_an_oversized_page_fails_without_retrying(self):
+        lesson, _ = create_lesson()
+        notification = Notification.objects.create(lesson=lesson, message="FAQs")
+        job = SuggestionQueue.claim_next_job()
+
+        with mock.patch(
+            'api.controllers.SuggestionController.SuggestionController.createOrUpdateSuggestion',
+            side_effect=PromptBudget.PromptTooLarge("too large"),
+        ):
+            self.assertFalse(SuggestionQueue.process_job(job))
+
+        self.assertEqual((job.notification_id, job.status), (notification.notif_id, SuggestionJob.FAILED))
+
+
+class StatsControllerTests(TestCase):
+    CONTROLLERS = [AnswerCacheController, LlmCacheController, RateLimitController]
+
+    def setUp(self):
+        cache.clear()
+        self.student = CustomUser.objects.create(username="student", email="student@example.com")
+        self.teacher = CustomUser.objects.create(username="teacher", email="teacher@example.com")
+        self.teacher.groups.add(Group.objects.create(name='Teacher'))
+
+    def call(self, controller, method, user=None):
+        request = getattr(APIRequestFactory(), method)("/")
+        if user is not None:
+            force_authenticate(request, user=user)
+        return controller.as_view({'get': 'getStats', 'delete': 'resetStats'})(request)
+
+    def test_only_teachers_reset_the_counters(self):
+        for controller in self.CONTROLLERS:
+            with self.subTest(controller=controller.__name__):
+                self.assertIn(self.call(controller, 'get').status_code, (401, 403))
+                self.assertIn(self.call(controller, 'delete').status_code, (401, 403))
+                self.assertEqual(self.call(controller, 'get', self.student).status_code, 200)
+                self.assertEqual(self.call(controller, 'delete', self.student).status_code, 403)
+                self.assertEqual(self.call(controller, 'delete', self.teacher).status_code, 200)
+
+
+@override_settings(LLM_CACHE_MAX_BYTES=200, LLM_CACHE_TTL=3600)
+class LlmCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_stores_track_the_size_without_summing_the_table(self):
+        LlmCache.store("a", "gpt-4o", llm_answer("x" * 20))
+
+        with CaptureQueriesContext(connection) as queries:
+            LlmCache.store("b", "gpt-4o", llm_answer("y" * 20))
+
+        self.assertFalse([query for query in queries if 'SUM(' in query['sql'].upper()])
+        self.assertEqual(cache.get(LlmCache.BYTES_KEY), sum(LlmCachedResponse.objects.values_list('size', flat=True)))
+
+    def test_least_recently_used_entries_are_evicted_past_the_limit(self):
+        for key in "abcd":
+            LlmCache.store(key, "gpt-4o", llm_answer(key * 40))
+
+        self.assertLessEqual(cache.get(LlmCache.BYTES_KEY), 200)
+        self.assertEqual(cache.get(LlmCache.BYTES_KEY), sum(LlmCachedResponse.objects.values_list('size', flat=True)))
+        self.assertFalse(LlmCachedResponse.objects.filter(key="a").exists())
+        self.assertTrue(LlmCachedResponse.objects.filter(key="d").exists())
+
+    def test_a_lost_race_rolls_back_to_its_own_savepoint(self):
+        def insert_first(key, defaults):
+            LlmCachedResponse.objects.create(key=key, **defaults)
+            return LlmCachedResponse.objects.create(key=key, **defaults)
+
+        with transaction.atomic():
+            with mock.patch.object(LlmCachedResponse.objects, 'update_or_create', side_effect=insert_first):
+                LlmCache.store("a", "gpt-4o", llm_answer("x"))
+            self.assertFalse(LlmCachedResponse.objects.filter(key="a").exists())
+
+
+_PARAGRAPH = re.compile(r'<p\b[^>]*>.*?</p>', re.DOTALL | re.IGNORECASE)
+_TEXT = re.compile(r'(?<=>)[^<]*\w[^<]*|^[^<]*\w[^<]*')
+
+
+def edit_page(rng, page, count):
+    # Adds to a text, appends a paragraph made of the page's own words or drops a paragraph
+    for _ in range(count):
+        texts = list(_TEXT.finditer(page))
+        paragraphs = list(_PARAGRAPH.finditer(page))
+        edit = rng.choice(['reword', 'add', 'drop'])
+        if edit == 'reword' and texts:
+            text = rng.choice(texts)
+            page = page[:text.end()] + " (edited)" + page[text.end():]
+        elif edit == 'add':
+            vocabulary = " ".join(text.group() for text in texts).split() or ["New", "text."]
+            page += "<p>" + " ".join(rng.choice(vocabulary) for _ in range(12)) + "</p>"
+        elif edit == 'drop' and len(paragraphs) > 1:
+            dropped = rng.choice(paragraphs)
+            page = page[:dropped.start()] + page[dropped.end():]
+    return page
+
+
+class DelimiterAlignmentTests(TestCase):
+    PAGES = [
+        "<h1>Polynomials</h1><p>A polynomial is a sum of terms.</p><p>Each term has a coefficient and a power.</p>"
+        "<p>Terms with the same power are like terms.</p>",
+        "<h2>Degree</h2><p>The degree is the highest exponent.</p><p>Constants have degree zero.</p>"
+        "<p>A linear polynomial has degree one.</p>",
+        "<h2>Roots</h2><p>A root makes the polynomial zero.</p><p>Quadratics have at most two roots.</p>"
+        "<p>The factor theorem links roots and factors.</p>",
+        "<h2>Division</h2><p>Long division splits a polynomial by another.</p><p>The remainder has a lower degree.</p>"
+        "<p>Synthetic division is a shortcut.</p>",
+    ]
+
+    def align(self, pages):
+        original = DelimiterAlignment.DELIMITER.join(self.PAGES)
+        return DelimiterAlignment.align(original, "".join(pages))
+
+    def test_delimiters_follow_the_edited_pages(self):
+        # (edited pages, delimiters reported as ambiguous): a paragraph added at the end of a page
+        # could as well start the next one, the words decide and the LLM double-checks
+        edits = {
+            'reword': ([self.PAGES[0].replace("sum of terms", "sum of several terms")] + self.PAGES[1:], []),
+            'append': ([self.PAGES[0] + "<p>Terms are added together.</p>"] + self.PAGES[1:], [0]),
+            'drop': (
+                self.PAGES[:2] + [self.PAGES[2].replace("<p>A root makes the polynomial zero.</p>", "")]
+                + self.PAGES[3:], []
+            ),
+        }
+        for name, (pages, ambiguous) in edits.items():
+            with self.subTest(edit=name):
+                alignment = self.align(pages)
+                self.assertEqual(alignment.content, DelimiterAlignment.DELIMITER.join(pages))
+                self.assertEqual(alignment.ambiguous, ambiguous)
+
+    def test_a_deleted_page_leaves_no_empty_page(self):
+        for deleted in range(len(self.PAGES)):
+            pages = self.PAGES[:deleted] + self.PAGES[deleted + 1:]
+            with self.subTest(deleted=deleted):
+                alignment = self.align(pages)
+                self.assertEqual(alignment.content, DelimiterAlignment.DELIMITER.join(pages))
+                self.assertEqual(alignment.placed, len(pages) - 1)
+
+    def test_accuracy_on_synthetic_edits(self):
+        # Every page reworded, extended or shortened three times; the seeds keep the edits the same on every run
+        delimiters = correct = exact = 0
+        for seed in range(50):
+            rng = random.Random(seed)
+            expected = DelimiterAlignment.DELIMITER.join(edit_page(rng, page, 3) for page in self.PAGES)
+            alignment = DelimiterAlignment.align(
+                DelimiterAlignment.DELIMITER.join(self.PAGES), expected.replace(DelimiterAlignment.DELIMITER, "")
+            )
+            placed = DelimiterAlignment.boundaries(alignment.content)
+            expected_boundaries = DelimiterAlignment.boundaries(expected)
+            delimiters += len(expected_boundaries)
+            correct += len(set(placed) & set(expected_boundaries))
+            exact += placed == expected_boundaries
+
+        self.assertGreaterEqual(correct / delimiters, 0.98)
+        self.assertGreaterEqual(exact / 50, 0.95)
+
+    def queue_append_edit(self):
+        # The 'append' edit leaves the LLM one span: the new paragraph between the first two pages
+        lesson, _ = create_lesson()
+        notification = Notification.objects.create(lesson=lesson, message="FAQs")
+        Suggestion.objects.create(lesson=lesson, notification=notification, old_content="")
+        SuggestionJob.objects.filter(kind=SuggestionJob.SUGGESTION).delete()
+
+        request = APIRequestFactory().post("/", {
+            'lesson_id': lesson.id, 'notification_id': notification.notif_id,
+            'original_content': DelimiterAlignment.DELIMITER.join(self.PAGES),
+            'edited_content': self.PAGES[0] + "<p>Terms are added together.</p>" + "".join(self.PAGES[1:]),
+        }, format='json')
+        force_authenticate(request, user=CustomUser.objects.create(username="teacher", email="teacher@example.com"))
+        response = SuggestionController.as_view({'post': 'insert_delimiter_ai'})(request)
+        self.assertEqual(response.status_code, 202)
+        return notification, response.data['data']
+
+    def test_the_llm_places_only_the_ambiguous_spans(self):
+        notification, local = self.queue_append_edit()
+        job = SuggestionJob.objects.get()
+        self.assertEqual(job.kind, SuggestionJob.DELIMITERS)
+        self.assertEqual(len(job.payload['spans']), 1)
+
+        reply = "</p><!-- delimiter --><p>Terms are added together.</p><h2>"
+        with mock.patch('api.services.LlmClients.chat_completion', return_value=llm_answer(reply)) as llm:
+            self.assertTrue(SuggestionQueue.process_job(SuggestionQueue.claim_next_job("worker-1")))
+
+        prompt = llm.call_args.kwargs['messages'][-1]['content']
+        self.assertIn("<p>Terms are added together.</p>", prompt)
+        self.assertNotIn("Roots", prompt)
+        self.assertEqual(
+            Suggestion.objects.get(notification=notification).ai_delimiter,
+            local.replace("</p><p>Terms are added together.</p>" + DelimiterAlignment.DELIMITER, reply[:-4]),
+        )
+
+    def test_the_local_placement_stays_when_the_llm_reply_is_unusable(self):
+        replies = {
+            'changed text': "</p><!-- delimiter --><p>Terms are summed.</p><h2>",
+            'extra delimiter': "</p><!-- delimiter --><p>Terms are added together.</p><!-- delimiter --><h2>",
+        }
+        for name, reply in replies.items():
+            with self.subTest(reply=name):
+                notification, local = self.queue_append_edit()
+                with mock.patch('api.services.LlmClients.chat_completion', return_value=llm_answer(reply)):
+                    self.assertTrue(SuggestionQueue.process_job(SuggestionQueue.claim_next_job("worker-1")))
+                self.assertEqual(Suggestion.objects.get(notification=notification).ai_delimiter, local)
+                Lesson.objects.all().delete()
+                CustomUser.objects.all().delete()
+
+    def test_a_newer_edit_is_not_overwritten(self):
+        notification, _ = self.queue_append_edit()
+        job = SuggestionQueue.claim_next_job("worker-1")
+        Suggestion.objects.filter(notification=notification).update(ai_delimiter="<p>Edited again</p>")
+
+        reply = "</p><!-- delimiter --><p>Terms are added together.</p><h2>"
+        with mock.patch('api.services.LlmClients.chat_completion', return_value=llm_answer(reply)):
+            self.assertTrue(SuggestionQueue.process_job(job))
+        self.assertEqual(Suggestion.objects.get(notification=notification).ai_delimiter, "<p>Edited again</p>")
+
+
+class VocabularyTests(TestCase):
+    def setUp(self):
+        Vocabulary._term_ids.clear()
+
+    def test_ids_of_a_rolled_back_transaction_are_not_cached(self):
+        try:
+            with transaction.atomic():
+                Vocabulary.term_ids(["eigenvalue"], create=True)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+
+        self.assertNotIn("eigenvalue", Vocabulary._term_ids)
+        self.assertEqual(Vocabulary.term_ids(["eigenvalue"]), {})
+
+    def test_ids_are_cached_once_committed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ids = Vocabulary.term_ids(["eigenvalue"], create=True)
+
+        self.assertEqual(Vocabulary._term_ids["eigenvalue"], ids["eigenvalue"])
@@ -1,4 +1,5 @@
 
+from django.conf import settings
 from django.urls import path, re_path,include
 
 from .controllers.GroupedQuestionsController import GroupedQuestionsController
@@ -7,15 +8,23 @@ from .controllers.UserController import UserController
 from .controllers.LessonController import LessonController
 from .controllers.LessonContentController import LessonContentsController
 from .controllers.ChatBotController import ChatBotController
+from .controllers.ChatBotStreamController import ChatBotStreamController
+from .controllers.ChatBotAsyncController import ChatBotAsyncController
 from .controllers.QueryController import QueryController
 from .controllers.ImageController import ImageModelController
 from .controllers.ImageMediaController import ImageMediaController
 from .controllers.FileController import FileController
 from .controllers.FaqController import FaqController
 from .controllers.SuggestionController import SuggestionController
+from .controllers.SuggestionInsightController import SuggestionInsightController
 from .controllers.RelatedContentController import RelatedContentController
 from .controllers.NotificationController import NotificationController
 from .controllers.ContentHistoryController import ContentHistoryController
+from .controllers.FaqClassificationJobController import FaqClassificationJobController
+from .controllers.SuggestionJobController import SuggestionJobController
+from .controllers.AnswerCacheController import AnswerCacheController
+from .controllers.LlmCacheController import LlmCacheController
+from .controllers.RateLimitController import RateLimitController
 from rest_framework.routers import SimpleRouter
 
 
@@ -146,6 +155,14 @@ suggestion_startWorkerContent_actions = {
 
 APPEND_SLASH = True
 
+# Under ASGI the endpoints waiting on the LLM are served by async views
+if settings.ASYNC_LLM_VIEWS:
+    chatbot_view = ChatBotAsyncController.as_view()
+    insight_view = SuggestionInsightController.as_view()
+else:
+    chatbot_view = ChatBotController.as_view({'post': 'chatbot_response'})
+    insight_view = SuggestionController.as_view(suggestion_insight_actions)
+
 # Routers
 routes = SimpleRouter()
 routes.register('faqs', FaqController)
@@ -171,7 +188,11 @@ urlpatterns = [
     path('lessons/<int:lesson_id>', LessonController.as_view(lesson_detail_actions)),
     path('lessons/<int:lesson_id>/pages/', LessonContentsController.as_view(lesson_contents_actions)),
     path('lessons/<int:lesson_id>/pages/<int:lesson_contents_id>', LessonContentsController.as_view(lesson_contents_detail_actions)),
-    path('lessons/<int:lesson_id>/pages/<int:lesson_content_id>/chatbot/', ChatBotController.as_view({'post': 'chatbot_response'})),
+    path('lessons/<int:lesson_id>/pages/<int:lesson_content_id>/chatbot/', chatbot_view),
+    path('lessons/<int:lesson_id>/pages/<int:lesson_content_id>/chatbot/stream/', ChatBotStreamController.as_view()),
+    path('chatbot/cache/stats/', AnswerCacheController.as_view({'get': 'getStats', 'delete': 'resetStats'})),
+    path('ratelimits/stats/', RateLimitController.as_view({'get': 'getStats', 'delete': 'resetStats'})),
+    path('llm/cache/stats/', LlmCacheController.as_view({'get': 'getStats', 'delete': 'resetStats'})),
 
     # History
     path('lessons/history/lesson/<int:lesson_id>/parent/<int:parent_id>/', ContentHistoryController.as_view(content_historyWithLessonId_actions)),
@@ -213,6 +234,7 @@ urlpatterns = [
 
     # Faq
     path('faqs/', FaqController.as_view(faq_detail_actions)),
+    path('faqs/queue/status/', FaqClassificationJobController.as_view({'get': 'getQueueStatus'})),
 
     # Notification
     path('notification/getUnread', NotificationController.as_view({'get': 'get_all_notification'})),
@@ -223,9 +245,10 @@ urlpatterns = [
     path('suggestions/getoldcontent/<int:lesson_id>', SuggestionController.as_view({'get': 'getOldContent'})),
     path('suggestions/revert/', SuggestionController.as_view(suggestion_revert_actions)),
 
-    path('suggestions/insights/', SuggestionController.as_view(suggestion_insight_actions)),
+    path('suggestions/insights/', insight_view),
     path('suggestions/contents/', SuggestionController.as_view(suggestion_content_actions)),
     path('suggestions/contents/startWorker/', SuggestionController.as_view(suggestion_startWorkerContent_actions)),
+    path('suggestions/queue/status/', SuggestionJobController.as_view({'get': 'getQueueStatus'})),
 
     # insert delimiter ai
     path('suggestions/insert_delimiter_ai/', SuggestionController.as_view({'post': 'insert_delimiter_ai'})),
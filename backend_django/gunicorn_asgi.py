@@ -0,0 +1,23 @@
+"""
+Gunicorn profile for serving the project over ASGI with uvicorn workers:
+
+    gunicorn backend_django.asgi:application -c backend_django/gunicorn_asgi.py
+
+Each worker runs an event loop, so chatbot requests waiting on the LLM do
+not hold a worker the way they do with the default sync workers.
+"""
+import os
+
+# Not `from decouple import config`: gunicorn reads `config` here as its own setting
+import decouple
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+worker_class = 'uvicorn.workers.UvicornWorker'
+workers = decouple.config('WEB_CONCURRENCY', default=2, cast=int)
+# LLM calls can take a while; keep this above LLM_REQUEST_TIMEOUT
+timeout = decouple.config('GUNICORN_TIMEOUT', default=180, cast=int)
+keepalive = 5
+accesslog = '-'
+
+# The async chatbot and insight views are only worth it under this profile
+raw_env = ['ASYNC_LLM_VIEWS=true']
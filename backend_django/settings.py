@@ -11,7 +11,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 import os.path
 from pathlib import Path
-from decouple import config
+from decouple import config, Csv
 import dj_database_url
 import environ
 from django.core.management.utils import get_random_secret_key
@@ -97,6 +97,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     "django.middleware.common.CommonMiddleware",
+    'api.middleware.LlmCallCountMiddleware',
 ]
 
 ROOT_URLCONF = 'backend_django.urls'
@@ -137,6 +138,29 @@ DATABASES = {
 #     }
 # }
 
+# Cache shared by the web and worker processes: teacher settings versions, FAQ index and
+# retrieval versions, rate limit buckets. The database table is created by the release step
+# (`manage.py createcachetable`); Redis or Memcached work too. A process-local backend such as
+# LocMemCache is only fit for a single process and the workers refuse to start with it
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': config('CACHE_LOCATION', default='api_cache'),
+    }
+}
+
+# Log lines from the app (LLM prompt sizes, token counting fallbacks) go to the console
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api': {'handlers': ['console'], 'level': config('API_LOG_LEVEL', default='INFO')},
+    },
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -224,4 +248,94 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'api.CustomUser'
 
 # OpenAI API Key
-OPENAI_API_KEY = config('OPENAI_API_KEY', default='')
\ No newline at end of file
+OPENAI_API_KEY = config('OPENAI_API_KEY', default='')
+
+# FAQ grouping: 'faq' matches a new question to its nearest single FAQ,
+# 'centroid' matches it to the closest RelatedContent group centroid
+FAQ_MATCHING_MODE = config('FAQ_MATCHING_MODE', default='faq')
+
+# Estimated Jaccard similarity (MinHash) above which a new question is treated
+# as a near-verbatim repeat of an existing FAQ and skips similarity scoring
+FAQ_DUPLICATE_THRESHOLD = config('FAQ_DUPLICATE_THRESHOLD', default=0.8, cast=float)
+
+# FAQ classification queue drained by `manage.py run_faq_worker`
+FAQ_WORKER_CONCURRENCY = config('FAQ_WORKER_CONCURRENCY', default=2, cast=int)
+# A running job whose worker has been silent this long is handed to another worker
+FAQ_QUEUE_LEASE_SECONDS = config('FAQ_QUEUE_LEASE_SECONDS', default=300, cast=int)
+
+# Suggestion generation queue, one job per notification, drained by `manage.py run_suggestion_worker`
+# Jobs run in parallel per worker process, capped at the suggestion model's LLM_CONCURRENCY
+SUGGESTION_WORKER_CONCURRENCY = config('SUGGESTION_WORKER_CONCURRENCY', default=4, cast=int)
+# Workers renew their row and the leases of their jobs this often
+SUGGESTION_WORKER_HEARTBEAT_SECONDS = config('SUGGESTION_WORKER_HEARTBEAT_SECONDS', default=15, cast=int)
+# A running job whose lease has not been renewed this long is handed to another worker
+SUGGESTION_QUEUE_LEASE_SECONDS = config('SUGGESTION_QUEUE_LEASE_SECONDS', default=120, cast=int)
+# Delimiters of an edited lesson are placed by diffing it with the original
+# (api/services/DelimiterAlignment.py); where that is only a guess, a suggestion job asks gpt-4o about those spans
+DELIMITER_LLM_FALLBACK = config('DELIMITER_LLM_FALLBACK', default=True, cast=bool)
+
+# How often a worker checks the shared cache for teacher settings saved elsewhere
+TEACHER_SETTINGS_CHECK_SECONDS = config('TEACHER_SETTINGS_CHECK_SECONDS', default=5, cast=float)
+
+# Text normalization applied to FAQ questions and chatbot messages before matching,
+# any of: lowercase, punctuation, stopwords, stem. Run `manage.py rebuild_faq_vectors` after changing it
+FAQ_TOKENIZER_STEPS = config('FAQ_TOKENIZER_STEPS', default='lowercase,punctuation,stopwords,stem', cast=Csv())
+# How often a worker checks whether the FAQ vectors were rebuilt by another process
+FAQ_INDEX_CHECK_SECONDS = config('FAQ_INDEX_CHECK_SECONDS', default=5, cast=float)
+
+# Shared LLM clients (api/services/LlmClients.py). LLM_API_BASE can point at
+# `manage.py run_stub_llm` to benchmark offline
+LLM_API_BASE = config('LLM_API_BASE', default='https://api.openai.com/v1')
+LLM_REQUEST_TIMEOUT = config('LLM_REQUEST_TIMEOUT', default=120, cast=float)
+# Keep-alive connections kept open to the LLM API per process
+LLM_POOL_MAXSIZE = config('LLM_POOL_MAXSIZE', default=20, cast=int)
+# Concurrent requests allowed per model and process, e.g. "gpt-4o=4,gpt-3.5-turbo=16"
+LLM_CONCURRENCY = config('LLM_CONCURRENCY', default='', cast=Csv())
+LLM_DEFAULT_CONCURRENCY = config('LLM_DEFAULT_CONCURRENCY', default=8, cast=int)
+# Largest prompt, in tokens, the suggestion and insight prompts are trimmed to
+# (api/services/PromptBudget.py), per model as "model=tokens"
+LLM_PROMPT_BUDGET = config('LLM_PROMPT_BUDGET', default='', cast=Csv())
+LLM_DEFAULT_PROMPT_BUDGET = config('LLM_DEFAULT_PROMPT_BUDGET', default=16000, cast=int)
+# Completions stored in the database under a hash of the model, messages and sampling parameters,
+# so an identical prompt is not paid for twice (purge with `manage.py purge_llm_cache`)
+LLM_CACHE_ENABLED = config('LLM_CACHE_ENABLED', default=True, cast=bool)
+LLM_CACHE_TTL = config('LLM_CACHE_TTL', default=7 * 86400, cast=int)
+# Least recently used responses are evicted past this many bytes
+LLM_CACHE_MAX_BYTES = config('LLM_CACHE_MAX_BYTES', default=50 * 1024 * 1024, cast=int)
+
+# Token buckets in front of the endpoints that call the LLM (api/services/RateLimiter.py),
+# kept in the Django cache: use a shared backend so every worker sees the same buckets.
+# Rates are "count/period" (s, min, hour, day); a bucket holds count requests of burst
+RATE_LIMIT_ENABLED = config('RATE_LIMIT_ENABLED', default=True, cast=bool)
+RATE_LIMIT_USER = config('RATE_LIMIT_USER', default='20/min')
+RATE_LIMIT_LESSON = config('RATE_LIMIT_LESSON', default='200/min')
+RATE_LIMIT_MODELS = config('RATE_LIMIT_MODELS', default='', cast=Csv())
+RATE_LIMIT_MODEL_DEFAULT = config('RATE_LIMIT_MODEL_DEFAULT', default='500/min')
+
+# How the chatbot builds its prompt: 'direct' sends the lesson and the stored
+# conversation in one request, 'summary' keeps the LangChain summary memory
+# (which may summarize the lesson with an extra LLM call first)
+CHATBOT_PROMPT_MODE = config('CHATBOT_PROMPT_MODE', default='direct')
+# Messages of earlier conversation kept in Query.context and sent with each question
+CHATBOT_HISTORY_MESSAGES = config('CHATBOT_HISTORY_MESSAGES', default=6, cast=int)
+# Per-worker cache of chatbot answers by question, lesson text of the prompt and
+# earlier turns (api/services/AnswerCache.py); a size of 0 turns it off
+CHATBOT_ANSWER_CACHE_SIZE = config('CHATBOT_ANSWER_CACHE_SIZE', default=1000, cast=int)
+CHATBOT_ANSWER_CACHE_TTL = config('CHATBOT_ANSWER_CACHE_TTL', default=86400, cast=float)
+# FAQ tokenizer steps applied to questions before they are compared; only questions
+# that come out the same share an answer. 'stopwords' would merge "is" and "is not"
+CHATBOT_ANSWER_CACHE_STEPS = config('CHATBOT_ANSWER_CACHE_STEPS', default='lowercase,punctuation', cast=Csv())
+# Lesson text sent with a chatbot question: 'retrieval' picks the chunks most
+# relevant to the question (BM25, api/services/LessonRetrieval.py) from the
+# page and CHATBOT_CONTEXT_NEIGHBOURS pages on each side, at most
+# CHATBOT_CONTEXT_CHUNKS of them within CHATBOT_CONTEXT_TOKENS; 'page' sends the whole page
+CHATBOT_CONTEXT_MODE = config('CHATBOT_CONTEXT_MODE', default='retrieval')
+CHATBOT_CHUNK_WORDS = config('CHATBOT_CHUNK_WORDS', default=120, cast=int)
+CHATBOT_CONTEXT_CHUNKS = config('CHATBOT_CONTEXT_CHUNKS', default=4, cast=int)
+CHATBOT_CONTEXT_TOKENS = config('CHATBOT_CONTEXT_TOKENS', default=800, cast=int)
+CHATBOT_CONTEXT_NEIGHBOURS = config('CHATBOT_CONTEXT_NEIGHBOURS', default=1, cast=int)
+
+# Serve the chatbot and insight endpoints with async views. Turn on with an
+# ASGI server (see backend_django/gunicorn_asgi.py), where a worker keeps
+# serving other requests while the LLM answers
+ASYNC_LLM_VIEWS = config('ASYNC_LLM_VIEWS', default=False, cast=bool)